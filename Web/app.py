@@ -1,30 +1,46 @@
-from flask import Flask, render_template, request, jsonify, redirect, session, flash, url_for
+from flask import Flask, render_template, request, jsonify, redirect, session, flash, url_for, g
 import pandas as pd
-import pickle
-import joblib
 import os
-import re
+import json
+import base64
+import hashlib
+import logging
+import socket
 import numpy as np
-from scipy.sparse import hstack
-from utils import classify_drug_type
+import threading
+import time
+from utils import classify_drug_type, symptom_keywords, SYMPTOM_MAPPING
+from matcher import AhoCorasick
+from search_index import LIVE_DRUG_OFFSET, LiveDrugSegment, top_k
+from feature_store import DETAIL_FORMAT, RECORD_FIELDS, drug_features, parse_to_list, requires_prescription
+from search_cache import QueryResultCache, normalize_query
+from artifacts import ARTIFACT_DIR_ENV, DEFAULT_ARTIFACT_DIR, build_artifacts, load_bundle
+from engine_holder import EngineHolder
+from compression import init_compression, matching_etag
+from logging_config import configure_logging
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, HTTP_REQUEST_SECONDS, HTTP_REQUESTS, REGISTRY,
+    SEARCH_RESULTS, SEARCH_STAGE_SECONDS
+)
 from init import (
     change_password, clear_search_history, get_db, get_search_history, 
     get_search_statistics, get_user_profile, init_database, create_user, 
     log_search_enhanced, track_drug_click, update_user_profile, verify_user, 
     log_search, get_stats, save_drug, get_saved_drugs, remove_saved_drug, is_drug_saved,
-    get_all_drugs, add_drug, delete_drug
+    get_all_drugs, count_drugs, add_drug as create_drug, delete_drug, search_log_writer,
+    get_drug_changes, get_drugs_by_ids, get_recent_search_queries, prune_drug_changes
 )
 from functools import wraps
 from datetime import timedelta
 
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__, template_folder='templates', static_folder='static')
 
 
 app.config['SECRET_KEY'] = 'simple-secret-key-for-demo'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=2)
 
-init_database()
-
 # Decorators
 def login_required(f):
     @wraps(f)
@@ -47,126 +63,163 @@ def admin_required(f):
 
 
 class EnhancedDrugRecommendationEngine:
-    def __init__(self):
+    SEARCH_CACHE_SIZE = 1024
+    SEARCH_CACHE_TTL = 300  # giây
+    LIVE_SYNC_INTERVAL = 1.0  # giây giữa hai lần đọc nhật ký thay đổi drugs_master
+    LIVE_PRUNE_INTERVAL = 300.0  # giây giữa hai lần ghi seq đã đồng bộ và cắt nhật ký
+    LIVE_DRUG_SOURCE = 'Quản trị viên'
+    # Trường trả về được của mỗi thuốc trong kết quả tìm kiếm; view=summary chỉ gồm những gì danh sách hiển thị
+    SEARCH_FIELDS = tuple(RECORD_FIELDS) + ('score', 'confidence_level')
+    SUMMARY_FIELDS = ('index', 'name', 'drug_class', 'prescription_required', 'price',
+                      'score', 'confidence_level', 'matched_symptoms')
+    # keyword: đếm từ khóa/mảnh từ trên chỉ mục ngược; tfidf: cosine TF-IDF; semantic: cosine SVD qua IVF
+    # (tfidf và semantic cần compiled scorer)
+    SEARCH_MODES = ('keyword', 'tfidf', 'semantic')
+    DEFAULT_SEARCH_MODE = 'keyword'
+    
+    def __init__(self, artifact_dir=None, artifacts=None):
+        # Thư mục bundle: tham số > biến môi trường DRUG_ENGINE_ARTIFACTS > models/engine_bundle
+        self.artifact_dir = artifact_dir or os.environ.get(ARTIFACT_DIR_ENV, DEFAULT_ARTIFACT_DIR)
         self.model_package = None
-        self.data_final = None
-        self.load_models()
+        self.manifest = None
+        self.feature_store = None
+        self.symptom_index = None
+        self.drug_details = None
+        self.query_corrector = None
+        self.tfidf_index = None
+        self.semantic_index = None
         self.symptom_mapping = self._create_symptom_mapping()
+        # Automaton trên mọi từ khóa triệu chứng; id từ khóa -> các nhóm (theo thứ tự symptom_mapping) chứa nó
+        self.symptom_matcher = AhoCorasick(symptom_keywords(self.symptom_mapping))
+        self._symptom_names = list(self.symptom_mapping)
+        self._keyword_symptoms = [
+            [i for i, keywords in enumerate(self.symptom_mapping.values()) if keyword in keywords]
+            for keyword in self.symptom_matcher.patterns
+        ]
+        # Cache kết quả xếp hạng theo truy vấn đã chuẩn hóa (cũng phục vụ phân trang)
+        self.search_cache = QueryResultCache(self.SEARCH_CACHE_SIZE, self.SEARCH_CACHE_TTL)
+        # Thuốc thêm qua trang quản trị: vị trí LIVE_DRUG_OFFSET + id, đồng bộ từ drugs_master_changes
+        self.live_drugs = LiveDrugSegment()
+        self.live_seq = 0
+        self.live_synced_at = 0.0
+        self.live_pruned_at = time.monotonic()
+        self._live_lock = threading.Lock()
+        if artifacts is not None:
+            self._apply_artifacts(artifacts)
+        else:
+            self.load_models()
+    
+    @classmethod
+    def from_dataframe(cls, data_final, model_package=None):
+        """Dựng engine trực tiếp từ DataFrame (không qua bundle), dùng cho script/benchmark"""
+        return cls(artifacts=build_artifacts(data_final, model_package, SYMPTOM_MAPPING))
     
     def load_models(self):
+        """Load bundle artifact (memory-map). Thiếu hoặc không khớp thì báo lỗi, không dùng dữ liệu giả"""
+        logger.info("Loading engine artifacts from: %s", os.path.abspath(self.artifact_dir))
+        self._apply_artifacts(load_bundle(self.artifact_dir, self.symptom_mapping))
+    
+    def _apply_artifacts(self, artifacts):
+        if len(artifacts.feature_store) >= LIVE_DRUG_OFFSET:
+            raise ValueError(f"Bundle có {len(artifacts.feature_store)} thuốc, vượt vùng vị trí của thuốc thêm trực tiếp")
+        self.manifest = artifacts.manifest
+        self.feature_store = artifacts.feature_store
+        self.symptom_index = artifacts.symptom_index
+        self.drug_details = artifacts.details
+        self.query_corrector = artifacts.corrector
+        self.tfidf_index = artifacts.tfidf_index
+        self.semantic_index = artifacts.semantic_index
+        self.model_package = None
+        if artifacts.scorer is not None:
+            self.model_package = {
+                'compiled_scorer': artifacts.scorer,
+                'training_info': artifacts.training_info,
+                'classify_drug_type': classify_drug_type,
+            }
+        
+        logger.info("Loaded %d drugs (dataset %s), model: %s", len(self.feature_store),
+                    self.manifest['dataset_version'], self.manifest.get('scorer') or 'rule-based')
+        
+        # Dữ liệu/mô hình đã thay đổi, kết quả cache cũ không còn đúng
+        self.search_cache.invalidate()
+    
+    def sync_live_drugs(self, force=False):
+        """Áp dụng các thêm/xóa mới trong drugs_master vào engine, không build lại bundle.
+
+        Mặc định chỉ đọc nhật ký thay đổi tối đa mỗi LIVE_SYNC_INTERVAL giây và bỏ qua
+        nếu luồng khác đang đồng bộ; force=True chờ và đọc ngay (sau khi admin thêm/xóa).
+        Trả về số thuốc đã thay đổi.
+        """
+        if not force and time.monotonic() - self.live_synced_at < self.LIVE_SYNC_INTERVAL:
+            return 0
+        if not self._live_lock.acquire(blocking=force):
+            return 0
         try:
-            # Đường dẫn chính xác tới file mô hình
-            model_path = r"D:\OU\DoAn\DrugRecommandation\Web\models\drug_recommendation_model.pkl"
-            fallback_path = r"D:\OU\DoAn\DrugRecommandation\Modeling\final_dataset.csv"
+            self.live_synced_at = time.monotonic()
+            if self.live_synced_at - self.live_pruned_at >= self.LIVE_PRUNE_INTERVAL:
+                self.live_pruned_at = self.live_synced_at
+                prune_drug_changes(f'{socket.gethostname()}:{os.getpid()}', self.live_seq)
+            seq, drug_ids, full = get_drug_changes(self.live_seq)
+            if full:
+                # Nhật ký đã bị cắt qua seq của engine: đồng bộ lại toàn bộ, bỏ thuốc không còn
+                drug_ids = list(dict.fromkeys(drug_ids + self.live_drugs.drug_ids()))
+            if not drug_ids:
+                self.live_seq = seq
+                return 0
             
-            print(f"Trying to load model from: {os.path.abspath(model_path)}")
+            rows = get_drugs_by_ids(drug_ids)
+            for drug_id in drug_ids:
+                row = rows.get(drug_id)
+                if row is None:
+                    self.live_drugs.remove(drug_id)
+                    continue
+                pos = LiveDrugSegment.position(drug_id)
+                # Loại thuốc phân theo tên như thuốc trong bundle (drug_class do admin gõ tự do
+                # không khớp nhãn lớp của mô hình nên không dùng để cộng điểm ML)
+                self.live_drugs.upsert(drug_id, drug_features(
+                    pos, row['drug_name'], row['ingredients'] or None, row['indication'] or None,
+                    None, None, self.LIVE_DRUG_SOURCE, self._classify_drug_from_name
+                ))
+            self.live_seq = seq
             
-            if os.path.exists(model_path):
-                print("Loading trained model...")
-                with open(model_path, 'rb') as f:
-                    self.model_package = pickle.load(f)
-                
-                # Thêm hàm classify_drug_type vào model package nếu chưa có
-                if 'classify_drug_type' not in self.model_package:
-                    self.model_package['classify_drug_type'] = classify_drug_type
-                
-                self.data_final = self.model_package['data_final']
-                print(f"Loaded ML model with {len(self.data_final)} drugs")
-                print(f"Model info: {self.model_package.get('training_info', {})}")
-                
-            elif os.path.exists(fallback_path):
-                print("Loading dataset without model...")
-                self.data_final = pd.read_csv(fallback_path, encoding='utf-8')
-                print(f"Loaded dataset: {len(self.data_final)} drugs")
-                
-            else:
-                print("Loading final_dataset.csv from current directory...")
-                current_dataset = "final_dataset.csv"
-                if os.path.exists(current_dataset):
-                    self.data_final = pd.read_csv(current_dataset, encoding='utf-8')
-                    print(f"Loaded current dataset with {len(self.data_final)} drugs")
-                else:
-                    raise FileNotFoundError("No dataset found")
-                
-        except Exception as e:
-            print(f"Error loading models: {e}")
-            # Tạo dummy data backup từ dataset thực
-            self.data_final = pd.DataFrame({
-                'ten_thuoc': ['Paracetamol: thuốc giảm đau hạ sốt', 'Aspirin: thuốc chống viêm giảm đau', 'Amoxicillin: thuốc kháng sinh'],
-                'thanh_phan': ['Paracetamol 500mg', 'Aspirin 325mg', 'Amoxicillin 500mg'],
-                'chi_dinh': ['giảm đau, hạ sốt, đau đầu', 'giảm đau, chống viêm, đau khớp', 'nhiễm trùng, viêm phổi, viêm họng'],
-                'chong_chi_dinh': ['Suy gan nặng', 'Hen suyễn, xuất huyết', 'Dị ứng penicillin'],
-                'tac_dung_phu': ['Buồn nôn, đau bụng', 'Chảy máu dạ dày', 'Tiêu chảy, nôn'],
-                'source': ['DieuTri', 'DieuTri', 'DieuTri']
-            })
-            print(f"Created backup data with {len(self.data_final)} drugs")
-        
-        # Debug thông tin dataset
-        if self.data_final is not None:
-            print(f"Dataset info:")
-            print(f"   Columns: {self.data_final.columns.tolist()}")
-            print(f"   Shape: {self.data_final.shape}")
-            print(f"   Sample drug names: {self.data_final['ten_thuoc'].head().tolist()}")
+            # Kết quả xếp hạng đã cache không còn đúng
+            self.search_cache.invalidate()
+            logger.info("Synced %d changed drugs, %d live drugs", len(drug_ids), len(self.live_drugs))
+            return len(drug_ids)
+        finally:
+            self._live_lock.release()
     
     def _create_symptom_mapping(self):
-        return {
-            'đau đầu': ['đau đầu', 'nhức đầu', 'migraine', 'đau nửa đầu', 'headache'],
-            'sốt': ['sốt', 'fever', 'nóng sốt', 'ốm sốt', 'sốt cao', 'hạ sốt'],
-            'ho': ['ho', 'cough', 'ho khan', 'ho có đờm', 'ho kéo dài', 'ho dai dẳng'],
-            'đau bụng': ['đau bụng', 'đau dạ dày', 'đau tử tràng', 'quặn bụng', 'stomach'],
-            'tiêu chảy': ['tiêu chảy', 'diarrhea', 'đi lỏng', 'phân lỏng', 'tiêu chay'],
-            'cảm lạnh': ['cảm lạnh', 'cảm cúm', 'nghẹt mũi', 'flu', 'cúm', 'cold'],
-            'đau họng': ['đau họng', 'viêm họng', 'sưng họng', 'khàn tiếng', 'sore throat'],
-            'dị ứng': ['dị ứng', 'ngứa', 'mẩn đỏ', 'allergy', 'phát ban', 'allergic'],
-            'viêm nhiễm': ['viêm', 'nhiễm trùng', 'infection', 'kháng sinh', 'nhiễm khuẩn'],
-            'đau khớp': ['đau khớp', 'viêm khớp', 'đau cơ', 'đau xương', 'arthritis'],
-            'buồn nôn': ['buồn nôn', 'nôn mửa', 'nausea', 'ói mửa', 'nôn'],
-            'mệt mỏi': ['mệt mỏi', 'mệt', 'fatigue', 'kiệt sức', 'yếu'],
-            'chóng mặt': ['chóng mặt', 'hoa mắt', 'dizzy', 'dizziness', 'đầu quay'],
-            'táo bón': ['táo bón', 'khó đi tiêu', 'constipation', 'táo bon'],
-            'viêm da': ['viêm da', 'eczema', 'dermatitis', 'da viêm', 'da bị viêm']
-        }
+        return {symptom: list(keywords) for symptom, keywords in SYMPTOM_MAPPING.items()}
     
     def predict_drug_category(self, symptoms):
         """Sử dụng mô hình đã được huấn luyện để dự đoán loại thuốc"""
+        prediction = self.predict_drug_categories([symptoms])[0]
+        if prediction['method'] == 'ML':
+            logger.debug("ML Prediction: %s (confidence: %.3f)", prediction['predicted_class'], prediction['confidence'])
+        return prediction
+    
+    def predict_drug_categories(self, symptoms_list):
+        """Dự đoán loại thuốc cho nhiều triệu chứng bằng compiled scorer (một lần cho cả lô)"""
         if not self.model_package:
-            print("No trained model available, using rule-based classification")
-            return self._rule_based_classification(symptoms)
+            logger.debug("No trained model available, using rule-based classification")
+            return [self._rule_based_classification(symptoms) for symptoms in symptoms_list]
+        
+        if not symptoms_list:
+            return []
         
         try:
-            symptoms_clean = symptoms.lower().strip()
-            
-            # TF-IDF transform
-            tfidf_vectorizer = self.model_package['tfidf_vectorizer']
-            X_text = tfidf_vectorizer.transform([symptoms_clean])
-            
-            # Numeric features
-            safe_features = self.model_package['safe_numeric_features']
-            X_numeric = np.zeros((1, len(safe_features)))
-            
-            # Combine
-            X_combined = hstack([X_text, X_numeric])
-            
-            # Predict
-            model = self.model_package['best_model']
-            le = self.model_package['le_drug_type']
-            
-            prediction = model.predict(X_combined)[0]
-            probabilities = model.predict_proba(X_combined)[0]
-            
-            predicted_class = le.inverse_transform([prediction])[0]
-            confidence = max(probabilities)
+            symptoms_clean = [symptoms.lower().strip() for symptoms in symptoms_list]
             
-            print(f"ML Prediction: {predicted_class} (confidence: {confidence:.3f})")
-            
-            return {
-                'predicted_class': predicted_class,
-                'confidence': confidence,
-                'method': 'ML'
-            }
+            # model_package chỉ có khi bundle có compiled scorer (xem _apply_artifacts)
+            scorer = self.model_package['compiled_scorer']
+            return [
+                {'predicted_class': predicted_class, 'confidence': confidence, 'method': 'ML'}
+                for predicted_class, confidence in scorer.predict(symptoms_clean)
+            ]
         except Exception as e:
-            print(f"ML prediction error: {e}, falling back to rule-based")
-            return self._rule_based_classification(symptoms)
+            logger.warning("ML prediction error: %s, falling back to rule-based", e)
+            return [self._rule_based_classification(symptoms) for symptoms in symptoms_list]
     
     def _rule_based_classification(self, symptoms):
         """Phân loại dựa trên quy tắc khi không có mô hình ML"""
@@ -183,76 +236,196 @@ class EnhancedDrugRecommendationEngine:
         else:
             return {'predicted_class': 'tổng hợp', 'confidence': 0.5, 'method': 'rule-based'}
     
-    def search_by_symptoms(self, symptoms, limit=15):
-        """Tìm thuốc với logic cải tiến dựa trên mô hình đã huấn luyện"""
-        if self.data_final is None:
+    def search_modes(self):
+        """Các chế độ xếp hạng dùng được với bundle hiện tại"""
+        return tuple(mode for mode in self.SEARCH_MODES if mode == 'keyword' or self._vector_index(mode) is not None)
+    
+    def _vector_index(self, mode):
+        return {'tfidf': self.tfidf_index, 'semantic': self.semantic_index}.get(mode)
+    
+    def _check_mode(self, mode):
+        if mode not in self.search_modes():
+            raise ValueError(f"Chế độ tìm kiếm không hỗ trợ: {mode} (có: {', '.join(self.search_modes())})")
+    
+    def search_by_symptoms(self, symptoms, limit=15, offset=0, fields=None, mode=DEFAULT_SEARCH_MODE):
+        """Tìm thuốc với logic cải tiến dựa trên mô hình đã huấn luyện.
+
+        fields (trong SEARCH_FIELDS) giới hạn các trường dựng cho mỗi thuốc, None = đầy đủ.
+        mode (trong search_modes()) chọn cách xếp hạng.
+        """
+        if self.feature_store is None or self.symptom_index is None:
             return {'drugs': [], 'detected_symptoms': [], 'total_found': 0}
         
+        self._check_mode(mode)
+        query = normalize_query(symptoms)
+        ranking = self.search_cache.get_or_compute((mode, query), lambda: self._rank_symptoms(query, mode=mode))
+        
+        # Chỉ chọn top (offset + limit) rồi dựng bản ghi đầy đủ cho trang trả về
+        offset = max(offset, 0)
+        with SEARCH_STAGE_SECONDS.time(stage='materialize'):
+            positions, scores = top_k(ranking['positions'], ranking['scores'], offset + limit)
+            drugs = self._materialize(positions[offset:], scores[offset:], ranking['matched_keywords'], fields)
+        
+        total_found = len(ranking['positions'])
+        next_offset = offset + len(drugs)
+        
+        return {
+            'drugs': drugs,
+            'detected_symptoms': list(ranking['detected_symptoms']),
+            'corrected_query': ranking['corrected_query'],
+            'corrections': [dict(correction) for correction in ranking['corrections']],
+            'total_found': total_found,
+            'ml_prediction': dict(ranking['ml_prediction']),
+            'mode': mode,
+            'offset': offset,
+            'next_offset': next_offset if next_offset < total_found else None
+        }
+    
+    def search_batch(self, symptoms_list, limit=15, fields=None, mode=DEFAULT_SEARCH_MODE):
+        """Tìm thuốc cho nhiều truy vấn, dự đoán ML cho cả lô trong một lần"""
+        if self.feature_store is None or self.symptom_index is None:
+            return [{'drugs': [], 'detected_symptoms': [], 'total_found': 0} for _ in symptoms_list]
+        
+        self._check_mode(mode)
+        queries = [normalize_query(symptoms) for symptoms in symptoms_list]
+        unique_queries = list(dict.fromkeys(queries))
+        corrections = {query: self._correct_query(query) for query in unique_queries}
+        with SEARCH_STAGE_SECONDS.time(stage='ml_predict'):
+            predictions = dict(zip(unique_queries, self.predict_drug_categories(
+                [corrections[query][0] for query in unique_queries]
+            )))
+        
+        for query in unique_queries:
+            self.search_cache.get_or_compute(
+                (mode, query),
+                lambda query=query: self._rank_symptoms(query, predictions[query], corrections[query], mode)
+            )
+        
+        return [self.search_by_symptoms(query, limit=limit, fields=fields, mode=mode) for query in queries]
+    
+    def _correct_query(self, query):
+        """(truy vấn đã sửa lỗi gõ/thiếu dấu, danh sách sửa đổi)"""
+        if self.query_corrector is None:
+            return query, []
+        with SEARCH_STAGE_SECONDS.time(stage='query_correction'):
+            return self.query_corrector.correct(query)
+    
+    def _rank_symptoms(self, symptoms, ml_prediction=None, correction=None, mode=DEFAULT_SEARCH_MODE):
+        """Chấm điểm các thuốc khớp triệu chứng, chỉ giữ mảng (vị trí, điểm)"""
+        SEARCH_RESULTS.inc()
+        
+        # Sửa lỗi gõ/thiếu dấu trước, mọi bước sau dùng truy vấn đã sửa
+        symptoms, corrections = correction if correction is not None else self._correct_query(symptoms)
+        
         # ML prediction hoặc rule-based
-        ml_prediction = self.predict_drug_category(symptoms)
+        if ml_prediction is None:
+            with SEARCH_STAGE_SECONDS.time(stage='ml_predict'):
+                ml_prediction = self.predict_drug_category(symptoms)
         
         # Detect symptoms
-        symptoms_clean = symptoms.lower()
-        detected_symptoms = []
-        matched_keywords = set()
-        
-        for symptom, keywords in self.symptom_mapping.items():
-            for keyword in keywords:
-                if keyword in symptoms_clean:
-                    detected_symptoms.append({
-                        'name': symptom, 
-                        'category': self._get_symptom_category(symptom)
-                    })
-                    matched_keywords.update(keywords)
-                    break
-        
-        # Search drugs in chi_dinh column
-        matches = []
-        
-        for idx, row in self.data_final.iterrows():
-            if pd.notna(row['chi_dinh']):
-                indication = str(row['chi_dinh']).lower()
-                score = 0
-                matched_symptoms = []
-                
-                # Score based on keyword matching
-                for keyword in matched_keywords:
-                    if keyword in indication:
-                        score += 1
-                        matched_symptoms.append(keyword)
-                
-                # ML bonus score
-                if ml_prediction and score > 0:
-                    drug_category = self._classify_drug_from_name(row['ten_thuoc'])
-                    if ml_prediction['predicted_class'].lower() in drug_category.lower():
-                        score += 2
-                        print(f"ML bonus for {row['ten_thuoc'][:50]} - predicted: {ml_prediction['predicted_class']}, drug_cat: {drug_category}")
-                
-                # Fuzzy matching cho exact symptoms
-                for symptom_word in symptoms_clean.split():
-                    if len(symptom_word) >= 3 and symptom_word in indication:
-                        score += 0.5
-                
-                # Add to matches if score > 0
-                if score > 0:
-                    drug_info = self._get_drug_info(idx, row)
-                    drug_info['score'] = round(score, 1)
-                    drug_info['matched_symptoms'] = matched_symptoms[:3]
-                    drug_info['confidence_level'] = self._get_confidence_level(score)
-                    matches.append(drug_info)
-        
-        # Sort by score
-        matches.sort(key=lambda x: x['score'], reverse=True)
-        
-        print(f"Found {len(matches)} matches for symptoms: {symptoms}")
+        with SEARCH_STAGE_SECONDS.time(stage='symptom_detection'):
+            symptoms_clean = symptoms.lower()
+            detected_symptoms = []
+            matched_keywords = set()
+            
+            # Một lượt quét truy vấn cho mọi từ khóa, nhóm triệu chứng giữ thứ tự của symptom_mapping
+            found = set()
+            for keyword_id in self.symptom_matcher.find_ids(symptoms_clean):
+                found.update(self._keyword_symptoms[keyword_id])
+            for symptom_id in sorted(found):
+                symptom = self._symptom_names[symptom_id]
+                detected_symptoms.append({
+                    'name': symptom, 
+                    'category': self._get_symptom_category(symptom)
+                })
+                matched_keywords.update(self.symptom_mapping[symptom])
+        
+        predicted_class = ml_prediction['predicted_class'] if ml_prediction else None
+        if mode == 'keyword':
+            positions, scores = self._score_keywords(symptoms_clean, matched_keywords, predicted_class)
+        else:
+            positions, scores = self._score_vector(mode, symptoms_clean, predicted_class)
+        
+        logger.debug("Found %d matches for symptoms: %s", len(positions), symptoms)
         
         return {
-            'drugs': matches[:limit],
+            'positions': positions,
+            'scores': scores,
+            'matched_keywords': list(matched_keywords),
             'detected_symptoms': detected_symptoms,
-            'total_found': len(matches),
-            'ml_prediction': ml_prediction
+            'ml_prediction': ml_prediction,
+            'corrected_query': symptoms if corrections else None,
+            'corrections': corrections
         }
     
+    def _score_keywords(self, symptoms_clean, matched_keywords, predicted_class):
+        # Search drugs in chi_dinh column qua chỉ mục ngược
+        with SEARCH_STAGE_SECONDS.time(stage='score'):
+            positions, scores, _ = self.symptom_index.score(matched_keywords, symptoms_clean.split(), predicted_class)
+            
+            # Thuốc thêm trực tiếp nằm sau mọi thuốc của bundle nên thứ tự vị trí vẫn tăng dần
+            if len(self.live_drugs):
+                live_positions, live_scores, _ = self.live_drugs.score(
+                    matched_keywords, symptoms_clean.split(), predicted_class
+                )
+                positions = np.concatenate([positions, live_positions])
+                scores = np.concatenate([scores, live_scores])
+        return positions, scores
+    
+    def _score_vector(self, mode, symptoms_clean, predicted_class):
+        """Cosine với truy vấn: TF-IDF (tích ma trận thưa-vector) hoặc semantic (IVF trên vector int8)"""
+        index = self._vector_index(mode)
+        with SEARCH_STAGE_SECONDS.time(stage=f'score_{mode}'):
+            vector = index.vectorize(symptoms_clean)
+            category_mask = self.symptom_index.category_mask(predicted_class) if predicted_class else None
+            positions, scores = index.score(vector, category_mask)
+            if len(self.live_drugs):
+                live_positions, live_scores = self.live_drugs.score_similarity(index, vector, predicted_class)
+                positions = np.concatenate([positions, live_positions])
+                scores = np.concatenate([scores, live_scores])
+        return positions, scores
+    
+    def _materialize(self, positions, scores, matched_keywords, fields=None):
+        """Dựng bản ghi thuốc cho các vị trí của trang kết quả, chỉ các trường trong fields"""
+        positions = positions.tolist()
+        wanted = set(self.SEARCH_FIELDS if fields is None else fields)
+        record_fields = None if fields is None else [name for name in fields if name in RECORD_FIELDS]
+        records = self._records(positions, record_fields)
+        if 'matched_symptoms' in wanted:
+            indications = self._indications_lower(positions)
+        
+        drugs = []
+        for i, (pos, score) in enumerate(zip(positions, scores.tolist())):
+            drug_info = records[i]
+            if drug_info is None:
+                # Thuốc vừa bị xóa sau khi kết quả được xếp hạng
+                continue
+            if 'score' in wanted:
+                drug_info['score'] = round(score, 1)
+            if 'matched_symptoms' in wanted:
+                drug_info['matched_symptoms'] = [keyword for keyword in matched_keywords if keyword in indications[i]][:3]
+            if 'confidence_level' in wanted:
+                drug_info['confidence_level'] = self._get_confidence_level(score)
+            drugs.append(drug_info)
+        return drugs
+    
+    def _records(self, positions, fields=None):
+        """Bản ghi theo đúng thứ tự positions (None nếu không có thuốc), đọc feature store một lần"""
+        base = [pos for pos in positions if 0 <= pos < len(self.feature_store)]
+        records = dict(zip(base, self.feature_store.records(base, fields)))
+        return [
+            self.live_drugs.record(pos, fields) if pos >= LIVE_DRUG_OFFSET else records.get(pos)
+            for pos in positions
+        ]
+    
+    def _indications_lower(self, positions):
+        base = [pos for pos in positions if pos < LIVE_DRUG_OFFSET]
+        indications = dict(zip(base, self.feature_store.take('indication_lower', base)))
+        for pos in positions:
+            if pos >= LIVE_DRUG_OFFSET:
+                indications[pos] = (self.live_drugs.features(pos) or {}).get('indication_lower')
+        return [indications[pos] or '' for pos in positions]
+    
     def _get_symptom_category(self, symptom):
         categories = {
             'đau đầu': 'Thần kinh',
@@ -310,114 +483,115 @@ class EnhancedDrugRecommendationEngine:
         else:
             return 'Thấp'
     
-    def _get_drug_info(self, idx, row):
-        """Lấy thông tin thuốc từ final_dataset"""
-        # Parse drug name and indication
-        drug_name = str(row['ten_thuoc']) if pd.notna(row['ten_thuoc']) else f"Thuốc {idx}"
-        
-        # Extract main name and description
-        if ':' in drug_name:
-            name_parts = drug_name.split(':', 1)
-            main_name = name_parts[0].strip()
-            description = name_parts[1].strip() if len(name_parts) > 1 else ""
-        else:
-            main_name = drug_name
-            description = ""
-        
-        # Get other information
-        ingredients = str(row['thanh_phan']) if pd.notna(row['thanh_phan']) else 'Không có thông tin'
-        indications = str(row['chi_dinh']) if pd.notna(row['chi_dinh']) else 'Không có thông tin'
-        contraindications = str(row['chong_chi_dinh']) if pd.notna(row['chong_chi_dinh']) else 'Không có thông tin'
-        side_effects = str(row['tac_dung_phu']) if pd.notna(row['tac_dung_phu']) else 'Không có thông tin'
-        source = str(row['source']) if pd.notna(row['source']) else 'Không rõ nguồn'
-        
-        # Parse to lists
-        indication_list = self._parse_to_list(indications)
-        ingredients_list = self._parse_to_list(ingredients)
-        contraindication_list = self._parse_to_list(contraindications)
-        side_effects_list = self._parse_to_list(side_effects)
-        
-        return {
-            'index': idx,
-            'name': main_name,
-            'description': description,
-            'drug_class': self._classify_drug_from_name(drug_name),
-            'price': 'Liên hệ để biết giá',
-            'manufacturer': 'Xem trên bao bì',
-            'source': source,
-            'prescription_required': self._requires_prescription(drug_name),
-            
-            # Detailed information
-            'indication': indications,
-            'ingredients': ingredients,
-            'contraindication': contraindications,
-            'side_effects': side_effects,
-            
-            # Lists for display
-            'indication_list': indication_list,
-            'ingredients_list': ingredients_list,
-            'dosage_list': ['Theo chỉ định của bác sĩ', 'Đọc kỹ hướng dẫn sử dụng'],
-            'contraindication_list': contraindication_list,
-            'side_effects_list': side_effects_list,
-            
-            # For search results
-            'matched_symptoms': []
-        }
+    def _get_drug_info(self, idx):
+        """Lấy thông tin thuốc từ feature store (đã tính sẵn khi load) hoặc thuốc thêm trực tiếp"""
+        if idx >= LIVE_DRUG_OFFSET:
+            return self.live_drugs.record(idx)
+        return self.feature_store.record(idx)
     
     def _parse_to_list(self, text):
         """Parse text thành list"""
-        if not text or text == 'Không có thông tin':
-            return ['Không có thông tin']
-        
-        # Split by common delimiters
-        items = re.split(r'[.;,\n]', text)
-        items = [item.strip() for item in items if item.strip()]
-        
-        # Remove duplicates and empty items
-        seen = set()
-        result = []
-        for item in items:
-            if item and item not in seen and len(item) > 3:
-                seen.add(item)
-                result.append(item)
-        
-        return result if result else [text]
+        return parse_to_list(text)
     
     def _requires_prescription(self, drug_name):
         """Check if drug requires prescription"""
-        prescription_drugs = [
-            'antibiotic', 'kháng sinh', 'corticosteroid', 'insulin',
-            'morphine', 'tramadol', 'antidepressant', 'anti'
-        ]
-        
-        drug_lower = str(drug_name).lower()
-        return any(drug in drug_lower for drug in prescription_drugs)
+        return requires_prescription(drug_name)
     
     def get_enhanced_drug_info(self, idx):
         """Lấy chi tiết thuốc"""
-        if self.data_final is None or idx >= len(self.data_final):
+        if self.feature_store is None or len(self.feature_store) <= idx < LIVE_DRUG_OFFSET:
             return {'error': 'Không tìm thấy thuốc'}
         
-        row = self.data_final.iloc[idx]
-        return self._get_drug_info(idx, row)
+        return self._get_drug_info(idx) or {'error': 'Không tìm thấy thuốc'}
+    
+    def drug_detail_etag(self, idx):
+        """ETag mạnh cho /drug/<idx>, không cần dựng chi tiết; None nếu không có thuốc"""
+        if self.manifest is not None and 0 <= idx < len(self.feature_store):
+            return f"{self.manifest['dataset_version']}-{DETAIL_FORMAT}-{idx}"
+        detail = self.live_drugs.detail(idx)
+        if detail is None:
+            return None
+        return f"live-{hashlib.sha256(detail).hexdigest()[:16]}"
+    
+    def get_drug_detail_json(self, idx):
+        """JSON chi tiết thuốc đã serialize sẵn (bytes), None nếu không có thuốc"""
+        if self.drug_details is not None and 0 <= idx < len(self.drug_details):
+            return self.drug_details.blob[self.drug_details.offsets[idx]:self.drug_details.offsets[idx + 1]].tobytes()
+        return self.live_drugs.detail(idx)
+    
+    def get_drugs_info(self, indices, fields=None):
+        """Chi tiết nhiều thuốc trong một lần: {vị trí: bản ghi}, vị trí không tồn tại bị bỏ qua"""
+        if self.feature_store is None:
+            return {}
+        
+        positions = list(dict.fromkeys(int(idx) for idx in indices))
+        return {
+            pos: record for pos, record in zip(positions, self._records(positions, fields)) if record is not None
+        }
     
     def get_dataset_stats(self):
-        """Thống kê dataset"""
-        if self.data_final is None:
+        """Thống kê dataset (lấy từ manifest của bundle)"""
+        if self.manifest is None:
             return {}
         
         return {
-            'total_drugs': len(self.data_final),
-            'sources': self.data_final['source'].value_counts().to_dict() if 'source' in self.data_final.columns else {},
-            'columns': self.data_final.columns.tolist(),
-            'sample_drugs': self.data_final['ten_thuoc'].head(10).tolist(),
+            'total_drugs': len(self.feature_store) + len(self.live_drugs),
+            'live_drugs': len(self.live_drugs),
+            'dataset_version': self.manifest['dataset_version'],
+            'sources': self.manifest['stats']['sources'],
+            'columns': self.manifest['stats']['columns'],
+            'sample_drugs': self.manifest['stats']['sample_drugs'],
             'model_loaded': self.model_package is not None,
-            'training_info': self.model_package.get('training_info', {}) if self.model_package else {}
+            'training_info': self.model_package.get('training_info', {}) if self.model_package else {},
+            'search_modes': list(self.search_modes()),
+            'search_cache': self.search_cache.stats()
         }
 
-# Khởi tạo engine
-print("Initializing Drug Recommendation Engine...")
-engine = EnhancedDrugRecommendationEngine()
+# Engine dùng chung cho mọi request, khởi tạo trong create_app(), reload nóng qua holder
+engine_holder = EngineHolder(EnhancedDrugRecommendationEngine, get_recent_search_queries)
+
+def create_app(engine_instance=None, artifact_dir=None):
+    """Khởi tạo database và engine rồi trả về app.
+
+    Engine chỉ load một lần cho mỗi process. Khi chạy production (wsgi.py với
+    gunicorn preload), hàm này chạy trong master trước khi fork nên các worker
+    dùng chung engine đã load thay vì mỗi worker tự load một bản.
+    """
+    configure_logging()
+    init_database()
+    if engine_instance is not None:
+        engine_holder.set(engine_instance)
+    elif engine_holder.current is None:
+        logger.info("Initializing Drug Recommendation Engine...")
+        engine_holder.set(EnhancedDrugRecommendationEngine(artifact_dir))
+    engine_holder.current.sync_live_drugs(force=True)
+    return app
+
+@app.before_request
+def bind_engine():
+    """Gắn engine hiện tại vào request: reload giữa chừng không ảnh hưởng request đang chạy"""
+    g.request_started = time.perf_counter()
+    g.engine = engine_holder.current
+    if g.engine is not None:
+        # Luồng theo dõi bundle chạy trong từng worker (sau fork)
+        engine_holder.watch()
+        # Nhận thuốc admin thêm/xóa ở worker khác (đọc nhật ký tối đa mỗi giây)
+        g.engine.sync_live_drugs()
+
+@app.after_request
+def record_request_metrics(response):
+    """Đếm request và đo thời gian theo route (mẫu URL, không phải URL cụ thể)"""
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method)
+        HTTP_REQUESTS.inc(route=route, method=request.method, status=str(response.status_code))
+    return response
+
+# Nén gzip/brotli response JSON (xem compression.py để đổi ngưỡng/mức nén). Flask chạy
+# after_request theo thứ tự ngược lúc đăng ký: đăng ký sau record_request_metrics để
+# thời gian nén được tính vào http_request_duration_seconds
+init_compression(app)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -514,20 +688,111 @@ def index():
 
 
 
+SEARCH_PAGE_SIZE = 15
+SEARCH_MAX_PAGE_SIZE = 50
+
+def parse_search_fields(data):
+    """Trường cần trả về cho mỗi thuốc từ `fields` (list hoặc "a,b") / `view` (full|summary).
+
+    Đọc trong body JSON, không có thì trong query string. None = đầy đủ; sai thì ValueError.
+    """
+    fields = data.get('fields', request.args.get('fields'))
+    view = data.get('view', request.args.get('view'))
+    if fields:
+        if isinstance(fields, str):
+            fields = [name.strip() for name in fields.split(',') if name.strip()]
+        if not isinstance(fields, list) or not all(isinstance(name, str) for name in fields):
+            raise ValueError('fields phải là danh sách tên trường')
+        unknown = [name for name in fields if name not in EnhancedDrugRecommendationEngine.SEARCH_FIELDS]
+        if unknown:
+            raise ValueError(f"Trường không hợp lệ: {', '.join(unknown)}")
+        # Luôn kèm index để client lấy chi tiết qua /drug/<index>
+        return list(dict.fromkeys(['index'] + fields))
+    if view in (None, '', 'full'):
+        return None
+    if view == 'summary':
+        return list(EnhancedDrugRecommendationEngine.SUMMARY_FIELDS)
+    raise ValueError(f"view không hợp lệ: {view} (full hoặc summary)")
+
+def _parse_int(value, name, default):
+    if value is None or value == '':
+        return default
+    # bool là int trong Python nhưng không phải số hợp lệ ở đây
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"{name} phải là số nguyên")
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} phải là số nguyên") from None
+
+def parse_search_offset(value):
+    """Vị trí bắt đầu trang (số nguyên >= 0, mặc định 0); sai thì ValueError"""
+    offset = _parse_int(value, 'offset', 0)
+    if offset < 0:
+        raise ValueError('offset phải >= 0')
+    return offset
+
+def parse_search_limit(data):
+    """Số thuốc mỗi trang từ `limit`, kẹp vào [1, SEARCH_MAX_PAGE_SIZE]; không phải số nguyên thì ValueError"""
+    limit = _parse_int(data.get('limit'), 'limit', SEARCH_PAGE_SIZE) or SEARCH_PAGE_SIZE
+    return min(max(limit, 1), SEARCH_MAX_PAGE_SIZE)
+
+def parse_search_mode(data, engine):
+    """Chế độ xếp hạng từ `mode` (body JSON hoặc query string), mặc định keyword; sai thì ValueError"""
+    mode = data.get('mode', request.args.get('mode')) or EnhancedDrugRecommendationEngine.DEFAULT_SEARCH_MODE
+    if mode not in engine.search_modes():
+        raise ValueError(f"mode không hợp lệ: {mode} (có: {', '.join(engine.search_modes())})")
+    return mode
+
+def encode_search_cursor(symptoms, offset, mode=EnhancedDrugRecommendationEngine.DEFAULT_SEARCH_MODE):
+    """Cursor phân trang: mã hóa truy vấn, vị trí bắt đầu trang kế tiếp và chế độ xếp hạng"""
+    payload = {'q': symptoms, 'o': offset}
+    if mode != EnhancedDrugRecommendationEngine.DEFAULT_SEARCH_MODE:
+        payload['m'] = mode
+    return base64.urlsafe_b64encode(json.dumps(payload, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+def decode_search_cursor(cursor):
+    payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    return str(payload['q']), parse_search_offset(payload['o']), payload.get('m')
+
 @app.route('/search', methods=['POST'])
 def search():
     try:
         data = request.get_json()
-        symptoms = data.get('symptoms', '')
+        cursor = data.get('cursor')
         
-        print(f"Received search request: {symptoms}")
+        if cursor:
+            try:
+                symptoms, offset, cursor_mode = decode_search_cursor(cursor)
+            except (ValueError, KeyError, TypeError, AttributeError):
+                return jsonify({'error': 'Cursor không hợp lệ'}), 400
+        else:
+            symptoms = data.get('symptoms', '')
+            cursor_mode = None
+        
+        try:
+            if not cursor:
+                offset = parse_search_offset(data.get('offset'))
+            limit = parse_search_limit(data)
+            fields = parse_search_fields(data)
+            # Trang tiếp theo giữ chế độ của trang đầu
+            mode = parse_search_mode({'mode': cursor_mode} if cursor_mode else data, g.engine)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        logger.debug("Received search request: %s", symptoms)
         
         if not symptoms:
             return jsonify({'error': 'Vui lòng nhập triệu chứng'})
         
-        results = engine.search_by_symptoms(symptoms, limit=15)
+        results = g.engine.search_by_symptoms(symptoms, limit=limit, offset=offset, fields=fields, mode=mode)
+        results['next_cursor'] = (
+            encode_search_cursor(symptoms, results['next_offset'], mode)
+            if results.get('next_offset') is not None else None
+        )
         
-        if 'user_id' in session:
+        # Chỉ ghi log cho trang đầu, các trang sau là tiếp nối cùng một lần tìm kiếm
+        if 'user_id' in session and offset == 0:
             user_agent = request.headers.get('User-Agent', '')
             
             log_search_enhanced(
@@ -537,7 +802,7 @@ def search():
                 user_agent
             )
 
-        print(f"Search results: {len(results.get('drugs', []))} drugs found")
+        logger.debug("Search results: %d drugs found", len(results.get('drugs', [])))
         
         return jsonify({
             'success': True,
@@ -547,9 +812,49 @@ def search():
         })
         
     except Exception as e:
-        print(f"Search error: {str(e)}")
+        logger.exception("Search error: %s", e)
         return jsonify({'error': f'Lỗi tìm kiếm: {str(e)}'})
     
+SEARCH_BATCH_MAX_QUERIES = 500
+
+@app.route('/search/batch', methods=['POST'])
+def search_batch():
+    """API tìm thuốc cho nhiều mô tả triệu chứng trong một request"""
+    try:
+        data = request.get_json()
+        queries = data.get('queries')
+        
+        if not isinstance(queries, list) or not queries:
+            return jsonify({'error': 'Vui lòng gửi danh sách triệu chứng (queries)'})
+        
+        if len(queries) > SEARCH_BATCH_MAX_QUERIES:
+            return jsonify({'error': f'Tối đa {SEARCH_BATCH_MAX_QUERIES} truy vấn mỗi request'})
+        
+        if not all(isinstance(q, str) and q.strip() for q in queries):
+            return jsonify({'error': 'Mỗi truy vấn phải là chuỗi triệu chứng không rỗng'})
+        
+        try:
+            limit = parse_search_limit(data)
+            fields = parse_search_fields(data)
+            mode = parse_search_mode(data, g.engine)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        batch_results = g.engine.search_batch(queries, limit=limit, fields=fields, mode=mode)
+        
+        return jsonify({
+            'success': True,
+            'results': [
+                {'symptoms': symptoms, 'results': results}
+                for symptoms, results in zip(queries, batch_results)
+            ],
+            'timestamp': pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+        })
+        
+    except Exception as e:
+        logger.exception("Batch search error: %s", e)
+        return jsonify({'error': f'Lỗi tìm kiếm: {str(e)}'})
+
 @app.route('/search_history')
 @login_required
 def search_history_page():
@@ -634,23 +939,79 @@ def repeat_search(history_id):
         flash(f'Lỗi: {str(e)}', 'error')
         return redirect(url_for('search_history_page'))
 
+# Chi tiết cố định theo dataset_version; sau max-age trình duyệt hỏi lại bằng If-None-Match
+DRUG_DETAIL_CACHE_CONTROL = 'public, max-age=60, must-revalidate'
+
 @app.route('/drug/<int:drug_id>')
 def drug_detail(drug_id):
-    try:
-        drug = engine.get_enhanced_drug_info(drug_id)
-        return jsonify(drug)
-    except Exception as e:
-        return jsonify({'error': f'Không tìm thấy thuốc: {str(e)}'})
+    """Chi tiết thuốc (JSON serialize sẵn trong bundle), hỗ trợ ETag/304"""
+    etag = g.engine.drug_detail_etag(drug_id)
+    if etag is None:
+        return jsonify({'error': 'Không tìm thấy thuốc'}), 404
+    
+    matched = matching_etag(request, etag)
+    if matched:
+        # 304 trả lại đúng biến thể (đã nén hay chưa) mà client đang giữ
+        response = app.response_class(status=304)
+        response.set_etag(matched)
+        # Như response 200: biến thể phụ thuộc Accept-Encoding (304 không có mimetype nên hook nén không gắn)
+        response.vary.add('Accept-Encoding')
+    else:
+        body = g.engine.get_drug_detail_json(drug_id)
+        if body is None:
+            # Thuốc thêm trực tiếp vừa bị xóa
+            return jsonify({'error': 'Không tìm thấy thuốc'}), 404
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = DRUG_DETAIL_CACHE_CONTROL
+    return response
+
+MAX_BATCH_DRUGS = 200
+
+@app.route('/drugs', methods=['POST'])
+def drugs_batch():
+    """Chi tiết nhiều thuốc trong một request: {"indices": [...]}"""
+    data = request.get_json(silent=True) or {}
+    indices = data.get('indices')
+    if not isinstance(indices, list) or not all(isinstance(idx, int) for idx in indices):
+        return jsonify({'error': 'indices phải là danh sách số nguyên'}), 400
+    if len(indices) > MAX_BATCH_DRUGS:
+        return jsonify({'error': f'Tối đa {MAX_BATCH_DRUGS} thuốc mỗi request'}), 400
+    
+    drugs = g.engine.get_drugs_info(indices)
+    return jsonify({
+        'drugs': [drugs[idx] for idx in dict.fromkeys(indices) if idx in drugs],
+        'missing': [idx for idx in dict.fromkeys(indices) if idx not in drugs]
+    })
+
+def _engine_gauges():
+    engine = engine_holder.current
+    if engine is None:
+        return {}
+    return {(name,): value for name, value in engine.search_cache.stats().items() if name not in ('maxsize', 'ttl')}
+
+def _search_log_gauges():
+    stats = search_log_writer.stats()
+    return {(name,): stats[name] for name in ('pending', 'queued', 'flushed', 'dropped', 'failed')}
+
+REGISTRY.gauge('drug_search_cache', 'Thống kê cache kết quả tìm kiếm của engine hiện tại', ('stat',), _engine_gauges)
+REGISTRY.gauge('search_log_writer', 'Thống kê hàng đợi ghi search_logs', ('stat',), _search_log_gauges)
+
+@app.route('/metrics')
+def metrics():
+    """Số liệu của process này theo định dạng Prometheus"""
+    return app.response_class(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
 
 @app.route('/debug')
 def debug():
-    stats = engine.get_dataset_stats()
+    stats = g.engine.get_dataset_stats()
+    stats['search_log'] = search_log_writer.stats()
     return jsonify(stats)
 
 @app.route('/stats')
 def stats():
     """API endpoint để lấy thống kê dataset"""
-    return jsonify(engine.get_dataset_stats())
+    return jsonify(g.engine.get_dataset_stats())
 
 @app.route('/save_drug', methods=['POST'])
 @login_required
@@ -712,24 +1073,15 @@ def saved_drugs_page():
     """Trang danh sách thuốc đã lưu"""
     try:
         user_id = session['user_id']
-        print(f"Loading saved drugs for user_id: {user_id}")  # Debug log
+        logger.debug("Loading saved drugs for user_id: %s", user_id)
         
         saved_drugs = get_saved_drugs(user_id)
-        print(f"Found {len(saved_drugs)} saved drugs")  # Debug log
         
-        # Lấy thông tin chi tiết cho từng thuốc
+        # Lấy chi tiết mọi thuốc đã lưu trong một lần, thuốc không còn thì giữ thông tin cơ bản
+        details = g.engine.get_drugs_info(drug['drug_index'] for drug in saved_drugs)
         for drug in saved_drugs:
-            print(f"Processing drug: {drug}")  # Debug log
-            try:
-                detailed_info = engine.get_enhanced_drug_info(drug['drug_index'])
-                if 'error' not in detailed_info:
-                    drug.update(detailed_info)
-                    print(f"Updated drug info successfully")  # Debug log
-                else:
-                    print(f"Error getting drug info: {detailed_info}")  # Debug log
-            except Exception as e:
-                print(f"Exception getting drug info: {e}")  # Debug log
-                pass  # Giữ thông tin cơ bản nếu không lấy được chi tiết
+            drug.update(details.get(drug['drug_index'], {}))
+        logger.debug("Found %d saved drugs, %d with details", len(saved_drugs), len(details))
         
         user = {
             'user_id': session['user_id'],
@@ -738,22 +1090,20 @@ def saved_drugs_page():
             'role': session['role']
         }
         
-        print(f"Rendering template with {len(saved_drugs)} drugs")  # Debug log
         return render_template('saved_drugs.html', 
                              saved_drugs=saved_drugs, 
                              user=user)
                              
     except Exception as e:
-        print(f"Error in saved_drugs_page: {e}")  # Debug log
+        logger.exception("Error in saved_drugs_page: %s", e)
         flash(f'Lỗi tải danh sách thuốc: {str(e)}', 'error')
         return redirect(url_for('index'))
 
 @app.route('/profile')
 @login_required
 def profile():
-    print(f"DEBUG: profile called")  # Debug log
-    print(f"DEBUG: session = {session}")
     """Trang profile người dùng"""
+    logger.debug("profile called for user_id: %s", session.get('user_id'))
     try:
         user_id = session['user_id']
         profile = get_user_profile(user_id)
@@ -769,11 +1119,10 @@ def profile():
             'role': session['role']
         }
         
-        print(f"DEBUG: Rendering profile template with data: {profile}")
         return render_template('profile.html', profile=profile, user=user)
         
     except Exception as e:
-        print(f"DEBUG: Error in profile: {e}")
+        logger.exception("Error in profile: %s", e)
         flash(f'Lỗi tải profile: {str(e)}', 'error')
         return redirect(url_for('index'))
 
@@ -839,7 +1188,7 @@ def change_password_route():
         # Change password
         if change_password(user_id, current_password, new_password):
             flash('Đổi mật khẩu thành công!', 'success')
-            print(f"DEBUG: Changed password for user {user_id}")
+            logger.info("Changed password for user %s", user_id)
         else:
             flash('Đổi mật khẩu thất bại', 'error')
         
@@ -849,7 +1198,7 @@ def change_password_route():
         flash(str(e), 'error')
         return redirect(url_for('profile'))
     except Exception as e:
-        print(f"DEBUG: Error in change_password: {e}")
+        logger.exception("Error in change_password: %s", e)
         flash(f'Lỗi đổi mật khẩu: {str(e)}', 'error')
         return redirect(url_for('profile'))
 
@@ -877,16 +1226,25 @@ def change_password_route():
 
 
 
+ADMIN_DRUGS_PER_PAGE = 50
+
 @app.route('/admin/drugs')
 @admin_required
 def admin_drugs():
     """Trang quản lý thuốc đơn giản"""
-    search = request.args.get('search', '')
-    drugs = get_all_drugs(search if search else None)
+    search = request.args.get('search', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    
+    total = count_drugs(search or None)
+    drugs = get_all_drugs(search or None, limit=ADMIN_DRUGS_PER_PAGE, offset=(page - 1) * ADMIN_DRUGS_PER_PAGE)
+    total_pages = max((total + ADMIN_DRUGS_PER_PAGE - 1) // ADMIN_DRUGS_PER_PAGE, 1)
     
     return render_template('admin/drug_management.html',
                          drugs=drugs,
                          search=search,
+                         total=total,
+                         page=page,
+                         total_pages=total_pages,
                          user=session)
 
 @app.route('/admin/drug/add', methods=['GET', 'POST'])
@@ -904,7 +1262,8 @@ def add_drug():
                 flash('Tên thuốc không được để trống', 'error')
                 return render_template('admin/drug_form.html', mode='add', user=session)
             
-            drug_id = add_drug(drug_name, drug_class, ingredients, indication)
+            drug_id = create_drug(drug_name, drug_class, ingredients, indication)
+            g.engine.sync_live_drugs(force=True)
             flash(f'Đã thêm thuốc thành công (ID: {drug_id})', 'success')
             return redirect(url_for('admin_drugs'))
             
@@ -913,12 +1272,36 @@ def add_drug():
     
     return render_template('admin/drug_form.html', mode='add', user=session)
 
+@app.route('/admin/engine')
+@admin_required
+def engine_status():
+    """Trạng thái engine hiện tại/bản trước và lần reload gần nhất"""
+    return jsonify(engine_holder.status())
+
+@app.route('/admin/engine/reload', methods=['POST'])
+@admin_required
+def engine_reload():
+    """Reload engine ở nền (bundle mặc định hoặc artifact_dir), đổi khi đã warm-up xong"""
+    data = request.get_json(silent=True) or {}
+    if not engine_holder.reload(data.get('artifact_dir')):
+        return jsonify({'error': 'Đang có một lần reload khác'}), 409
+    return jsonify({'status': 'reloading', **engine_holder.status()}), 202
+
+@app.route('/admin/engine/rollback', methods=['POST'])
+@admin_required
+def engine_rollback():
+    """Quay lại engine trước lần reload gần nhất"""
+    if not engine_holder.rollback():
+        return jsonify({'error': 'Không có engine trước đó để rollback'}), 409
+    return jsonify({'status': 'rolled back', **engine_holder.status()})
+
 @app.route('/admin/drug/delete/<int:drug_id>', methods=['POST'])
 @admin_required
 def delete_drug_route(drug_id):
     """Xóa thuốc đơn giản"""
     try:
         if delete_drug(drug_id):
+            g.engine.sync_live_drugs(force=True)
             flash('Đã xóa thuốc thành công', 'success')
         else:
             flash('Không tìm thấy thuốc để xóa', 'error')
@@ -928,4 +1311,4 @@ def delete_drug_route(drug_id):
     return redirect(url_for('admin_drugs'))
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,394 @@
+"""Bundle artifact của engine: dữ liệu thuốc dạng cột, chỉ mục triệu chứng và compiled scorer.
+
+Mỗi bundle là một thư mục có manifest.json (phiên bản định dạng, số thuốc,
+dataset_version, danh sách mảng kèm dtype/shape/sha256) và các file .npy:
+
+    <bundle>/manifest.json
+    <bundle>/drugs/*.npy     cột của DrugFeatureStore (chuỗi = offsets + blob UTF-8)
+    <bundle>/index/*.npy     mảng CSR của SymptomIndex
+    <bundle>/details/*.npy   JSON chi tiết từng thuốc (offsets + blob) cho /drug/<id>
+    <bundle>/spelling/*.npy  bảng sửa lỗi gõ/thiếu dấu của truy vấn (QueryCorrector)
+    <bundle>/tfidf/*.npy     ma trận TF-IDF của các thuốc cho mode=tfidf (chỉ khi có scorer)
+    <bundle>/semantic/*.npy  SVD, vector int8 và cụm IVF cho mode=semantic (chỉ khi có scorer)
+    <bundle>/scorer/         CompiledScorer (meta.json + .npy), có thể không có
+
+Khi load, mọi mảng được memory-map nên thời gian khởi động gần như không phụ
+thuộc kích thước dữ liệu; bundle thiếu hoặc không khớp sẽ báo ArtifactError.
+
+    # bản clone mới: mô hình có sẵn trong models/, final_dataset.csv xuất từ notebook tiền xử lý
+    python artifacts.py build --dataset final_dataset.csv --vectorizer models/tfidf_vectorizer.pkl \\
+        --model models/best_model.pkl --encoder models/label_encoder.pkl \\
+        --numeric-features 8 --out models/engine_bundle
+    python artifacts.py build --package drug_recommendation_model.pkl --out models/engine_bundle
+    python artifacts.py build --package drug_recommendation_model.pkl --tfidf-columns indication,main_name
+    python artifacts.py build --package drug_recommendation_model.pkl --semantic-dimensions 64 --semantic-lists 256
+    python artifacts.py verify models/engine_bundle
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+
+from compiled_scorer import CompiledScorer
+from feature_store import DETAIL_FORMAT, DrugFeatureStore, StringColumn
+from query_correction import CORRECTION_FORMAT, QueryCorrector
+from search_index import SymptomIndex
+from semantic_index import SEMANTIC_DIMENSIONS, SEMANTIC_FORMAT, SemanticIndex
+from tfidf_index import TFIDF_COLUMN_CHOICES, TFIDF_COLUMNS, TFIDF_FORMAT, TfidfIndex
+from utils import SYMPTOM_MAPPING, classify_drug_type, symptom_keywords
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_FORMAT = 1
+MANIFEST_FILE = 'manifest.json'
+ARTIFACT_DIR_ENV = 'DRUG_ENGINE_ARTIFACTS'
+DEFAULT_ARTIFACT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'engine_bundle')
+SCORER_DIR = 'scorer'
+
+
+class ArtifactError(RuntimeError):
+    """Bundle thiếu, hỏng hoặc không khớp với code hiện tại"""
+
+
+class EngineArtifacts:
+    """Các thành phần engine cần để phục vụ, dựng từ DataFrame hoặc load từ bundle"""
+
+    def __init__(self, manifest, feature_store, symptom_index, scorer=None, training_info=None, details=None,
+                 corrector=None, tfidf_index=None, semantic_index=None):
+        self.manifest = manifest
+        self.feature_store = feature_store
+        self.symptom_index = symptom_index
+        self.corrector = corrector
+        # Ma trận TF-IDF cho mode=tfidf, chỉ mục IVF cho mode=semantic; None nếu không có compiled scorer
+        self.tfidf_index = tfidf_index
+        self.semantic_index = semantic_index
+        # StringColumn JSON chi tiết thuốc, serialize một lần cho mỗi dataset_version
+        self.details = details
+        self.scorer = scorer
+        self.training_info = training_info or {}
+
+
+def _dataset_version(arrays):
+    """Hash nội dung các cột thuốc, đổi khi dữ liệu đổi"""
+    digest = hashlib.sha256()
+    for name in sorted(arrays):
+        digest.update(name.encode('utf-8'))
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_artifacts(data_final, model_package=None, symptom_mapping=SYMPTOM_MAPPING, tfidf_columns=TFIDF_COLUMNS,
+                    semantic_dimensions=SEMANTIC_DIMENSIONS, semantic_lists=None):
+    """Dựng artifact trong bộ nhớ từ data_final (+ model_package nếu có)"""
+    classify = (model_package or {}).get('classify_drug_type', classify_drug_type)
+    store = DrugFeatureStore.from_dataframe(data_final, classify)
+    drug_arrays = store.to_arrays()
+    keywords = symptom_keywords(symptom_mapping)
+
+    # Dựng lại store từ mảng để bản trong bộ nhớ giống hệt bản load từ bundle
+    store = DrugFeatureStore.from_arrays(drug_arrays)
+    index = SymptomIndex.build(store.indication_lower, keywords, store.drug_class)
+    detail_arrays = store.detail_arrays()
+    corrector = QueryCorrector.from_index(index, keywords)
+
+    scorer = None
+    training_info = {}
+    if model_package:
+        try:
+            scorer = model_package.get('compiled_scorer') or CompiledScorer.from_model_package(model_package)
+        except Exception as e:
+            raise ArtifactError(f"Không biên dịch được mô hình: {e}") from e
+        training_info = model_package.get('training_info', {})
+    tfidf_index = None if scorer is None else TfidfIndex.build(scorer, store, tfidf_columns)
+    semantic_index = None if tfidf_index is None else SemanticIndex.build(
+        tfidf_index, semantic_dimensions, semantic_lists
+    )
+
+    columns = data_final.columns.tolist()
+    manifest = {
+        'format_version': BUNDLE_FORMAT,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'drug_count': len(store),
+        'dataset_version': _dataset_version(drug_arrays),
+        'detail_format': DETAIL_FORMAT,
+        'correction_format': CORRECTION_FORMAT,
+        'tfidf_format': TFIDF_FORMAT,
+        'tfidf_columns': list(tfidf_columns),
+        'semantic_format': SEMANTIC_FORMAT,
+        'keywords': keywords,
+        'stats': {
+            'sources': {
+                str(source): int(count) for source, count in data_final['source'].value_counts().items()
+            } if 'source' in columns else {},
+            'columns': columns,
+            'sample_drugs': data_final['ten_thuoc'].head(10).tolist(),
+        },
+        'training_info': training_info,
+        'scorer': None if scorer is None else scorer.meta['model']['estimator'],
+    }
+    details = StringColumn(detail_arrays['offsets'], detail_arrays['blob'])
+    return EngineArtifacts(manifest, store, index, scorer, training_info, details, corrector, tfidf_index,
+                           semantic_index)
+
+
+def _save_arrays(directory, arrays):
+    os.makedirs(directory, exist_ok=True)
+    entries = {}
+    for name, array in arrays.items():
+        path = os.path.join(directory, f'{name}.npy')
+        np.save(path, np.asarray(array), allow_pickle=False)
+        entries[name] = {
+            'dtype': np.asarray(array).dtype.str,
+            'shape': list(np.shape(array)),
+            'sha256': _sha256(path),
+        }
+    return entries
+
+
+def save_bundle(artifacts, out_dir):
+    """Ghi bundle vào thư mục tạm rồi đổi tên, thay thế bundle cũ (nếu có) một lần"""
+    out_dir = os.path.abspath(out_dir)
+    tmp_dir = f'{out_dir}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    manifest = dict(artifacts.manifest)
+    manifest['arrays'] = {
+        'drugs': _save_arrays(os.path.join(tmp_dir, 'drugs'), artifacts.feature_store.to_arrays()),
+        'index': _save_arrays(os.path.join(tmp_dir, 'index'), artifacts.symptom_index.arrays),
+        'details': _save_arrays(os.path.join(tmp_dir, 'details'), {
+            'offsets': artifacts.details.offsets, 'blob': artifacts.details.blob,
+        }),
+        'spelling': _save_arrays(os.path.join(tmp_dir, 'spelling'), artifacts.corrector.arrays),
+    }
+    if artifacts.tfidf_index is not None:
+        manifest['arrays']['tfidf'] = _save_arrays(os.path.join(tmp_dir, 'tfidf'), artifacts.tfidf_index.arrays)
+    if artifacts.semantic_index is not None:
+        manifest['arrays']['semantic'] = _save_arrays(
+            os.path.join(tmp_dir, 'semantic'), artifacts.semantic_index.arrays
+        )
+    if artifacts.scorer is not None:
+        artifacts.scorer.save(os.path.join(tmp_dir, SCORER_DIR))
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+
+    old_dir = f'{out_dir}.old-{os.getpid()}'
+    if os.path.exists(out_dir):
+        os.rename(out_dir, old_dir)
+    os.rename(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return manifest
+
+
+def _load_arrays(directory, entries, mmap_mode):
+    arrays = {}
+    for name, entry in entries.items():
+        path = os.path.join(directory, f'{name}.npy')
+        if not os.path.exists(path):
+            raise ArtifactError(f"Thiếu file {path}")
+        array = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+        if array.dtype.str != entry['dtype'] or list(array.shape) != entry['shape']:
+            raise ArtifactError(
+                f"{path}: {array.dtype.str}{list(array.shape)} không khớp manifest "
+                f"{entry['dtype']}{entry['shape']}"
+            )
+        arrays[name] = array
+    return arrays
+
+
+def read_manifest(path):
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise ArtifactError(
+            f"Không tìm thấy bundle tại {os.path.abspath(path)} "
+            f"(tạo bằng: python artifacts.py build ..., hoặc đặt {ARTIFACT_DIR_ENV})"
+        )
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != BUNDLE_FORMAT:
+        raise ArtifactError(
+            f"Bundle format {manifest.get('format_version')} không được hỗ trợ (cần {BUNDLE_FORMAT})"
+        )
+    return manifest
+
+
+def load_bundle(path, symptom_mapping=SYMPTOM_MAPPING, mmap_mode='r'):
+    """Load bundle bằng memory-map, kiểm tra khớp manifest trước khi dùng"""
+    manifest = read_manifest(path)
+
+    if manifest['keywords'] != symptom_keywords(symptom_mapping):
+        raise ArtifactError("Từ khóa triệu chứng trong bundle khác SYMPTOM_MAPPING hiện tại, cần build lại bundle")
+
+    try:
+        store = DrugFeatureStore.from_arrays(
+            _load_arrays(os.path.join(path, 'drugs'), manifest['arrays']['drugs'], mmap_mode)
+        )
+        index = SymptomIndex(_load_arrays(os.path.join(path, 'index'), manifest['arrays']['index'], mmap_mode))
+    except KeyError as e:
+        raise ArtifactError(f"Bundle thiếu mảng {e}") from e
+
+    # Bundle cũ (hoặc build với code có DETAIL_FORMAT khác) thì serialize chi tiết lúc load
+    if 'details' in manifest['arrays'] and manifest.get('detail_format') == DETAIL_FORMAT:
+        detail_arrays = _load_arrays(os.path.join(path, 'details'), manifest['arrays']['details'], mmap_mode)
+    else:
+        logger.warning("Bundle %s has no detail records for format %d, serializing them now", path, DETAIL_FORMAT)
+        detail_arrays = store.detail_arrays()
+    details = StringColumn(detail_arrays['offsets'], detail_arrays['blob'])
+
+    if 'spelling' in manifest['arrays'] and manifest.get('correction_format') == CORRECTION_FORMAT:
+        corrector = QueryCorrector(
+            _load_arrays(os.path.join(path, 'spelling'), manifest['arrays']['spelling'], mmap_mode),
+            manifest['keywords']
+        )
+    else:
+        logger.warning("Bundle %s has no query correction index for format %d, building it now",
+                       path, CORRECTION_FORMAT)
+        corrector = QueryCorrector.from_index(index, manifest['keywords'])
+
+    sizes = {len(getattr(store, name)) for name in DrugFeatureStore.COLUMNS}
+    sizes.update((index.size, len(details)))
+    if sizes != {manifest['drug_count']}:
+        raise ArtifactError(f"Số thuốc không khớp manifest ({manifest['drug_count']}): {sorted(sizes)}")
+
+    scorer = None
+    if manifest.get('scorer'):
+        try:
+            scorer = CompiledScorer.load(os.path.join(path, SCORER_DIR), mmap_mode=mmap_mode)
+        except (OSError, ValueError, KeyError) as e:
+            raise ArtifactError(f"Không load được scorer: {e}") from e
+
+    tfidf_index = None
+    if scorer is not None:
+        tfidf_columns = manifest.get('tfidf_columns', TFIDF_COLUMNS)
+        if 'tfidf' in manifest['arrays'] and manifest.get('tfidf_format') == TFIDF_FORMAT:
+            try:
+                tfidf_index = TfidfIndex(
+                    _load_arrays(os.path.join(path, 'tfidf'), manifest['arrays']['tfidf'], mmap_mode),
+                    scorer, tfidf_columns
+                )
+            except (KeyError, ValueError) as e:
+                raise ArtifactError(f"Không load được ma trận TF-IDF: {e}") from e
+        else:
+            logger.warning("Bundle %s has no TF-IDF matrix for format %d, building it now", path, TFIDF_FORMAT)
+            tfidf_index = TfidfIndex.build(scorer, store, tfidf_columns)
+        if tfidf_index.size != manifest['drug_count']:
+            raise ArtifactError(f"Ma trận TF-IDF có {tfidf_index.size} thuốc, manifest {manifest['drug_count']}")
+
+    semantic_index = None
+    if tfidf_index is not None:
+        if 'semantic' in manifest['arrays'] and manifest.get('semantic_format') == SEMANTIC_FORMAT:
+            try:
+                semantic_index = SemanticIndex(
+                    _load_arrays(os.path.join(path, 'semantic'), manifest['arrays']['semantic'], mmap_mode),
+                    tfidf_index
+                )
+            except (KeyError, ValueError) as e:
+                raise ArtifactError(f"Không load được chỉ mục semantic: {e}") from e
+        else:
+            logger.warning("Bundle %s has no semantic index for format %d, building it now", path, SEMANTIC_FORMAT)
+            semantic_index = SemanticIndex.build(tfidf_index)
+        if semantic_index.size != manifest['drug_count']:
+            raise ArtifactError(
+                f"Chỉ mục semantic có {semantic_index.size} thuốc, manifest {manifest['drug_count']}"
+            )
+
+    return EngineArtifacts(manifest, store, index, scorer, manifest.get('training_info'), details, corrector,
+                           tfidf_index, semantic_index)
+
+
+def verify_bundle(path):
+    """Kiểm tra sha256 mọi mảng trong manifest, trả về danh sách file lỗi"""
+    manifest = read_manifest(path)
+    errors = []
+    for component, entries in manifest['arrays'].items():
+        for name, entry in entries.items():
+            file_path = os.path.join(path, component, f'{name}.npy')
+            if not os.path.exists(file_path) or _sha256(file_path) != entry['sha256']:
+                errors.append(file_path)
+    return errors
+
+
+def _main(argv=None):
+    import argparse
+    import pickle
+
+    parser = argparse.ArgumentParser(description='Build/kiểm tra bundle artifact của engine')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build')
+    build.add_argument('--package', help='drug_recommendation_model.pkl (chứa data_final và mô hình)')
+    build.add_argument('--dataset', help='final_dataset.csv (khi không dùng --package)')
+    build.add_argument('--vectorizer')
+    build.add_argument('--model')
+    build.add_argument('--encoder')
+    build.add_argument('--numeric-features', type=int, default=0)
+    build.add_argument('--tfidf-columns', default=','.join(TFIDF_COLUMNS),
+                       help='cột ghép thành văn bản TF-IDF của mỗi thuốc: indication, main_name, ingredients')
+    build.add_argument('--semantic-dimensions', type=int, default=SEMANTIC_DIMENSIONS,
+                       help='số chiều SVD của vector semantic')
+    build.add_argument('--semantic-lists', type=int, help='số cụm IVF (mặc định ~sqrt(số thuốc))')
+    build.add_argument('--out', default=DEFAULT_ARTIFACT_DIR)
+
+    verify = subparsers.add_parser('verify')
+    verify.add_argument('path', nargs='?', default=DEFAULT_ARTIFACT_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == 'verify':
+        try:
+            artifacts = load_bundle(args.path)
+            errors = verify_bundle(args.path)
+        except ArtifactError as e:
+            print(f"{args.path}: {e}")
+            raise SystemExit(1)
+        print(f"{args.path}: {artifacts.manifest['drug_count']} drugs, "
+              f"dataset {artifacts.manifest['dataset_version']}, scorer {artifacts.manifest['scorer']}")
+        for error in errors:
+            print(f"checksum mismatch: {error}")
+        raise SystemExit(1 if errors else 0)
+
+    tfidf_columns = [column for column in args.tfidf_columns.split(',') if column]
+    unknown = set(tfidf_columns) - set(TFIDF_COLUMN_CHOICES)
+    if unknown:
+        parser.error(f"--tfidf-columns không hỗ trợ: {', '.join(sorted(unknown))}")
+
+    if args.package:
+        with open(args.package, 'rb') as f:
+            model_package = pickle.load(f)
+        data_final = model_package['data_final']
+    elif args.dataset:
+        import pandas as pd
+        data_final = pd.read_csv(args.dataset, encoding='utf-8')
+        model_package = None
+        if args.vectorizer:
+            import joblib
+            model_package = {
+                'compiled_scorer': CompiledScorer.compile(
+                    joblib.load(args.vectorizer), joblib.load(args.model),
+                    joblib.load(args.encoder), args.numeric_features
+                )
+            }
+    else:
+        parser.error('cần --package hoặc --dataset')
+
+    artifacts = build_artifacts(
+        data_final, model_package, tfidf_columns=tfidf_columns,
+        semantic_dimensions=args.semantic_dimensions, semantic_lists=args.semantic_lists
+    )
+    manifest = save_bundle(artifacts, args.out)
+    print(f"Built bundle {args.out}: {manifest['drug_count']} drugs, "
+          f"dataset {manifest['dataset_version']}, scorer {manifest['scorer']}")
+
+
+if __name__ == '__main__':
+    _main()
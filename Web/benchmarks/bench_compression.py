@@ -0,0 +1,81 @@
+"""Đo bytes trên đường truyền và CPU server mỗi request /search khi nén gzip/brotli.
+
+Lấy body JSON thật của /search (engine từ bundle, cache đã warm), rồi:
+  1. với mỗi encoding/mức nén: kích thước trung bình, tỉ lệ nén, CPU nén mỗi response
+  2. end-to-end qua test client: CPU server mỗi request khi không nén và khi
+     nén theo cấu hình hiện tại (COMPRESS_* trong env/app.config)
+
+    DRUG_ENGINE_ARTIFACTS=models/engine_bundle python benchmarks/bench_compression.py --repeat 200
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+WEB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, WEB_DIR)
+
+import compression  # noqa: E402
+
+QUERIES = [
+    'đau đầu, sốt cao', 'ho khan kéo dài', 'tiêu chảy buồn nôn', 'đau bụng dạ dày',
+    'dị ứng ngứa phát ban', 'đau khớp gối', 'cảm cúm nghẹt mũi', 'mệt mỏi chóng mặt',
+]
+LEVELS = {'gzip': (1, 6, 9), 'br': (1, 4, 6, 11)}
+
+
+def _cpu_per_call(fn, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=100, help='số lần lặp mỗi phép đo')
+    parser.add_argument('--limit', type=int, default=15)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as app_module
+        flask_app = app_module.create_app()
+    client = flask_app.test_client()
+
+    def search(query, accept_encoding):
+        return client.post('/search', json={'symptoms': query, 'limit': args.limit},
+                           headers={'Accept-Encoding': accept_encoding})
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        bodies = [search(query, 'identity').get_data() for query in QUERIES]
+    raw = sum(len(b) for b in bodies) / len(bodies)
+
+    print(f"/search body: {raw / 1024:.1f} KB trung bình ({len(bodies)} truy vấn, limit={args.limit})")
+    print(f"{'encoding':<10}{'level':>6}{'bytes':>10}{'ratio':>8}{'cpu_us':>10}")
+    print(f"{'identity':<10}{'-':>6}{raw:>10.0f}{1:>8.2f}{0:>10.0f}")
+    for encoding in compression.ENCODINGS:
+        if encoding == 'br' and compression.brotli is None:
+            print(f"{'br':<10}  (chưa cài brotli, bỏ qua)")
+            continue
+        for level in LEVELS[encoding]:
+            sizes = [len(compression.compress(body, encoding, level)) for body in bodies]
+            cpu = _cpu_per_call(lambda: [compression.compress(b, encoding, level) for b in bodies],
+                                max(args.repeat // 10, 1)) / len(bodies)
+            size = sum(sizes) / len(sizes)
+            print(f"{encoding:<10}{level:>6}{size:>10.0f}{raw / size:>8.2f}{cpu * 1e6:>10.0f}")
+
+    print()
+    print("End-to-end qua Flask (cache tìm kiếm đã warm), CPU server mỗi request:")
+    encodings = compression.available_encodings(flask_app)
+    for accept in ['identity'] + encodings:
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = search(QUERIES[0], accept)
+            cpu = _cpu_per_call(lambda: [search(q, accept) for q in QUERIES], args.repeat // len(QUERIES) or 1)
+        print(f"  Accept-Encoding: {accept:<9} -> {response.headers.get('Content-Encoding', 'identity'):<9}"
+              f"{len(response.get_data()):>9} bytes{cpu / len(QUERIES) * 1e3:>9.2f} ms CPU")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""Microbenchmark EnhancedDrugRecommendationEngine trên catalogue tổng hợp 10k/100k/1M thuốc.
+
+Mỗi kích thước chạy trong một process riêng: sinh data_final tổng hợp (chỉ định
+tiếng Việt ghép từ từ khóa của SYMPTOM_MAPPING và các cụm bệnh thường gặp, độ
+phổ biến lệch kiểu Zipf), dựng engine bằng from_dataframe, rồi đo từng thao tác
+trên cùng một bộ truy vấn sinh từ SYMPTOM_MAPPING (cố định theo --seed):
+
+    search_cold      search_by_symptoms, cache kết quả bị xóa trước mỗi lần gọi
+    search_cached    search_by_symptoms, truy vấn đã có trong cache
+    predict          predict_drug_category
+    drug_info        get_enhanced_drug_info với vị trí ngẫu nhiên
+
+Báo p50/p99 (ms), thông lượng (ops/s, một luồng) và bộ nhớ cấp phát đỉnh của
+thao tác (tracemalloc, đo ở lượt chạy riêng để không làm sai độ trễ); bước build
+báo thời gian và RSS đỉnh của process.
+
+    python benchmarks/bench_engine.py --sizes 10000,100000 --output bench.json
+    python benchmarks/bench_engine.py --baseline bench.json --threshold 0.25
+    python benchmarks/bench_engine.py --scorer-dir scorer --mode tfidf   # xếp hạng cosine TF-IDF
+
+Có --baseline thì so p50/p99/bộ nhớ với lần chạy trước (cùng kích thước, cùng
+thao tác, cùng mô hình và chế độ xếp hạng) và exit code 1 nếu chỉ số nào tăng quá threshold.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+WEB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, WEB_DIR)
+
+OPERATIONS = ('search_cold', 'search_cached', 'predict', 'drug_info')
+COMPARED_METRICS = ('p50_ms', 'p99_ms', 'peak_kb')
+
+# Cụm chỉ định không thuộc SYMPTOM_MAPPING, để phần lớn văn bản không khớp truy vấn như dữ liệu thật
+CONDITIONS = [
+    'tăng huyết áp', 'đái tháo đường típ 2', 'rối loạn lipid máu', 'suy tim sung huyết', 'thiếu máu do thiếu sắt',
+    'loãng xương', 'gout', 'mất ngủ', 'lo âu', 'trào ngược dạ dày thực quản', 'loét tá tràng', 'viêm gan',
+    'nhiễm nấm candida', 'mụn trứng cá', 'vảy nến', 'viêm kết mạc', 'suy giãn tĩnh mạch', 'trĩ', 'phì đại tiền liệt tuyến',
+    'thiếu vitamin nhóm B', 'còi xương', 'động kinh', 'parkinson', 'hen phế quản', 'viêm mũi dị ứng', 'sỏi thận',
+]
+TEMPLATES = [
+    'Điều trị {0}, {1}.',
+    'Điều trị triệu chứng {0} và {1} ở người lớn và trẻ em trên 12 tuổi.',
+    'Hỗ trợ điều trị {0}. Giảm {1}, {2}.',
+    'Dùng trong các trường hợp {0}, {1} hoặc {2}.',
+    'Phòng và điều trị {0}.',
+    'Làm giảm các triệu chứng {0}, {1} do {2}.',
+]
+NAME_BASES = [
+    'Paracetamol', 'Ibuprofen', 'Amoxicillin', 'Azithromycin', 'Cefuroxim', 'Omeprazole', 'Esomeprazole',
+    'Loperamid', 'Domperidon', 'Ambroxol', 'Bromhexin', 'Salbutamol', 'Loratadin', 'Cetirizin', 'Amlodipin',
+    'Metformin', 'Atorvastatin', 'Glucosamin', 'Vitamin C', 'Vitamin B1', 'Calci D', 'Men vi sinh', 'Diclofenac',
+    'Siro ho thảo dược', 'Viên ngậm', 'Kem bôi da', 'Thuốc nhỏ mắt', 'Clotrimazol', 'Methylprednisolon',
+]
+FORMS = ['viên nén', 'viên nang', 'viên sủi', 'siro', 'gói bột', 'kem', 'dung dịch', 'hỗn dịch']
+QUERY_FILLERS = ['bị', 'kéo dài', 'cao', 'nhiều ngày', 'về đêm', 'ở trẻ em', 'sau ăn', '']
+
+
+def _weighted_vocabulary(symptom_mapping):
+    """Từ khóa triệu chứng + cụm bệnh khác, trọng số giảm dần kiểu Zipf (vài từ rất phổ biến)"""
+    keywords = [k for keywords in symptom_mapping.values() for k in keywords]
+    vocabulary = list(dict.fromkeys(keywords + CONDITIONS))
+    random.Random(0).shuffle(vocabulary)
+    weights = [1.0 / (rank + 1) ** 0.8 for rank in range(len(vocabulary))]
+    return vocabulary, weights
+
+
+def make_catalogue(n, seed=0, symptom_mapping=None):
+    """DataFrame data_final tổng hợp n thuốc (cùng các cột với dữ liệu crawl)"""
+    import pandas as pd
+    from utils import SYMPTOM_MAPPING
+
+    rng = random.Random(seed)
+    vocabulary, weights = _weighted_vocabulary(symptom_mapping or SYMPTOM_MAPPING)
+    terms = rng.choices(vocabulary, weights, k=3 * n)
+    rows = {'ten_thuoc': [], 'thanh_phan': [], 'chi_dinh': [], 'chong_chi_dinh': [], 'tac_dung_phu': [], 'source': []}
+    for i in range(n):
+        base = rng.choice(NAME_BASES)
+        dose = rng.choice((100, 250, 325, 500, 650, 1000))
+        rows['ten_thuoc'].append(f'{base} {dose}mg {rng.choice(FORMS)}')
+        rows['thanh_phan'].append(f'{base} {dose}mg; tá dược vừa đủ 1 viên')
+        # ~2% thiếu chỉ định như dữ liệu crawl
+        if rng.random() < 0.02:
+            rows['chi_dinh'].append(None)
+        else:
+            rows['chi_dinh'].append(rng.choice(TEMPLATES).format(*terms[3 * i:3 * i + 3]))
+        rows['chong_chi_dinh'].append('Mẫn cảm với bất kỳ thành phần nào của thuốc. Suy gan, suy thận nặng.')
+        rows['tac_dung_phu'].append(rng.choice(('Buồn nôn, đau bụng', 'Phát ban, ngứa', 'Chóng mặt, mệt mỏi', None)))
+        rows['source'].append(rng.choice(('LongChau', 'DieuTri')))
+    return pd.DataFrame(rows)
+
+
+def make_queries(n, seed=0, symptom_mapping=None):
+    """n truy vấn người dùng: 1-3 triệu chứng của SYMPTOM_MAPPING, mỗi triệu chứng một cách gọi"""
+    from utils import SYMPTOM_MAPPING
+
+    mapping = symptom_mapping or SYMPTOM_MAPPING
+    rng = random.Random(seed + 1)
+    symptoms = list(mapping)
+    queries = []
+    for _ in range(n):
+        parts = [rng.choice(mapping[s]) for s in rng.sample(symptoms, rng.randint(1, 3))]
+        filler = rng.choice(QUERY_FILLERS)
+        if filler:
+            parts[-1] = f'{parts[-1]} {filler}'
+        queries.append(rng.choice((', ', ' và ', ' ')).join(parts))
+    return queries
+
+
+def _percentile(sorted_samples, q):
+    return sorted_samples[min(int(q * len(sorted_samples)), len(sorted_samples) - 1)]
+
+
+def _measure(call, inputs, before=None):
+    """Độ trễ từng lần gọi (lượt 1) rồi bộ nhớ cấp phát đỉnh (lượt 2, có tracemalloc)"""
+    samples = []
+    for item in inputs:
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        call(item)
+        samples.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    peak = 0
+    for item in inputs[:max(len(inputs) // 10, 1)]:
+        if before is not None:
+            before()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        call(item)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    total = sum(samples)
+    samples.sort()
+    return {
+        'calls': len(samples),
+        'p50_ms': _percentile(samples, 0.50) * 1000,
+        'p99_ms': _percentile(samples, 0.99) * 1000,
+        'ops_per_s': len(samples) / total if total else 0.0,
+        'peak_kb': peak / 1024,
+    }
+
+
+def run_size(size, args):
+    """Đo một kích thước catalogue (chạy trong process con)"""
+    import warnings
+
+    warnings.filterwarnings('ignore')
+    from app import EnhancedDrugRecommendationEngine
+
+    model_package = None
+    if args['scorer_dir']:
+        from compiled_scorer import CompiledScorer
+        model_package = {'compiled_scorer': CompiledScorer.load(args['scorer_dir'])}
+
+    start = time.perf_counter()
+    data_final = make_catalogue(size, args['seed'])
+    generate_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = EnhancedDrugRecommendationEngine.from_dataframe(data_final, model_package)
+    build_s = time.perf_counter() - start
+    del data_final
+    build_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    queries = make_queries(args['queries'], args['seed'])
+    rng = random.Random(args['seed'] + 2)
+    positions = [rng.randrange(size) for _ in range(args['queries'])]
+    limit = args['limit']
+    mode = args['mode']
+
+    operations = {
+        'search_cold': (lambda q: engine.search_by_symptoms(q, limit=limit, mode=mode), queries,
+                        engine.search_cache.invalidate),
+        'search_cached': (lambda q: engine.search_by_symptoms(q, limit=limit, mode=mode), queries, None),
+        'predict': (engine.predict_drug_category, queries, None),
+        'drug_info': (engine.get_enhanced_drug_info, positions, None),
+    }
+    results = {}
+    for name in args['operations']:
+        call, inputs, before = operations[name]
+        # Warm-up: trang mmap, cache của search_cached
+        for item in inputs[:args['warmup']] if name != 'search_cached' else inputs:
+            call(item)
+        results[name] = _measure(call, inputs, before)
+
+    return {
+        'size': size,
+        'model': engine.manifest.get('scorer') or 'rule-based',
+        'mode': mode,
+        'generate_s': generate_s,
+        'build_s': build_s,
+        'build_rss_mb': build_rss_mb,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'operations': results,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Các chỉ số tăng quá (1 + threshold) lần so với baseline: [(size, thao tác, chỉ số, cũ, mới)]"""
+    previous = {str(r['size']): r for r in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        base = previous.get(str(result['size']))
+        # Khác mô hình dự đoán hoặc chế độ xếp hạng thì số liệu không so được
+        if (base is None or base.get('model') != result['model']
+                or base.get('mode', 'keyword') != result['mode']):
+            continue
+        for name, metrics in result['operations'].items():
+            base_metrics = base['operations'].get(name)
+            if base_metrics is None:
+                continue
+            for metric in COMPARED_METRICS:
+                old, new = base_metrics[metric], metrics[metric]
+                if old > 0 and new > old * (1 + threshold):
+                    regressions.append((result['size'], name, metric, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='số thuốc của từng catalogue')
+    parser.add_argument('--operations', default=','.join(OPERATIONS))
+    parser.add_argument('--queries', type=int, default=500, help='số lần gọi mỗi thao tác')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=15)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scorer-dir', help='compiled scorer để dự đoán bằng ML (mặc định rule-based)')
+    parser.add_argument('--mode', default='keyword',
+                        help='chế độ xếp hạng của search_* (tfidf, semantic cần --scorer-dir)')
+    parser.add_argument('--output', help='ghi kết quả ra file JSON (dùng làm --baseline lần sau)')
+    parser.add_argument('--baseline', help='file JSON của lần chạy trước để so sánh')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='tỉ lệ tăng tối đa cho phép của p50/p99/bộ nhớ so với baseline (0.25 = 25%%)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_size(int(args.worker), json.loads(sys.stdin.read()))))
+        return
+
+    payload = json.dumps({
+        'operations': [op for op in args.operations.split(',') if op],
+        'queries': args.queries,
+        'warmup': args.warmup,
+        'limit': args.limit,
+        'seed': args.seed,
+        'scorer_dir': args.scorer_dir,
+        'mode': args.mode,
+    })
+    unknown = set(json.loads(payload)['operations']) - set(OPERATIONS)
+    if unknown:
+        parser.error(f"thao tác không hỗ trợ: {', '.join(sorted(unknown))}")
+
+    results = []
+    print(f"{'size':>9}{'operation':>15}{'p50_ms':>10}{'p99_ms':>10}{'ops/s':>10}{'peak_kb':>10}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', str(size)],
+            input=payload, check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{size:>9}{'build':>15}  {result['build_s']:.2f}s build, {result['build_rss_mb']:.0f} MB RSS, "
+              f"model {result['model']}")
+        for name, m in result['operations'].items():
+            print(f"{size:>9}{name:>15}{m['p50_ms']:>10.3f}{m['p99_ms']:>10.3f}{m['ops_per_s']:>10.0f}"
+                  f"{m['peak_kb']:>10.0f}")
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'settings': json.loads(payload),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\nREGRESSION (> {args.threshold:.0%} so với {args.baseline}):")
+            for size, name, metric, old, new in regressions:
+                print(f"  {size:>9} {name:<14} {metric:<8} {old:10.3f} -> {new:10.3f} ({new / old - 1:+.0%})")
+            sys.exit(1)
+        print(f"\nKhông có chỉ số nào tăng quá {args.threshold:.0%} so với {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
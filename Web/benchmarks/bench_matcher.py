@@ -0,0 +1,115 @@
+"""So sánh automaton Aho–Corasick (matcher.py) với vòng lặp `keyword in text` trước đây.
+
+Ba chỗ dùng, trên catalogue và truy vấn tổng hợp của bench_engine.py:
+
+    classify      classify_drug_type trên tên thuốc (14 nhóm, ~300 từ khóa, giữ thứ tự ưu tiên)
+    detect        nhận diện triệu chứng trong truy vấn (từ khóa của SYMPTOM_MAPPING)
+    index         danh sách thuốc chứa từng từ khóa khi dựng SymptomIndex (quét chi_dinh)
+
+In thông lượng (văn bản/giây) của hai cách và kiểm tra kết quả giống hệt nhau.
+
+    python benchmarks/bench_matcher.py --drugs 50000 --queries 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+WEB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, WEB_DIR)
+
+from bench_engine import make_catalogue, make_queries  # noqa: E402
+from matcher import AhoCorasick  # noqa: E402
+from utils import (  # noqa: E402
+    DEFAULT_DRUG_TYPE, DRUG_TYPE_KEYWORDS, SYMPTOM_MAPPING, classify_drug_type, symptom_keywords
+)
+
+SYMPTOMS = list(SYMPTOM_MAPPING)
+
+
+def legacy_classify(drug_name):
+    """classify_drug_type trước đây: lần lượt any(word in drug_name) cho từng nhóm"""
+    drug_name = str(drug_name).lower()
+    for drug_type, keywords in DRUG_TYPE_KEYWORDS:
+        if any(word in drug_name for word in keywords):
+            return drug_type
+    return DEFAULT_DRUG_TYPE
+
+
+def legacy_detect(text):
+    detected = []
+    for symptom, keywords in SYMPTOM_MAPPING.items():
+        for keyword in keywords:
+            if keyword in text:
+                detected.append(symptom)
+                break
+    return detected
+
+
+def matcher_detect(matcher, keyword_symptoms, text):
+    """Như _rank_symptoms của engine: id từ khóa -> nhóm triệu chứng, giữ thứ tự SYMPTOM_MAPPING"""
+    found = set()
+    for keyword_id in matcher.find_ids(text):
+        found.update(keyword_symptoms[keyword_id])
+    return [SYMPTOMS[i] for i in sorted(found)]
+
+
+def legacy_index(texts, keywords):
+    return [[pos for pos, text in enumerate(texts) if keyword in text] for keyword in keywords]
+
+
+def matcher_index(texts, keywords):
+    matcher = AhoCorasick(keywords)
+    groups = [[] for _ in keywords]
+    for pos, text in enumerate(texts):
+        for keyword_id in matcher.find_ids(text):
+            groups[keyword_id].append(pos)
+    return groups
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drugs', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat-text', type=int, default=1,
+                        help='lặp chi_dinh n lần để thử văn bản dài hơn (chỉ định thật thường dài vài trăm ký tự)')
+    args = parser.parse_args()
+
+    catalogue = make_catalogue(args.drugs, args.seed)
+    names = catalogue['ten_thuoc'].tolist()
+    indications = [text.lower() * args.repeat_text for text in catalogue['chi_dinh'].dropna()]
+    queries = [q.lower() for q in make_queries(args.queries, args.seed)]
+    keywords = symptom_keywords()
+    matcher = AhoCorasick(keywords)
+    keyword_symptoms = [
+        [i for i, group in enumerate(SYMPTOM_MAPPING.values()) if keyword in group] for keyword in matcher.patterns
+    ]
+
+    cases = [
+        ('classify', len(names),
+         lambda: [legacy_classify(n) for n in names], lambda: [classify_drug_type(n) for n in names]),
+        ('detect', len(queries),
+         lambda: [legacy_detect(q) for q in queries],
+         lambda: [matcher_detect(matcher, keyword_symptoms, q) for q in queries]),
+        ('index', len(indications),
+         lambda: legacy_index(indications, keywords), lambda: matcher_index(indications, keywords)),
+    ]
+    print(f"chi_dinh trung bình {sum(map(len, indications)) / len(indications):.0f} ký tự, "
+          f"{len(keywords)} từ khóa triệu chứng")
+    print(f"{'case':<10}{'texts':>9}{'legacy/s':>12}{'matcher/s':>12}{'speedup':>9}  same")
+    for name, count, legacy, new in cases:
+        expected, legacy_s = _timed(legacy)
+        actual, new_s = _timed(new)
+        print(f"{name:<10}{count:>9}{count / legacy_s:>12.0f}{count / new_s:>12.0f}"
+              f"{legacy_s / new_s:>8.1f}x  {expected == actual}")
+
+
+if __name__ == '__main__':
+    main()
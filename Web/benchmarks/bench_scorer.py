@@ -0,0 +1,120 @@
+"""So sánh dự đoán bằng scikit-learn và compiled scorer (NumPy).
+
+Mỗi cách chạy trong một process riêng để đo công bằng thời gian import + load,
+RSS đỉnh và độ trễ mỗi lần gọi (1 truy vấn và cả lô).
+
+    python benchmarks/bench_scorer.py --scorer-dir models/compiled_scorer
+    (tạo scorer bằng: python compiled_scorer.py export --vectorizer ... <dir>)
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+WEB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(WEB_DIR, 'models')
+
+QUERIES = [
+    'đau đầu, sốt cao', 'ho khan kéo dài', 'tiêu chảy buồn nôn', 'đau bụng dạ dày',
+    'dị ứng ngứa phát ban', 'đau khớp gối', 'cảm cúm nghẹt mũi', 'mệt mỏi chóng mặt',
+]
+
+_WORKER = r'''
+import json, resource, sys, time, warnings
+warnings.filterwarnings('ignore')
+t0 = time.perf_counter()
+mode, args = sys.argv[1], json.loads(sys.argv[2])
+sys.path.insert(0, args['web_dir'])
+if mode == 'sklearn':
+    import joblib
+    import numpy as np
+    from scipy.sparse import hstack
+    vectorizer = joblib.load(args['vectorizer'])
+    model = joblib.load(args['model'])
+    encoder = joblib.load(args['encoder'])
+    n_numeric = args['numeric_features']
+    def predict(texts):
+        X = hstack([vectorizer.transform(texts), np.zeros((len(texts), n_numeric))]).tocsr()
+        proba = model.predict_proba(X)
+        best = proba.argmax(axis=1)
+        return list(zip(encoder.inverse_transform(model.classes_[best]), proba[np.arange(len(best)), best]))
+else:
+    from compiled_scorer import CompiledScorer
+    scorer = CompiledScorer.load(args['scorer_dir'])
+    predict = scorer.predict
+load_s = time.perf_counter() - t0
+
+queries = args['queries']
+predict(queries[:1])
+
+def timed(texts, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        predict(texts)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+single = timed(queries[:1], args['repeat'])
+batch_texts = (queries * (args['batch'] // len(queries) + 1))[:args['batch']]
+batch = timed(batch_texts, max(args['repeat'] // 10, 3))
+print(json.dumps({
+    'import_load_ms': load_s * 1000,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'single_call_us': single * 1e6,
+    'batch_call_ms': batch * 1000,
+    'predictions': [[str(c), float(p)] for c, p in predict(queries)],
+}))
+'''
+
+
+def run(mode, args):
+    payload = json.dumps({
+        'web_dir': WEB_DIR,
+        'vectorizer': args.vectorizer,
+        'model': args.model,
+        'encoder': args.encoder,
+        'numeric_features': args.numeric_features,
+        'scorer_dir': args.scorer_dir,
+        'queries': QUERIES,
+        'repeat': args.repeat,
+        'batch': args.batch,
+    })
+    output = subprocess.run(
+        [sys.executable, '-c', _WORKER, mode, payload],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vectorizer', default=os.path.join(MODELS_DIR, 'tfidf_vectorizer.pkl'))
+    parser.add_argument('--model', default=os.path.join(MODELS_DIR, 'best_model.pkl'))
+    parser.add_argument('--encoder', default=os.path.join(MODELS_DIR, 'label_encoder.pkl'))
+    parser.add_argument('--numeric-features', type=int, default=8)
+    parser.add_argument('--scorer-dir', default=os.path.join(MODELS_DIR, 'compiled_scorer'))
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=256)
+    args = parser.parse_args()
+
+    results = {mode: run(mode, args) for mode in ('sklearn', 'compiled')}
+
+    print(f"{'metric':<18}{'sklearn':>14}{'compiled':>14}{'ratio':>10}")
+    for metric in ('import_load_ms', 'max_rss_mb', 'single_call_us', 'batch_call_ms'):
+        base, new = results['sklearn'][metric], results['compiled'][metric]
+        print(f"{metric:<18}{base:>14.2f}{new:>14.2f}{base / new:>9.1f}x")
+
+    same_class = all(
+        a[0] == b[0] for a, b in zip(results['sklearn']['predictions'], results['compiled']['predictions'])
+    )
+    max_diff = max(
+        abs(a[1] - b[1]) for a, b in zip(results['sklearn']['predictions'], results['compiled']['predictions'])
+    )
+    print(f"same predicted class: {same_class}, max confidence diff: {max_diff:.2e}")
+
+
+if __name__ == '__main__':
+    main()
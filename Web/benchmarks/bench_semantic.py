@@ -0,0 +1,98 @@
+"""Recall@k và độ trễ của chỉ mục semantic (IVF + int8) theo nprobe, so với tìm chính xác.
+
+Trên catalogue và truy vấn tổng hợp của bench_engine.py, dựng TfidfIndex và
+SemanticIndex bằng compiled scorer rồi với mỗi nprobe đo:
+
+    recall_ivf     top-k trùng với quét toàn bộ vector int8 (mất mát do chỉ quét nprobe cụm)
+    recall_exact   top-k trùng với cosine float chính xác trong không gian SVD
+                   (mất mát do IVF + lượng tử hóa int8)
+    p50_ms/p99_ms  vector hóa + SemanticIndex.search một truy vấn
+
+Catalogue tổng hợp có nhiều chỉ định giống hệt nhau, nên recall tính theo điểm:
+một thuốc tìm được là đúng nếu điểm chuẩn của nó >= điểm thứ k của tìm chuẩn.
+Dòng "tfidf" là cosine TF-IDF chính xác (mode=tfidf) để so độ trễ.
+
+    python benchmarks/bench_semantic.py --scorer-dir scorer --drugs 100000 --nprobe 1,2,4,8,16,32
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+WEB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, WEB_DIR)
+
+from bench_engine import _percentile, make_catalogue, make_queries  # noqa: E402
+from compiled_scorer import CompiledScorer  # noqa: E402
+from feature_store import DrugFeatureStore  # noqa: E402
+from semantic_index import SEMANTIC_DIMENSIONS, SemanticIndex, project_documents  # noqa: E402
+from tfidf_index import TfidfIndex  # noqa: E402
+from utils import classify_drug_type  # noqa: E402
+
+
+def _recall(found, scores, k):
+    """Tỉ lệ k vị trí chuẩn được tìm thấy, tính theo điểm chuẩn (thuốc đồng hạng thay nhau được)"""
+    expected = min(k, int((scores > 0).sum()))
+    if not expected:
+        return 1.0
+    kth = np.partition(scores, len(scores) - expected)[len(scores) - expected]
+    return min(expected, int((scores[found] >= kth - 1e-6).sum())) / expected
+
+
+def _timed(fn, inputs):
+    samples = []
+    for item in inputs:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return _percentile(samples, 0.50) * 1000, _percentile(samples, 0.99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scorer-dir', required=True, help='compiled scorer (TF-IDF của mô hình)')
+    parser.add_argument('--drugs', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', default='1,2,4,8,16,32')
+    parser.add_argument('--dimensions', type=int, default=SEMANTIC_DIMENSIONS)
+    parser.add_argument('--lists', type=int, help='số cụm IVF (mặc định ~sqrt(số thuốc))')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    scorer = CompiledScorer.load(args.scorer_dir)
+    store = DrugFeatureStore.from_dataframe(make_catalogue(args.drugs, args.seed), classify_drug_type)
+
+    start = time.perf_counter()
+    tfidf_index = TfidfIndex.build(scorer, store)
+    tfidf_s = time.perf_counter() - start
+    start = time.perf_counter()
+    index = SemanticIndex.build(tfidf_index, args.dimensions, args.lists, args.seed)
+    semantic_s = time.perf_counter() - start
+    print(f"{args.drugs} thuốc: TF-IDF {tfidf_s:.1f}s, semantic {semantic_s:.1f}s "
+          f"({index.dimensions} chiều, {index.n_lists} cụm, "
+          f"{index.arrays['codes'].nbytes / 2 ** 20:.1f} MB mã int8)")
+
+    queries = [q.lower() for q in make_queries(args.queries, args.seed)]
+    vectors = [index.vectorize(q) for q in queries]
+    exact_vectors = project_documents(tfidf_index, index.arrays['components'])
+    # Vector int8 đã giải lượng tử theo vị trí thuốc, để quét toàn bộ
+    quantized = np.zeros_like(exact_vectors)
+    quantized[index.arrays['positions']] = index.arrays['codes'] * index.arrays['scales'][:, None]
+
+    p50, p99 = _timed(lambda q: tfidf_index.similarity(tfidf_index.vectorize(q)), queries)
+    print(f"{'nprobe':>8}{'recall_ivf':>12}{'recall_exact':>14}{'p50_ms':>9}{'p99_ms':>9}")
+    print(f"{'tfidf':>8}{'':>12}{'':>14}{p50:>9.3f}{p99:>9.3f}")
+    for nprobe in (int(n) for n in args.nprobe.split(',')):
+        found = [index.search(v, args.k, nprobe=nprobe)[0] for v in vectors]
+        recall_ivf = np.mean([_recall(f, quantized @ v, args.k) for f, v in zip(found, vectors)])
+        recall_exact = np.mean([_recall(f, exact_vectors @ v, args.k) for f, v in zip(found, vectors)])
+        p50, p99 = _timed(lambda q: index.search(index.vectorize(q), nprobe=nprobe), queries)
+        print(f"{nprobe:>8}{recall_ivf:>12.3f}{recall_exact:>14.3f}{p50:>9.3f}{p99:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
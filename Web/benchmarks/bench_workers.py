@@ -0,0 +1,186 @@
+"""Đo RSS/PSS mỗi worker và requests/sec của gunicorn (wsgi:app) khi tăng số worker.
+
+Với mỗi số worker, chạy gunicorn (có và không preload nếu dùng --compare-preload),
+bắn POST /search từ nhiều process client trong một khoảng thời gian, rồi đọc
+/proc/<pid>/smaps_rollup của từng worker. PSS chia đều các trang dùng chung nên
+phản ánh đúng bộ nhớ thực tế mỗi worker tốn thêm. Chỉ chạy được trên Linux.
+
+    python benchmarks/bench_workers.py --workers 1,2,4,8 --duration 10 --compare-preload
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+WEB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUERIES = [
+    'đau đầu, sốt cao', 'ho khan kéo dài', 'tiêu chảy buồn nôn', 'đau bụng dạ dày',
+    'dị ứng ngứa phát ban', 'đau khớp gối', 'cảm cúm nghẹt mũi', 'mệt mỏi chóng mặt',
+]
+
+
+def _client(args):
+    """Một process client: `threads` luồng gửi request liên tục tới hết thời gian"""
+    url, threads, deadline, seed = args
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def run(thread_seed):
+        rng = random.Random(thread_seed)
+        while time.time() < deadline:
+            body = json.dumps({'symptoms': rng.choice(QUERIES), 'offset': rng.choice((0, 0, 0, 15))})
+            request = urllib.request.Request(
+                url, data=body.encode('utf-8'), headers={'Content-Type': 'application/json'}
+            )
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+
+    pool = [threading.Thread(target=run, args=(seed * 1000 + i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return latencies, errors[0]
+
+
+def _children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def _memory_mb(pid):
+    """Rss/Pss/Private (MB) của một process từ smaps_rollup"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss': values.get('Rss', 0),
+        'pss': values.get('Pss', 0),
+        'private': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0),
+    }
+
+
+def _wait_ready(base_url, process, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {process.returncode}')
+        try:
+            with urllib.request.urlopen(f'{base_url}/login', timeout=2) as response:
+                if response.status == 200:
+                    return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not become ready')
+
+
+def run_config(workers, preload, args):
+    port = args.port
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY=str(workers),
+               GUNICORN_PRELOAD='1' if preload else '0')
+    if args.artifacts:
+        env['DRUG_ENGINE_ARTIFACTS'] = os.path.abspath(args.artifacts)
+
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=WEB_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        _wait_ready(base_url, process, args.startup_timeout)
+        # Chờ đủ worker (không preload thì mỗi worker tự load engine)
+        while len(_children(process.pid)) < workers:
+            time.sleep(0.1)
+        startup_s = time.perf_counter() - started
+
+        deadline = time.time() + args.duration
+        jobs = [(f'{base_url}/search', args.threads, deadline, seed) for seed in range(args.clients)]
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.map(_client, jobs)
+
+        latencies = sorted(l for lat, _ in results for l in lat)
+        errors = sum(e for _, e in results)
+        memory = [_memory_mb(pid) for pid in _children(process.pid)]
+        master = _memory_mb(process.pid)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+
+    def pct(q):
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000 if latencies else 0.0
+
+    n = max(len(memory), 1)
+    return {
+        'workers': workers,
+        'preload': preload,
+        'startup_s': startup_s,
+        'requests': len(latencies),
+        'errors': errors,
+        'req_per_s': len(latencies) / args.duration,
+        'p50_ms': pct(0.50),
+        'p99_ms': pct(0.99),
+        'master_rss_mb': master['rss'],
+        'rss_per_worker_mb': sum(m['rss'] for m in memory) / n,
+        'pss_per_worker_mb': sum(m['pss'] for m in memory) / n,
+        'private_per_worker_mb': sum(m['private'] for m in memory) / n,
+        'total_pss_mb': master['pss'] + sum(m['pss'] for m in memory),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=4, help='số process client')
+    parser.add_argument('--threads', type=int, default=8, help='số luồng mỗi process client')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--artifacts', help='thư mục bundle (mặc định theo DRUG_ENGINE_ARTIFACTS)')
+    parser.add_argument('--startup-timeout', type=float, default=120)
+    parser.add_argument('--compare-preload', action='store_true', help='chạy thêm cấu hình không preload')
+    parser.add_argument('--json', help='ghi kết quả ra file JSON')
+    args = parser.parse_args()
+
+    modes = (True, False) if args.compare_preload else (True,)
+    results = []
+    header = (f"{'workers':>7}{'preload':>9}{'start_s':>9}{'req/s':>9}{'p50_ms':>9}{'p99_ms':>9}"
+              f"{'rss/w':>9}{'pss/w':>9}{'priv/w':>9}{'pss_tot':>9}{'errors':>8}")
+    print(header)
+    for workers in (int(w) for w in args.workers.split(',')):
+        for preload in modes:
+            r = run_config(workers, preload, args)
+            results.append(r)
+            print(f"{r['workers']:>7}{str(r['preload']):>9}{r['startup_s']:>9.2f}{r['req_per_s']:>9.0f}"
+                  f"{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['rss_per_worker_mb']:>9.1f}"
+                  f"{r['pss_per_worker_mb']:>9.1f}{r['private_per_worker_mb']:>9.1f}"
+                  f"{r['total_pss_mb']:>9.1f}{r['errors']:>8}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
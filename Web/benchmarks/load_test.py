@@ -0,0 +1,334 @@
+"""Load test HTTP end-to-end: người dùng tổng hợp đăng nhập rồi phát lại tổ hợp request theo trọng số.
+
+Kịch bản là file JSON (xem scenarios/default.json): số người dùng, thời gian
+chạy, thời gian warm-up không tính vào kết quả, danh sách truy vấn và các loại
+request (name, weight, method, path, json). Chuỗi dạng "{query}", "{drug_id}",
+"{drug_name}", "{drug_class}", "{score}" được thay bằng giá trị của người dùng:
+truy vấn ngẫu nhiên, thuốc lấy từ kết quả /search gần nhất của chính người đó
+(chưa tìm thì chọn ngẫu nhiên trong bundle).
+
+Mỗi người dùng là một luồng có cookie riêng, gửi request liên tục (closed loop,
+nghỉ think_time giữa hai request). Không có --url thì script tự chạy gunicorn
+trên cổng loopback với database tạm, đăng ký người dùng qua /register.
+
+Lỗi gồm: exception/timeout, mã HTTP >= 400, bị chuyển hướng (mất phiên đăng
+nhập), và body JSON có khóa "error". Kết quả theo từng loại request: số
+request, lỗi, req/s, p50/p95/p99 (ms). File --output là JSON sắp xếp khóa, làm
+tròn cố định, không có thời điểm chạy, để diff giữa các lần chạy.
+
+    python benchmarks/load_test.py --workers 2 --output load.json
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --users 4 --duration 10
+    python benchmarks/load_test.py --compare load.json
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+
+WEB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SCENARIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scenarios', 'default.json')
+PASSWORD = 'loadtest-password'
+_PLACEHOLDER = re.compile(r'^\{(\w+)\}$')
+
+
+def load_scenario(path, overrides):
+    with open(path, encoding='utf-8') as f:
+        scenario = json.load(f)
+    for key, value in overrides.items():
+        if value is not None:
+            scenario[key] = value
+    scenario.setdefault('warmup', 0)
+    scenario.setdefault('think_time', 0)
+    if not scenario.get('requests') or not scenario.get('queries'):
+        raise ValueError(f"{path}: kịch bản cần 'requests' và 'queries'")
+    for entry in scenario['requests']:
+        missing = {'name', 'weight', 'method', 'path'} - set(entry)
+        if missing:
+            raise ValueError(f"{path}: request thiếu {', '.join(sorted(missing))}: {entry}")
+    return scenario
+
+
+def _fill(template, variables):
+    """Thay placeholder; chuỗi chỉ gồm một placeholder giữ nguyên kiểu giá trị (số vẫn là số)"""
+    if isinstance(template, dict):
+        return {key: _fill(value, variables) for key, value in template.items()}
+    if isinstance(template, list):
+        return [_fill(value, variables) for value in template]
+    if isinstance(template, str):
+        match = _PLACEHOLDER.match(template)
+        if match:
+            return variables[match.group(1)]
+        return template.format_map(variables)
+    return template
+
+
+class VirtualUser:
+    """Một người dùng: cookie riêng, nhớ truy vấn và kết quả tìm kiếm gần nhất"""
+
+    def __init__(self, base_url, username, scenario, drug_count, seed, timeout):
+        self.base_url = base_url
+        self.username = username
+        self.scenario = scenario
+        self.drug_count = drug_count
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.query = self.rng.choice(scenario['queries'])
+        self.last_drugs = []
+
+    def _open(self, method, path, json_body=None, form=None):
+        data, headers = None, {}
+        if json_body is not None:
+            data = json.dumps(json_body, ensure_ascii=False).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            data = urllib.parse.urlencode(form).encode('utf-8')
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        return self.opener.open(request, timeout=self.timeout)
+
+    def login(self):
+        """Đăng ký (bỏ qua nếu đã có) rồi đăng nhập; trả về False nếu không vào được"""
+        form = {'username': self.username, 'password': PASSWORD}
+        self._open('POST', '/register', form=dict(form, confirm_password=PASSWORD, full_name=self.username)).read()
+        with self._open('POST', '/login', form=form) as response:
+            response.read()
+            return urllib.parse.urlparse(response.geturl()).path != '/login'
+
+    def _variables(self):
+        if self.last_drugs:
+            drug = self.rng.choice(self.last_drugs)
+        else:
+            drug = {'index': self.rng.randrange(self.drug_count) if self.drug_count else 0}
+        return {
+            'query': self.query,
+            'drug_id': drug['index'],
+            'drug_name': drug.get('name', ''),
+            'drug_class': drug.get('drug_class', ''),
+            'score': drug.get('score', 0),
+        }
+
+    def request(self, entry):
+        """Gửi một request của kịch bản: (thời gian, loại lỗi hoặc None)"""
+        if entry['path'] == '/search':
+            self.query = self.rng.choice(self.scenario['queries'])
+        variables = self._variables()
+        path = _fill(entry['path'], variables)
+        body = _fill(entry['json'], variables) if 'json' in entry else None
+
+        start = time.perf_counter()
+        try:
+            with self._open(entry['method'], path, json_body=body) as response:
+                content = response.read()
+                final_path = urllib.parse.urlparse(response.geturl()).path
+                content_type = response.headers.get('Content-Type', '')
+        except urllib.error.HTTPError as e:
+            e.read()
+            return time.perf_counter() - start, f'http_{e.code}'
+        except Exception as e:
+            return time.perf_counter() - start, f'exception_{type(e).__name__}'
+        elapsed = time.perf_counter() - start
+
+        if final_path != urllib.parse.urlparse(path).path:
+            return elapsed, 'redirect'
+        if content_type.startswith('application/json'):
+            payload = json.loads(content)
+            if isinstance(payload, dict) and 'error' in payload:
+                return elapsed, 'app_error'
+            if path == '/search' and isinstance(payload, dict):
+                self.last_drugs = payload.get('results', {}).get('drugs', []) or self.last_drugs
+        return elapsed, None
+
+
+def run_load(base_url, scenario, drug_count, timeout, seed):
+    entries = scenario['requests']
+    weights = [entry['weight'] for entry in entries]
+    latencies = defaultdict(list)
+    errors = defaultdict(Counter)
+    lock = threading.Lock()
+
+    users = [
+        VirtualUser(base_url, f'loadtest_{i}', scenario, drug_count, seed * 1000 + i, timeout)
+        for i in range(scenario['users'])
+    ]
+    failed_logins = [user.username for user in users if not user.login()]
+    if failed_logins:
+        raise RuntimeError(f"Không đăng nhập được: {', '.join(failed_logins)}")
+
+    started = time.time()
+    measure_from = started + scenario['warmup']
+    deadline = measure_from + scenario['duration']
+
+    def loop(user):
+        while True:
+            now = time.time()
+            if now >= deadline:
+                return
+            entry = user.rng.choices(entries, weights)[0]
+            elapsed, error = user.request(entry)
+            if now >= measure_from:
+                with lock:
+                    latencies[entry['name']].append(elapsed)
+                    if error:
+                        errors[entry['name']][error] += 1
+            if scenario['think_time']:
+                time.sleep(scenario['think_time'])
+
+    threads = [threading.Thread(target=loop, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+
+def _percentile(samples, q):
+    return samples[min(int(q * len(samples)), len(samples) - 1)] * 1000 if samples else 0.0
+
+
+def summarize(latencies, errors, duration, names):
+    def stats(samples, route_errors):
+        samples = sorted(samples)
+        count = len(samples)
+        error_count = sum(route_errors.values())
+        return {
+            'requests': count,
+            'errors': error_count,
+            'error_rate': round(error_count / count, 4) if count else 0.0,
+            'error_kinds': dict(sorted(route_errors.items())),
+            'req_per_s': round(count / duration, 1),
+            'p50_ms': round(_percentile(samples, 0.50), 2),
+            'p95_ms': round(_percentile(samples, 0.95), 2),
+            'p99_ms': round(_percentile(samples, 0.99), 2),
+        }
+
+    routes = {name: stats(latencies.get(name, []), errors.get(name, Counter())) for name in names}
+    total_errors = Counter()
+    for route_errors in errors.values():
+        total_errors.update(route_errors)
+    total = stats([l for samples in latencies.values() for l in samples], total_errors)
+    return routes, total
+
+
+def print_table(routes, total, previous=None):
+    header = f"{'route':<16}{'requests':>9}{'errors':>8}{'err%':>7}{'req/s':>8}{'p50_ms':>9}{'p95_ms':>9}{'p99_ms':>9}"
+    print(header + ('   Δp95 vs --compare' if previous else ''))
+    for name, r in list(routes.items()) + [('TOTAL', total)]:
+        line = (f"{name:<16}{r['requests']:>9}{r['errors']:>8}{r['error_rate'] * 100:>6.1f}%{r['req_per_s']:>8.1f}"
+                f"{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}")
+        if previous:
+            base = previous['total'] if name == 'TOTAL' else previous['routes'].get(name)
+            if base and base['p95_ms']:
+                line += f"{(r['p95_ms'] / base['p95_ms'] - 1) * 100:>+10.0f}%"
+        print(line)
+        if r['error_kinds']:
+            print(f"{'':<16}  {', '.join(f'{kind}={n}' for kind, n in r['error_kinds'].items())}")
+
+
+def _wait_ready(base_url, process, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {process.returncode}')
+        try:
+            with urllib.request.urlopen(f'{base_url}/stats', timeout=2) as response:
+                return json.loads(response.read())
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f'{base_url} did not become ready')
+
+
+def start_server(args, db_path):
+    # Log của server ra stderr, mặc định chỉ từ WARNING để không lẫn với bảng kết quả
+    env = dict(os.environ, BIND=f'127.0.0.1:{args.port}', WEB_CONCURRENCY=str(args.workers),
+               GUNICORN_THREADS=str(args.threads), DATABASE_PATH=db_path,
+               LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'))
+    if args.artifacts:
+        env['DRUG_ENGINE_ARTIFACTS'] = os.path.abspath(args.artifacts)
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning', 'wsgi:app'],
+        cwd=WEB_DIR, env=env, stdout=subprocess.DEVNULL
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', default=DEFAULT_SCENARIO)
+    parser.add_argument('--url', help='server đang chạy (mặc định tự chạy gunicorn trên 127.0.0.1:--port)')
+    parser.add_argument('--users', type=int, help='ghi đè số người dùng của kịch bản')
+    parser.add_argument('--duration', type=float, help='ghi đè thời gian đo (giây)')
+    parser.add_argument('--warmup', type=float, help='ghi đè thời gian warm-up (giây)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=30, help='timeout mỗi request (giây)')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--workers', type=int, default=2, help='số worker gunicorn khi tự chạy server')
+    parser.add_argument('--threads', type=int, default=1, help='số luồng mỗi worker gunicorn')
+    parser.add_argument('--artifacts', help='thư mục bundle (mặc định theo DRUG_ENGINE_ARTIFACTS)')
+    parser.add_argument('--startup-timeout', type=float, default=120)
+    parser.add_argument('--output', help='ghi kết quả JSON (diff được giữa các lần chạy)')
+    parser.add_argument('--compare', help='kết quả JSON lần trước, in thêm chênh lệch p95')
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario, {'users': args.users, 'duration': args.duration, 'warmup': args.warmup})
+
+    process, tmp_dir = None, None
+    base_url = (args.url or f'http://127.0.0.1:{args.port}').rstrip('/')
+    try:
+        if not args.url:
+            tmp_dir = tempfile.mkdtemp(prefix='load-test-')
+            process = start_server(args, os.path.join(tmp_dir, 'app.db'))
+        stats = _wait_ready(base_url, process, args.startup_timeout)
+        drug_count = stats.get('total_drugs', 0) - stats.get('live_drugs', 0)
+        latencies, errors = run_load(base_url, scenario, drug_count, args.timeout, args.seed)
+    finally:
+        if process is not None:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=30)
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    names = [entry['name'] for entry in scenario['requests']]
+    routes, total = summarize(latencies, errors, scenario['duration'], names)
+    report = {
+        'scenario': os.path.basename(args.scenario),
+        'settings': {
+            'users': scenario['users'],
+            'duration': scenario['duration'],
+            'warmup': scenario['warmup'],
+            'think_time': scenario['think_time'],
+            'server': 'external' if args.url else f'gunicorn workers={args.workers} threads={args.threads}',
+            'dataset_version': stats.get('dataset_version'),
+            'drug_count': drug_count,
+        },
+        'routes': routes,
+        'total': total,
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+    print_table(routes, total, previous)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+            f.write('\n')
+    if total['errors']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
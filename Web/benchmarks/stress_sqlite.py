@@ -0,0 +1,171 @@
+"""Stress test đa luồng cho lớp SQLite (init.py): tìm kiếm, lưu thuốc, click, xem lịch sử.
+
+Chạy cùng một workload trên database tạm với ba chế độ và so sánh thông lượng:
+
+    legacy        mỗi hàm mở/đóng sqlite3.connect riêng, journal DELETE, ghi log đồng bộ
+    pooled        kết nối dùng lại theo luồng + WAL + pragma, ghi log đồng bộ
+    write-behind  như pooled, log tìm kiếm qua SearchLogWriter
+
+Mọi lỗi (kể cả "database is locked") được đếm và in ra; exit code 1 nếu có lỗi.
+
+    python benchmarks/stress_sqlite.py --threads 16 --duration 10
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+WEB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, WEB_DIR)
+
+import init  # noqa: E402
+
+SYMPTOMS = ['đau đầu', 'sốt cao', 'ho khan', 'tiêu chảy', 'dị ứng', 'đau khớp', 'mệt mỏi', 'buồn nôn']
+MODES = ('legacy', 'pooled', 'write-behind')
+# (thao tác, trọng số) - gần với tỉ lệ request thực tế
+MIX = (('search', 50), ('click', 20), ('save', 10), ('check_saved', 15), ('history', 5))
+
+
+def _legacy_get_db():
+    """get_db() trước đây: mỗi lần gọi một kết nối mới, không pragma"""
+    conn = sqlite3.connect(init.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _prepare_database(path, mode, users):
+    init.DB_PATH = path
+    init.init_database()
+    conn = sqlite3.connect(path)
+    conn.execute(f"PRAGMA journal_mode = {'DELETE' if mode == 'legacy' else 'WAL'}")
+    for i in range(users):
+        conn.execute(
+            'INSERT OR IGNORE INTO users (username, password_hash, full_name) VALUES (?, ?, ?)',
+            (f'stress{i}', 'x', f'Stress {i}')
+        )
+    user_ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE username LIKE 'stress%'")]
+    conn.commit()
+    conn.close()
+    return user_ids
+
+
+def run_mode(mode, args):
+    workdir = tempfile.mkdtemp(prefix='stress_sqlite_')
+    original_get_db = init.get_db
+    original_db_path = init.DB_PATH
+    try:
+        user_ids = _prepare_database(os.path.join(workdir, 'stress.db'), mode, args.users)
+        if mode == 'legacy':
+            init.get_db = _legacy_get_db
+        writer = init.SearchLogWriter(db_path=init.DB_PATH) if mode == 'write-behind' else None
+
+        operations, weights = zip(*MIX)
+        counts, errors = Counter(), Counter()
+        latencies = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + args.duration
+        start_barrier = threading.Barrier(args.threads)
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local_counts, local_errors, local_latencies = Counter(), Counter(), []
+            start_barrier.wait()
+            while time.perf_counter() < deadline:
+                op = rng.choices(operations, weights)[0]
+                user_id = rng.choice(user_ids)
+                drug_index = rng.randrange(args.drugs)
+                started = time.perf_counter()
+                try:
+                    if op == 'search':
+                        symptoms = rng.choice(SYMPTOMS)
+                        if writer is not None:
+                            writer.log(user_id, symptoms, 15, 'stress')
+                        else:
+                            init.log_search(user_id, symptoms, 15, 'stress')
+                    elif op == 'click':
+                        init.track_drug_click(user_id, drug_index, f'Thuốc {drug_index}')
+                    elif op == 'save':
+                        init.save_drug(user_id, drug_index, f'Thuốc {drug_index}', 'tổng hợp', 'đau đầu', 1.5)
+                    elif op == 'check_saved':
+                        init.is_drug_saved(user_id, drug_index)
+                    else:
+                        init.get_search_history(user_id, limit=20)
+                    local_counts[op] += 1
+                    local_latencies.append(time.perf_counter() - started)
+                except sqlite3.Error as e:
+                    local_errors[f'{op}: {e}'] += 1
+            init.close_thread_connections()
+            with lock:
+                counts.update(local_counts)
+                errors.update(local_errors)
+                latencies.extend(local_latencies)
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(args.threads)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        if writer is not None:
+            writer.close()
+            if writer.dropped or writer.failed:
+                errors[f'search log: dropped={writer.dropped} failed={writer.failed}'] += 1
+
+        conn = sqlite3.connect(init.DB_PATH)
+        logged = conn.execute('SELECT COUNT(*) FROM search_logs').fetchone()[0]
+        conn.close()
+        if logged != counts['search']:
+            errors[f'search_logs has {logged} rows, expected {counts["search"]}'] += 1
+    finally:
+        init.get_db = original_get_db
+        init.DB_PATH = original_db_path
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies.sort()
+    total = sum(counts.values())
+
+    def pct(q):
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000 if latencies else 0.0
+
+    return {
+        'mode': mode,
+        'ops': total,
+        'ops_per_s': total / elapsed,
+        'p50_ms': pct(0.50),
+        'p99_ms': pct(0.99),
+        'counts': dict(counts),
+        'errors': dict(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--drugs', type=int, default=500)
+    parser.add_argument('--modes', default=','.join(MODES))
+    args = parser.parse_args()
+
+    print(f"{'mode':<14}{'ops':>9}{'ops/s':>10}{'p50_ms':>9}{'p99_ms':>9}{'errors':>8}")
+    failed = False
+    for mode in args.modes.split(','):
+        r = run_mode(mode, args)
+        n_errors = sum(r['errors'].values())
+        failed |= n_errors > 0
+        print(f"{r['mode']:<14}{r['ops']:>9}{r['ops_per_s']:>10.0f}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}{n_errors:>8}")
+        for message, count in sorted(r['errors'].items(), key=lambda item: -item[1])[:5]:
+            print(f"    {count} x {message}")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
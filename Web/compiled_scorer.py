@@ -0,0 +1,316 @@
+"""Bộ chấm điểm chỉ dùng NumPy, biên dịch từ model_package đã huấn luyện.
+
+Xuất TF-IDF (từ vựng, IDF), hệ số mô hình tuyến tính hoặc mảng cây đã làm phẳng
+của Random Forest và nhãn lớp ra các file .npy. Worker chỉ cần NumPy để load và
+dự đoán, không phải unpickle scikit-learn/scipy.
+
+    python compiled_scorer.py export <drug_recommendation_model.pkl> <thư mục đích>
+    python compiled_scorer.py export --vectorizer models/tfidf_vectorizer.pkl \
+        --model models/best_model.pkl --encoder models/label_encoder.pkl \
+        --numeric-features 8 <thư mục đích>
+"""
+import json
+import os
+import re
+
+import numpy as np
+
+FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+
+
+class CompiledScorer:
+    """Tái hiện TfidfVectorizer + predict_proba của mô hình bằng NumPy"""
+
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.arrays = arrays
+
+        vectorizer = meta['vectorizer']
+        self._token_pattern = re.compile(vectorizer['token_pattern'])
+        self._lowercase = vectorizer['lowercase']
+        self._stop_words = frozenset(vectorizer['stop_words'] or ())
+        self._ngram_range = tuple(vectorizer['ngram_range'])
+        self._binary = vectorizer['binary']
+        self._sublinear_tf = vectorizer['sublinear_tf']
+        self._norm = vectorizer['norm']
+        self._vocabulary = {term: col for col, term in enumerate(arrays['terms'].tolist())}
+        self._idf = arrays.get('idf')
+
+        self.kind = meta['model']['kind']
+        self.labels = arrays['labels'].tolist()
+        self.n_text_features = len(self._vocabulary)
+        self.n_features = meta['model']['n_features']
+
+    # ---- Biên dịch / lưu / load ----
+
+    @classmethod
+    def from_model_package(cls, model_package):
+        """Biên dịch từ model_package (tfidf_vectorizer, best_model, le_drug_type)"""
+        return cls.compile(
+            model_package['tfidf_vectorizer'],
+            model_package['best_model'],
+            model_package['le_drug_type'],
+            len(model_package.get('safe_numeric_features', []))
+        )
+
+    @classmethod
+    def compile(cls, vectorizer, model, label_encoder, n_numeric_features=0):
+        if getattr(vectorizer, 'analyzer', 'word') != 'word' or vectorizer.preprocessor or vectorizer.tokenizer:
+            raise ValueError("Chỉ hỗ trợ TfidfVectorizer với analyzer='word' mặc định")
+        if vectorizer.strip_accents:
+            raise ValueError("Chưa hỗ trợ strip_accents")
+        if re.compile(vectorizer.token_pattern).groups > 1:
+            raise ValueError("token_pattern có nhiều hơn một nhóm")
+
+        terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+        stop_words = vectorizer.get_stop_words()
+        arrays = {
+            'terms': np.array(terms, dtype=str),
+            'labels': np.array(label_encoder.inverse_transform(model.classes_), dtype=str),
+        }
+        if vectorizer.use_idf:
+            arrays['idf'] = np.asarray(vectorizer.idf_, dtype=np.float64)
+
+        meta = {
+            'format_version': FORMAT_VERSION,
+            'vectorizer': {
+                'token_pattern': vectorizer.token_pattern,
+                'lowercase': bool(vectorizer.lowercase),
+                'stop_words': sorted(stop_words) if stop_words else None,
+                'ngram_range': list(vectorizer.ngram_range),
+                'binary': bool(vectorizer.binary),
+                'sublinear_tf': bool(vectorizer.sublinear_tf),
+                'norm': vectorizer.norm,
+            },
+            'model': {
+                'n_features': len(terms) + n_numeric_features,
+                'estimator': type(model).__name__,
+            },
+        }
+
+        if hasattr(model, 'coef_'):
+            cls._compile_linear(model, len(terms), meta, arrays)
+        elif hasattr(model, 'estimators_') or hasattr(model, 'tree_'):
+            cls._compile_trees(model, meta, arrays)
+        else:
+            raise ValueError(f"Chưa hỗ trợ mô hình {type(model).__name__}")
+
+        return cls(meta, arrays)
+
+    @staticmethod
+    def _compile_linear(model, n_text_features, meta, arrays):
+        if not hasattr(model, 'predict_proba'):
+            raise ValueError(f"{type(model).__name__} không có predict_proba")
+        # Đặc trưng số luôn bằng 0 khi dự đoán nên chỉ cần phần hệ số của TF-IDF
+        arrays['coef_t'] = np.ascontiguousarray(np.asarray(model.coef_, dtype=np.float64)[:, :n_text_features].T)
+        arrays['intercept'] = np.asarray(model.intercept_, dtype=np.float64).reshape(-1)
+
+        multi_class = getattr(model, 'multi_class', 'auto')
+        ovr = (
+            len(model.classes_) <= 2
+            or multi_class in ('ovr', 'warn')
+            or (multi_class in ('auto', 'deprecated') and getattr(model, 'solver', None) == 'liblinear')
+        )
+        meta['model']['kind'] = 'linear'
+        meta['model']['link'] = 'ovr' if ovr else 'softmax'
+
+    @staticmethod
+    def _compile_trees(model, meta, arrays):
+        trees = model.estimators_ if hasattr(model, 'estimators_') else [model]
+        n_classes = len(model.classes_)
+
+        left, right, feature, threshold, value, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in trees:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            left.append(np.where(is_leaf, -1, tree.children_left + offset))
+            right.append(np.where(is_leaf, -1, tree.children_right + offset))
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            node_value = tree.value[:, 0, :n_classes].astype(np.float64)
+            totals = node_value.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            value.append(node_value / totals)
+            roots.append(offset)
+            offset += tree.node_count
+
+        arrays['children_left'] = np.concatenate(left).astype(np.int32)
+        arrays['children_right'] = np.concatenate(right).astype(np.int32)
+        arrays['feature'] = np.concatenate(feature).astype(np.int32)
+        arrays['threshold'] = np.concatenate(threshold).astype(np.float64)
+        arrays['value'] = np.concatenate(value)
+        arrays['roots'] = np.array(roots, dtype=np.int32)
+        meta['model']['kind'] = 'trees'
+
+    def save(self, path):
+        """Lưu thành thư mục .npy (có thể memory-map) + meta.json"""
+        os.makedirs(path, exist_ok=True)
+        for name, array in self.arrays.items():
+            np.save(os.path.join(path, f'{name}.npy'), array, allow_pickle=False)
+        meta = dict(self.meta, arrays=sorted(self.arrays))
+        with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Compiled scorer version {meta.get('format_version')} không được hỗ trợ")
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+            for name in meta['arrays']
+        }
+        return cls(meta, arrays)
+
+    # ---- TF-IDF ----
+
+    def _analyze(self, text):
+        if self._lowercase:
+            text = text.lower()
+        tokens = self._token_pattern.findall(text)
+        if self._stop_words:
+            tokens = [t for t in tokens if t not in self._stop_words]
+
+        min_n, max_n = self._ngram_range
+        if max_n == 1:
+            return tokens
+
+        original_tokens = tokens
+        if min_n == 1:
+            tokens = list(original_tokens)
+            min_n += 1
+        else:
+            tokens = []
+        n_original = len(original_tokens)
+        for n in range(min_n, min(max_n + 1, n_original + 1)):
+            for i in range(n_original - n + 1):
+                tokens.append(' '.join(original_tokens[i:i + n]))
+        return tokens
+
+    def transform(self, texts):
+        """TF-IDF dạng CSR: trả về (indptr, indices, data)"""
+        indptr = [0]
+        indices = []
+        counts = []
+        for text in texts:
+            row = {}
+            for term in self._analyze(text):
+                col = self._vocabulary.get(term)
+                if col is not None:
+                    row[col] = row.get(col, 0) + 1
+            for col in sorted(row):
+                indices.append(col)
+                counts.append(row[col])
+            indptr.append(len(indices))
+
+        indptr = np.array(indptr, dtype=np.int64)
+        indices = np.array(indices, dtype=np.int64)
+        data = np.array(counts, dtype=np.float64)
+
+        if self._binary:
+            data[:] = 1.0
+        if self._sublinear_tf:
+            data = np.log(data) + 1.0
+        if self._idf is not None:
+            data *= self._idf[indices]
+
+        if self._norm and len(data):
+            rows = np.repeat(np.arange(len(texts)), np.diff(indptr))
+            weights = data * data if self._norm == 'l2' else np.abs(data)
+            norms = np.bincount(rows, weights=weights, minlength=len(texts))
+            if self._norm == 'l2':
+                norms = np.sqrt(norms)
+            norms[norms == 0] = 1.0
+            data /= norms[rows]
+
+        return indptr, indices, data
+
+    # ---- Dự đoán ----
+
+    def predict_proba(self, texts):
+        indptr, indices, data = self.transform(texts)
+        n = len(indptr) - 1
+        rows = np.repeat(np.arange(n), np.diff(indptr))
+
+        if self.kind == 'linear':
+            coef_t = self.arrays['coef_t']
+            decision = np.zeros((n, coef_t.shape[1]), dtype=np.float64)
+            np.add.at(decision, rows, data[:, None] * coef_t[indices])
+            decision += self.arrays['intercept']
+
+            if self.meta['model']['link'] == 'softmax':
+                decision -= decision.max(axis=1).reshape((-1, 1))
+                np.exp(decision, decision)
+                decision /= decision.sum(axis=1).reshape((-1, 1))
+                return decision
+
+            prob = 1.0 / (1.0 + np.exp(-decision))
+            if prob.shape[1] == 1:
+                return np.hstack([1 - prob, prob])
+            return prob / prob.sum(axis=1).reshape((-1, 1))
+
+        # Cây: sklearn so sánh trên float32
+        X = np.zeros((n, self.n_features), dtype=np.float32)
+        X[rows, indices] = data
+        return self._predict_trees(X)
+
+    def _predict_trees(self, X):
+        left = self.arrays['children_left']
+        right = self.arrays['children_right']
+        feature = self.arrays['feature']
+        threshold = self.arrays['threshold']
+        roots = np.asarray(self.arrays['roots'])
+
+        n = X.shape[0]
+        nodes = np.broadcast_to(roots, (n, len(roots))).copy()
+        sample = np.broadcast_to(np.arange(n)[:, None], nodes.shape)
+        active = left[nodes] != -1
+        while active.any():
+            current = nodes[active]
+            go_left = X[sample[active], feature[current]] <= threshold[current]
+            nodes[active] = np.where(go_left, left[current], right[current])
+            active = left[nodes] != -1
+
+        return self.arrays['value'][nodes].mean(axis=1)
+
+    def predict(self, texts):
+        """Danh sách (lớp dự đoán, độ tin cậy) cho từng văn bản"""
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        confidences = probabilities[np.arange(len(best)), best]
+        return [(self.labels[i], float(c)) for i, c in zip(best.tolist(), confidences)]
+
+
+def _main(argv=None):
+    import argparse
+    import pickle
+
+    parser = argparse.ArgumentParser(description='Xuất model_package thành compiled scorer (NumPy)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export')
+    export.add_argument('package', nargs='?', help='drug_recommendation_model.pkl')
+    export.add_argument('output')
+    export.add_argument('--vectorizer')
+    export.add_argument('--model')
+    export.add_argument('--encoder')
+    export.add_argument('--numeric-features', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.package:
+        with open(args.package, 'rb') as f:
+            scorer = CompiledScorer.from_model_package(pickle.load(f))
+    else:
+        import joblib
+        scorer = CompiledScorer.compile(
+            joblib.load(args.vectorizer), joblib.load(args.model),
+            joblib.load(args.encoder), args.numeric_features
+        )
+    scorer.save(args.output)
+    print(f"Exported {scorer.meta['model']['estimator']} scorer to {args.output}")
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,102 @@
+"""Nén gzip/brotli cho response JSON theo Accept-Encoding của client.
+
+Chỉ nén response 200 có mimetype trong COMPRESS_MIMETYPES và lớn hơn
+COMPRESS_MIN_SIZE byte; brotli dùng khi thư viện `brotli` đã cài và client
+chấp nhận, nếu không thì gzip. Mức nén cấu hình qua app.config hoặc biến môi
+trường cùng tên (COMPRESS_GZIP_LEVEL, COMPRESS_BROTLI_LEVEL, ...).
+
+Response có ETag mạnh được gắn hậu tố theo encoding ("<tag>-gzip") vì bytes
+đã khác; route tự xử lý If-None-Match thì dùng `matching_etag` để nhận cả các
+biến thể này.
+"""
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # brotli là tùy chọn
+    brotli = None
+
+DEFAULTS = {
+    'COMPRESS_MIN_SIZE': 1024,
+    'COMPRESS_GZIP_LEVEL': 6,
+    'COMPRESS_BROTLI_LEVEL': 4,
+    'COMPRESS_MIMETYPES': ('application/json',),
+    'COMPRESS_BROTLI': True,
+}
+ENCODINGS = ('br', 'gzip')
+
+
+def _setting(app, name):
+    if name in os.environ:
+        value = os.environ[name]
+        if name == 'COMPRESS_MIMETYPES':
+            return tuple(m.strip() for m in value.split(',') if m.strip())
+        if name == 'COMPRESS_BROTLI':
+            return value != '0'
+        return int(value)
+    return app.config.get(name, DEFAULTS[name])
+
+
+def available_encodings(app):
+    """Các encoding server dùng được, theo thứ tự ưu tiên"""
+    return [e for e in ENCODINGS if e != 'br' or (brotli is not None and app.config['COMPRESS_BROTLI'])]
+
+
+def choose_encoding(accept_encodings, encodings):
+    """Encoding client chấp nhận với q cao nhất (bằng nhau thì theo thứ tự server)"""
+    best, best_quality = None, 0
+    for encoding in encodings:
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def matching_etag(request, etag):
+    """Biến thể của etag (gốc hoặc bản đã nén) có trong If-None-Match, None nếu không khớp"""
+    for tag in [etag] + [f'{etag}-{e}' for e in ENCODINGS]:
+        if request.if_none_match.contains(tag):
+            return tag
+    return None
+
+
+def init_compression(app):
+    """Đăng ký after_request nén response, cấu hình lấy từ env > app.config > DEFAULTS"""
+    for name in DEFAULTS:
+        app.config[name] = _setting(app, name)
+    encodings = available_encodings(app)
+    levels = {'br': app.config['COMPRESS_BROTLI_LEVEL'], 'gzip': app.config['COMPRESS_GZIP_LEVEL']}
+
+    @app.after_request
+    def compress_response(response):
+        from flask import request
+
+        if response.mimetype not in app.config['COMPRESS_MIMETYPES']:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code != 200 or response.direct_passthrough
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        encoding = choose_encoding(request.accept_encodings, encodings)
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        response.set_data(compress(data, encoding, levels[encoding]))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f'{etag}-{encoding}')
+        return response
+
+    return app
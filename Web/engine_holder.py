@@ -0,0 +1,188 @@
+"""Giữ engine đang phục vụ, reload nóng ở nền rồi đổi sang bản mới một lần.
+
+Mỗi request lấy `holder.current` một lần lúc bắt đầu và dùng đến hết, nên
+request đang chạy luôn kết thúc trên engine cũ. Reload dựng engine mới trong
+luồng nền, warm-up bằng các truy vấn gần đây, rồi mới đổi; bản trước được giữ
+lại để rollback ngay (mảng memory-map của nó vẫn sống dù thư mục bundle đã bị
+thay). Reload lỗi thì engine hiện tại giữ nguyên.
+
+Mỗi process (worker gunicorn) có holder riêng: reload qua trang quản trị chỉ
+áp dụng cho worker nhận request, còn theo dõi manifest.json của bundle thì
+mọi worker đều tự reload khi bundle được build lại.
+"""
+import logging
+import os
+import threading
+import time
+
+from search_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+WATCH_INTERVAL_ENV = 'DRUG_ENGINE_WATCH_INTERVAL'
+DEFAULT_WATCH_INTERVAL = 5.0  # giây, 0 để tắt
+WARMUP_QUERIES = 200
+
+
+class EngineHolder:
+    """Engine hiện tại + bản trước, reload nền có warm-up, đổi nguyên tử và rollback.
+
+    factory(artifact_dir) dựng engine mới; warmup_source(limit) trả về các truy
+    vấn gần đây để chạy thử trước khi đổi.
+    """
+
+    def __init__(self, factory, warmup_source=None, warmup_queries=WARMUP_QUERIES):
+        self.factory = factory
+        self.warmup_source = warmup_source
+        self.warmup_queries = warmup_queries
+        self.current = None
+        self.previous = None
+        self.state = 'idle'
+        self.last_error = None
+        self.last_reload = None
+        self._reload_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._watcher = None
+        self._watch_pid = None
+        # Chữ ký manifest.json của bundle lúc engine được load, theo thư mục
+        self._signatures = {}
+
+    def set(self, engine):
+        """Đặt engine hiện tại (lần khởi động đầu, không warm-up)"""
+        self._record_signature(engine.artifact_dir)
+        with self._swap_lock:
+            self.previous, self.current = self.current, engine
+
+    def reload(self, artifact_dir=None, background=True):
+        """Dựng engine mới từ artifact_dir (mặc định thư mục của engine hiện tại).
+
+        Trả về False nếu đang có reload khác chạy.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        if artifact_dir is None and self.current is not None:
+            artifact_dir = self.current.artifact_dir
+        if background:
+            threading.Thread(target=self._reload, args=(artifact_dir,), name='engine-reload', daemon=True).start()
+        else:
+            self._reload(artifact_dir)
+        return True
+
+    def _reload(self, artifact_dir):
+        started = time.perf_counter()
+        report = {'artifact_dir': artifact_dir, 'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z')}
+        try:
+            self.state = 'building'
+            # Lấy trước khi dựng: bundle bị build lại trong lúc load thì watcher vẫn thấy thay đổi
+            signature = self._bundle_signature(artifact_dir)
+            engine = self.factory(artifact_dir)
+            report['build_s'] = round(time.perf_counter() - started, 3)
+
+            self.state = 'warming'
+            report['warmup_queries'] = self._warm_up(engine)
+            report['warmup_s'] = round(time.perf_counter() - started - report['build_s'], 3)
+
+            with self._swap_lock:
+                self.previous, self.current = self.current, engine
+            self._signatures[self._signature_key(engine.artifact_dir)] = signature
+            self.state = 'idle'
+            self.last_error = None
+            report['status'] = 'swapped'
+            logger.info("Engine reloaded from %s in %.2fs (dataset %s, %d warm-up queries)",
+                        artifact_dir, time.perf_counter() - started, engine.manifest['dataset_version'],
+                        report['warmup_queries'])
+        except Exception as e:
+            self.state = 'failed'
+            self.last_error = f'{type(e).__name__}: {e}'
+            report['status'] = 'failed'
+            logger.exception("Engine reload failed, keeping current engine: %s", self.last_error)
+        finally:
+            report['total_s'] = round(time.perf_counter() - started, 3)
+            self.last_reload = report
+            self._reload_lock.release()
+
+    def _warm_up(self, engine):
+        """Chạy lại các truy vấn gần đây trên engine mới (điền search cache, chạm trang mmap)"""
+        engine.sync_live_drugs(force=True)
+        if self.warmup_source is None or not self.warmup_queries:
+            return 0
+        queries = list(dict.fromkeys(
+            normalize_query(q) for q in self.warmup_source(self.warmup_queries) if q and q.strip()
+        ))[:self.warmup_queries]
+        if queries:
+            engine.search_batch(queries)
+        return len(queries)
+
+    def rollback(self):
+        """Đổi lại engine trước đó; trả về False nếu không có bản trước"""
+        with self._swap_lock:
+            if self.previous is None:
+                return False
+            self.previous, self.current = self.current, self.previous
+        # Thuốc thêm/xóa trong lúc bản cũ nằm chờ
+        self.current.sync_live_drugs(force=True)
+        return True
+
+    def watch(self, interval=None):
+        """Theo dõi manifest.json của bundle, tự reload khi bundle được build lại.
+
+        Gọi được nhiều lần và sau fork: mỗi process chỉ chạy một luồng theo dõi.
+        """
+        if interval is None:
+            interval = float(os.environ.get(WATCH_INTERVAL_ENV, DEFAULT_WATCH_INTERVAL))
+        if interval <= 0 or self.current is None or self._watch_pid == os.getpid():
+            return
+        self._watch_pid = os.getpid()
+        self._signatures.setdefault(
+            self._signature_key(self.current.artifact_dir), self._bundle_signature(self.current.artifact_dir)
+        )
+        self._watcher = threading.Thread(target=self._watch_loop, args=(interval,), name='engine-watch', daemon=True)
+        self._watcher.start()
+
+    @staticmethod
+    def _signature_key(artifact_dir):
+        return os.path.abspath(artifact_dir)
+
+    def _record_signature(self, artifact_dir):
+        self._signatures[self._signature_key(artifact_dir)] = self._bundle_signature(artifact_dir)
+
+    @staticmethod
+    def _bundle_signature(artifact_dir):
+        try:
+            stat = os.stat(os.path.join(artifact_dir, 'manifest.json'))
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _watch_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            artifact_dir = self.current.artifact_dir
+            signature = self._bundle_signature(artifact_dir)
+            # So với chữ ký lúc load chính thư mục này (reload qua admin/rollback đã ghi lại),
+            # đang thay thư mục bundle (manifest tạm thời không có) thì chờ lượt sau
+            if signature is None or signature == self._signatures.get(self._signature_key(artifact_dir)):
+                continue
+            self.reload(artifact_dir, background=False)
+
+    def status(self):
+        def describe(engine):
+            if engine is None:
+                return None
+            return {
+                'dataset_version': engine.manifest['dataset_version'],
+                'created_at': engine.manifest.get('created_at'),
+                'drug_count': engine.manifest['drug_count'],
+                'scorer': engine.manifest.get('scorer'),
+                'artifact_dir': engine.artifact_dir,
+                'live_drugs': len(engine.live_drugs),
+            }
+
+        return {
+            'state': self.state,
+            'current': describe(self.current),
+            'previous': describe(self.previous),
+            'last_reload': self.last_reload,
+            'last_error': self.last_error,
+            'watching': self._watch_pid == os.getpid(),
+        }
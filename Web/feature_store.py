@@ -0,0 +1,286 @@
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+NO_INFO = 'Không có thông tin'
+NO_SOURCE = 'Không rõ nguồn'
+DEFAULT_DOSAGE = ['Theo chỉ định của bác sĩ', 'Đọc kỹ hướng dẫn sử dụng']
+# Tăng khi đổi cấu trúc drug_record/encode_detail để ETag chi tiết thuốc đổi theo
+DETAIL_FORMAT = 1
+
+PRESCRIPTION_KEYWORDS = [
+    'antibiotic', 'kháng sinh', 'corticosteroid', 'insulin',
+    'morphine', 'tramadol', 'antidepressant', 'anti'
+]
+
+
+def parse_to_list(text):
+    """Parse text thành list"""
+    if not text or text == NO_INFO:
+        return [NO_INFO]
+    
+    # Split by common delimiters
+    items = re.split(r'[.;,\n]', text)
+    items = [item.strip() for item in items if item.strip()]
+    
+    # Remove duplicates and empty items
+    seen = set()
+    result = []
+    for item in items:
+        if item and item not in seen and len(item) > 3:
+            seen.add(item)
+            result.append(item)
+    
+    return result if result else [text]
+
+
+def requires_prescription(drug_name):
+    """Check if drug requires prescription"""
+    drug_lower = str(drug_name).lower()
+    return any(drug in drug_lower for drug in PRESCRIPTION_KEYWORDS)
+
+
+class StringColumn:
+    """Cột chuỗi lưu dạng blob UTF-8 + offsets, đọc trực tiếp từ mảng memory-map"""
+
+    def __init__(self, offsets, blob, nulls=None):
+        self.offsets = offsets
+        self.blob = blob
+        self.nulls = nulls
+
+    @staticmethod
+    def encode(values):
+        """Mã hóa list chuỗi (None = thiếu) thành (offsets, blob[, nulls])"""
+        encoded = [b'' if v is None else v.encode('utf-8') for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        if any(v is None for v in values):
+            return offsets, blob, np.array([v is None for v in values], dtype=bool)
+        return offsets, blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, pos):
+        if self.nulls is not None and self.nulls[pos]:
+            return None
+        return self.blob[self.offsets[pos]:self.offsets[pos + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        return (self[pos] for pos in range(len(self)))
+
+    def take(self, positions):
+        """Giá trị tại nhiều vị trí: offsets/nulls lấy bằng một lần fancy-index"""
+        positions = np.asarray(positions, dtype=np.int64)
+        starts = self.offsets[positions].tolist()
+        ends = self.offsets[positions + 1].tolist()
+        nulls = self.nulls[positions].tolist() if self.nulls is not None else [False] * len(starts)
+        blob = self.blob
+        return [None if null else blob[start:end].tobytes().decode('utf-8')
+                for start, end, null in zip(starts, ends, nulls)]
+
+
+class JsonListColumn:
+    """Cột danh sách chuỗi, mỗi phần tử lưu dạng JSON trong một StringColumn"""
+
+    def __init__(self, column):
+        self.column = column
+
+    @staticmethod
+    def encode(values):
+        return StringColumn.encode([json.dumps(v, ensure_ascii=False) for v in values])
+
+    def __len__(self):
+        return len(self.column)
+
+    def __getitem__(self, pos):
+        return json.loads(self.column[pos])
+
+    def take(self, positions):
+        return [json.loads(value) for value in self.column.take(positions)]
+
+
+def drug_features(pos, name, ingredients, indication, contra, side_effects, source, classify,
+                  requires_prescription=requires_prescription, parse_to_list=parse_to_list):
+    """Đặc trưng của một thuốc (giá trị cho mọi cột của DrugFeatureStore)"""
+    def text(value, default=NO_INFO):
+        return str(value) if pd.notna(value) else default
+
+    drug_name = text(name, f"Thuốc {pos}")
+
+    # Extract main name and description
+    if ':' in drug_name:
+        main_name, description = drug_name.split(':', 1)
+        main_name, description = main_name.strip(), description.strip()
+    else:
+        main_name, description = drug_name, ""
+
+    features = {
+        'main_name': main_name,
+        'description': description,
+        'drug_class': classify(drug_name),
+        'prescription_required': requires_prescription(drug_name),
+        'source': text(source, NO_SOURCE),
+        'indication': text(indication),
+        'ingredients': text(ingredients),
+        'contraindication': text(contra),
+        'side_effects': text(side_effects),
+        'indication_lower': str(indication).lower() if pd.notna(indication) else None,
+    }
+    for name in ('indication', 'ingredients', 'contraindication', 'side_effects'):
+        features[f'{name}_list'] = parse_to_list(features[name])
+    return features
+
+
+# Trường của bản ghi thuốc -> (cột DrugFeatureStore cần đọc, hàm dựng giá trị); giữ thứ tự bản ghi
+RECORD_FIELDS = {
+    'index': ((), lambda pos, f: pos),
+    'name': (('main_name',), lambda pos, f: f['main_name']),
+    'description': (('description',), lambda pos, f: f['description']),
+    'drug_class': (('drug_class',), lambda pos, f: f['drug_class']),
+    'price': ((), lambda pos, f: 'Liên hệ để biết giá'),
+    'manufacturer': ((), lambda pos, f: 'Xem trên bao bì'),
+    'source': (('source',), lambda pos, f: f['source']),
+    'prescription_required': (('prescription_required',), lambda pos, f: bool(f['prescription_required'])),
+
+    # Detailed information
+    'indication': (('indication',), lambda pos, f: f['indication']),
+    'ingredients': (('ingredients',), lambda pos, f: f['ingredients']),
+    'contraindication': (('contraindication',), lambda pos, f: f['contraindication']),
+    'side_effects': (('side_effects',), lambda pos, f: f['side_effects']),
+
+    # Lists for display
+    'indication_list': (('indication_list',), lambda pos, f: list(f['indication_list'])),
+    'ingredients_list': (('ingredients_list',), lambda pos, f: list(f['ingredients_list'])),
+    'dosage_list': ((), lambda pos, f: list(DEFAULT_DOSAGE)),
+    'contraindication_list': (('contraindication_list',), lambda pos, f: list(f['contraindication_list'])),
+    'side_effects_list': (('side_effects_list',), lambda pos, f: list(f['side_effects_list'])),
+
+    # For search results
+    'matched_symptoms': ((), lambda pos, f: []),
+}
+
+
+def record_columns(fields=None):
+    """Các cột cần đọc để dựng những trường này (None = mọi trường)"""
+    fields = RECORD_FIELDS if fields is None else fields
+    return list(dict.fromkeys(column for name in fields for column in RECORD_FIELDS[name][0]))
+
+
+def drug_record(pos, features, fields=None):
+    """Bản ghi thuốc trả về cho giao diện từ các đặc trưng đã tính.
+
+    fields giới hạn các trường cần dựng (theo RECORD_FIELDS); features chỉ cần có
+    các cột của những trường đó.
+    """
+    if fields is None:
+        fields = RECORD_FIELDS
+    return {name: RECORD_FIELDS[name][1](pos, features) for name in fields}
+
+
+def encode_detail(record):
+    """JSON (UTF-8) của bản ghi chi tiết thuốc, đúng bytes trả về cho /drug/<id>"""
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class DrugFeatureStore:
+    """Đặc trưng từng thuốc tính sẵn một lần khi load dữ liệu.
+
+    Mỗi thuộc tính là một cột (list) căn theo vị trí thuốc trong data_final, để
+    luồng tìm kiếm, xem chi tiết và thuốc đã lưu không phải phân loại thuốc
+    hay tách chuỗi bằng regex lại ở mỗi request.
+    """
+
+    STRING_COLUMNS = (
+        'main_name', 'description', 'drug_class', 'source',
+        'indication', 'ingredients', 'contraindication', 'side_effects', 'indication_lower',
+    )
+    LIST_COLUMNS = ('indication_list', 'ingredients_list', 'contraindication_list', 'side_effects_list')
+    COLUMNS = STRING_COLUMNS + ('prescription_required',) + LIST_COLUMNS
+
+    def __init__(self, columns):
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name])
+        self.size = len(columns['main_name'])
+
+    def __len__(self):
+        return self.size
+
+    @classmethod
+    def from_dataframe(cls, data_final, classify, requires_prescription=requires_prescription,
+                       parse_to_list=parse_to_list):
+        """Dựng store từ data_final với các hàm phân loại/tách chuỗi của engine"""
+        columns = {name: [] for name in cls.COLUMNS}
+        rows = zip(
+            data_final['ten_thuoc'], data_final['thanh_phan'], data_final['chi_dinh'],
+            data_final['chong_chi_dinh'], data_final['tac_dung_phu'], data_final['source']
+        )
+        for pos, row in enumerate(rows):
+            features = drug_features(pos, *row, classify=classify,
+                                     requires_prescription=requires_prescription, parse_to_list=parse_to_list)
+            for name in cls.COLUMNS:
+                columns[name].append(features[name])
+
+        return cls(columns)
+
+    def to_arrays(self):
+        """Các mảng phẳng để lưu vào bundle (xem artifacts.py)"""
+        arrays = {}
+        for name in self.STRING_COLUMNS:
+            arrays.update(zip((f'{name}.offsets', f'{name}.blob', f'{name}.nulls'),
+                              StringColumn.encode(list(getattr(self, name)))))
+        for name in self.LIST_COLUMNS:
+            arrays.update(zip((f'{name}.offsets', f'{name}.blob'),
+                              JsonListColumn.encode(list(getattr(self, name)))))
+        arrays['prescription_required'] = np.array(list(self.prescription_required), dtype=bool)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Dựng store đọc trực tiếp từ các mảng (có thể là memory-map)"""
+        columns = {}
+        for name in cls.STRING_COLUMNS:
+            columns[name] = StringColumn(arrays[f'{name}.offsets'], arrays[f'{name}.blob'], arrays.get(f'{name}.nulls'))
+        for name in cls.LIST_COLUMNS:
+            columns[name] = JsonListColumn(StringColumn(arrays[f'{name}.offsets'], arrays[f'{name}.blob']))
+        columns['prescription_required'] = arrays['prescription_required']
+        return cls(columns)
+
+    def features(self, pos):
+        return {name: getattr(self, name)[pos] for name in self.COLUMNS}
+
+    def record(self, pos):
+        """Bản ghi thuốc đầy đủ (cùng cấu trúc với _get_drug_info trước đây)"""
+        return drug_record(pos, self.features(pos))
+
+    def detail_arrays(self, chunk_size=1000):
+        """Chi tiết JSON của mọi thuốc dạng (offsets, blob) để lưu vào bundle"""
+        offsets = np.zeros(self.size + 1, dtype=np.int64)
+        chunks = []
+        for start in range(0, self.size, chunk_size):
+            encoded = [encode_detail(record) for record in self.records(range(start, min(start + chunk_size, self.size)))]
+            offsets[start + 1:start + 1 + len(encoded)] = offsets[start] + np.cumsum([len(b) for b in encoded])
+            chunks.extend(encoded)
+        return {'offsets': offsets, 'blob': np.frombuffer(b''.join(chunks), dtype=np.uint8)}
+
+    def take(self, name, positions):
+        """Giá trị một cột tại nhiều vị trí"""
+        column = getattr(self, name)
+        if name == 'prescription_required':
+            return np.asarray(column)[positions].tolist()
+        # Store dựng từ DataFrame giữ cột dạng list
+        return column.take(positions) if hasattr(column, 'take') else [column[pos] for pos in positions]
+
+    def records(self, positions, fields=None):
+        """Bản ghi của nhiều thuốc, chỉ đọc các cột mà `fields` cần, mỗi cột một lần"""
+        positions = [int(pos) for pos in positions]
+        if not positions:
+            return []
+        columns = {name: self.take(name, positions) for name in record_columns(fields)}
+        return [
+            drug_record(pos, {name: values[i] for name, values in columns.items()}, fields)
+            for i, pos in enumerate(positions)
+        ]
@@ -0,0 +1,28 @@
+"""Cấu hình gunicorn cho wsgi:app (preload engine trong master, worker chia sẻ copy-on-write).
+
+Các biến môi trường: BIND, WEB_CONCURRENCY (số worker), GUNICORN_THREADS,
+GUNICORN_PRELOAD=0 để mỗi worker tự load engine (chỉ dùng khi so sánh).
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = 60
+
+# Load wsgi:app (engine, bundle memory-map) trong master trước khi fork
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+# Tắt GC trong master để không tạo "lỗ" trên các trang bộ nhớ sẽ chia sẻ,
+# freeze trước khi fork để GC của worker không ghi lên object của master
+gc.disable()
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
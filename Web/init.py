@@ -1,16 +1,55 @@
+import atexit
+import logging
 import os
+import queue
+import re
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timezone
 from werkzeug.security import generate_password_hash, check_password_hash
 
-# Database path
-DB_PATH = os.path.join(os.path.dirname(__file__), 'database', 'simple_app.db')
+logger = logging.getLogger(__name__)
+
+# Database path (DATABASE_PATH để dùng file khác, ví dụ database tạm khi chạy load test)
+DB_PATH = os.environ.get('DATABASE_PATH') or os.path.join(os.path.dirname(__file__), 'database', 'simple_app.db')
+
+# Ghi log tìm kiếm nền (write-behind)
+SEARCH_LOG_MAX_QUEUE = 10000
+SEARCH_LOG_BATCH_SIZE = 200
+SEARCH_LOG_FLUSH_INTERVAL = 1.0  # giây
+SEARCH_LOG_POLICY = 'drop'  # 'drop': bỏ log mới khi đầy, 'block': chờ tối đa block_timeout rồi mới bỏ
+
+# Kết nối SQLite dùng lại theo luồng
+DB_BUSY_TIMEOUT = 5.0  # giây chờ khi database đang bị khóa ghi
+DB_CACHE_SIZE_KB = 8192
+DB_CACHED_STATEMENTS = 256
+DB_PRAGMAS = (
+    'PRAGMA synchronous = NORMAL',  # đủ an toàn với WAL, không fsync mỗi commit
+    f'PRAGMA cache_size = -{DB_CACHE_SIZE_KB}',
+    f'PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT * 1000)}',
+    'PRAGMA temp_store = MEMORY',
+)
+
+# Thuốc mẫu của database mới: chỉ để trang quản trị có dữ liệu, không đưa vào engine
+SAMPLE_DRUGS = (
+    ('Paracetamol 500mg', 'Giảm đau hạ sốt', 'Paracetamol 500mg', 'Giảm đau, hạ sốt, đau đầu'),
+    ('Aspirin 325mg', 'Giảm đau chống viêm', 'Aspirin 325mg', 'Giảm đau, chống viêm, đau khớp'),
+    ('Amoxicillin 500mg', 'Kháng sinh', 'Amoxicillin 500mg', 'Nhiễm trùng, viêm phổi, viêm họng'),
+    ('Omeprazole 20mg', 'Tiêu hóa', 'Omeprazole 20mg', 'Viêm dạ dày, trào ngược'),
+    ('Vitamin C 1000mg', 'Vitamin', 'Vitamin C 1000mg', 'Tăng cường miễn dịch'),
+)
+
+# Nhật ký drugs_master_changes: engine không đồng bộ quá DRUG_CHANGES_TTL giây không còn giữ mốc cắt
+DRUG_CHANGES_TTL = 3600
 
 def init_database():
     """Khởi tạo cơ sở dữ liệu đơn giản"""
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     
     conn = sqlite3.connect(DB_PATH)
+    # WAL lưu vĩnh viễn trong file database: người đọc không chặn người ghi
+    conn.execute('PRAGMA journal_mode = WAL')
     cursor = conn.cursor()
     
     # Bảng users đơn giản
@@ -85,39 +124,348 @@ def init_database():
             INSERT INTO users (username, password_hash, full_name, role)
             VALUES (?, ?, ?, ?)
         ''', ('admin', admin_password, 'Administrator', 'admin'))
-        print("Created admin account: admin/admin123")
+        logger.info("Created admin account: admin/admin123")
     
 
     cursor.execute('SELECT COUNT(*) FROM drugs_master')
     if cursor.fetchone()[0] == 0:
-        sample_drugs = [
-            ('Paracetamol 500mg', 'Giảm đau hạ sốt', 'Paracetamol 500mg', 'Giảm đau, hạ sốt, đau đầu'),
-            ('Aspirin 325mg', 'Giảm đau chống viêm', 'Aspirin 325mg', 'Giảm đau, chống viêm, đau khớp'),
-            ('Amoxicillin 500mg', 'Kháng sinh', 'Amoxicillin 500mg', 'Nhiễm trùng, viêm phổi, viêm họng'),
-            ('Omeprazole 20mg', 'Tiêu hóa', 'Omeprazole 20mg', 'Viêm dạ dày, trào ngược'),
-            ('Vitamin C 1000mg', 'Vitamin', 'Vitamin C 1000mg', 'Tăng cường miễn dịch')
-        ]
-        
-        for drug in sample_drugs:
+        for drug in SAMPLE_DRUGS:
             cursor.execute('''
                 INSERT INTO drugs_master (drug_name, drug_class, ingredients, indication)
                 VALUES (?, ?, ?, ?)
             ''', drug)
         
-        print("Added 5 sample drugs")
+        logger.info("Added %d sample drugs", len(SAMPLE_DRUGS))
     
     conn.commit()
+    run_migrations(conn)
+    # Chỉ cảnh báo khi khởi động; `python init.py check-plans` mới báo lỗi (dùng trong CI/deploy)
+    for problem in check_query_plans(conn):
+        logger.warning("Query plan regression: %s", problem)
     conn.close()
-    print(f"Database initialized: {DB_PATH}")
+    logger.info("Database initialized: %s", DB_PATH)
 
 
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
 
-def get_db():
-    """Lấy kết nối database"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+
+def _migration_add_columns(conn):
+    """Thêm cột còn thiếu trên database cũ"""
+    if 'score' not in _columns(conn, 'saved_drugs'):
+        conn.execute('ALTER TABLE saved_drugs ADD COLUMN score REAL')
+    if 'user_agent' not in _columns(conn, 'search_logs'):
+        conn.execute('ALTER TABLE search_logs ADD COLUMN user_agent TEXT')
+
+
+def _migration_unique_favorites(conn):
+    """Gộp các dòng click trùng (user_id, drug_index) rồi thêm unique key"""
+    conn.execute('''
+        CREATE TEMP TABLE favorites_merged AS
+        SELECT MIN(id) AS id, user_id, drug_index,
+               (SELECT f2.drug_name FROM search_favorites f2
+                WHERE f2.user_id IS f.user_id AND f2.drug_index IS f.drug_index
+                ORDER BY f2.last_clicked DESC, f2.id DESC LIMIT 1) AS drug_name,
+               SUM(COALESCE(click_count, 1)) AS click_count,
+               MAX(last_clicked) AS last_clicked
+        FROM search_favorites f
+        GROUP BY user_id, drug_index
+    ''')
+    conn.execute('DELETE FROM search_favorites')
+    conn.execute('''
+        INSERT INTO search_favorites (id, user_id, drug_index, drug_name, click_count, last_clicked)
+        SELECT id, user_id, drug_index, drug_name, click_count, last_clicked FROM favorites_merged
+    ''')
+    conn.execute('DROP TABLE favorites_merged')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_search_favorites_user_drug
+        ON search_favorites (user_id, drug_index)
+    ''')
+
+
+def _migration_hot_path_indexes(conn):
+    """Index cho lịch sử tìm kiếm và danh sách thuốc đã lưu theo user"""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_search_logs_user_time
+        ON search_logs (user_id, search_time)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_saved_drugs_user_saved
+        ON saved_drugs (user_id, saved_at)
+    ''')
+
+
+# Cột của drugs_master được đánh chỉ mục full-text và trọng số bm25 tương ứng
+DRUG_FTS_COLUMNS = ('drug_name', 'drug_class', 'ingredients', 'indication')
+DRUG_FTS_WEIGHTS = (10.0, 2.0, 5.0, 1.0)
+
+
+def _fold_sql(column):
+    """Biểu thức SQL bỏ dấu chữ đ/Đ (unicode61 không tách được đ thành d)"""
+    return f"replace(replace({column}, 'đ', 'd'), 'Đ', 'D')"
+
+
+def _migration_drugs_fts(conn):
+    """Bảng FTS5 trên drugs_master, đồng bộ bằng trigger, tokenizer bỏ dấu tiếng Việt"""
+    # Nguồn nội dung là view đã bỏ dấu đ để 'rebuild' và trigger đánh chỉ mục cùng một giá trị
+    conn.execute(f'''
+        CREATE VIEW IF NOT EXISTS drugs_fts_source AS
+        SELECT id, {', '.join(f'{_fold_sql(c)} AS {c}' for c in DRUG_FTS_COLUMNS)}
+        FROM drugs_master
+    ''')
+    conn.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS drugs_fts USING fts5(
+            {', '.join(DRUG_FTS_COLUMNS)},
+            content='drugs_fts_source', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+
+    columns = ', '.join(DRUG_FTS_COLUMNS)
+    new_values = ', '.join(_fold_sql(f'new.{c}') for c in DRUG_FTS_COLUMNS)
+    old_values = ', '.join(_fold_sql(f'old.{c}') for c in DRUG_FTS_COLUMNS)
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS drugs_master_fts_insert AFTER INSERT ON drugs_master BEGIN
+            INSERT INTO drugs_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS drugs_master_fts_delete AFTER DELETE ON drugs_master BEGIN
+            INSERT INTO drugs_fts (drugs_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS drugs_master_fts_update AFTER UPDATE ON drugs_master BEGIN
+            INSERT INTO drugs_fts (drugs_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO drugs_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    ''')
+    conn.execute("INSERT INTO drugs_fts (drugs_fts) VALUES ('rebuild')")
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_drugs_master_created ON drugs_master (created_at)')
+
+
+def _migration_drug_changes(conn):
+    """Nhật ký thay đổi drugs_master (ghi bằng trigger) để mọi worker cập nhật engine dần dần"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS drugs_master_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            drug_id INTEGER NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for event, row in (('INSERT', 'new'), ('UPDATE', 'new'), ('DELETE', 'old')):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS drugs_master_changes_{event.lower()} AFTER {event} ON drugs_master BEGIN
+                INSERT INTO drugs_master_changes (drug_id) VALUES ({row}.id);
+            END
+        ''')
+    # Thuốc đã có trước migration cũng phải vào engine
+    conn.execute('INSERT INTO drugs_master_changes (drug_id) SELECT id FROM drugs_master ORDER BY id')
+
+
+def _migration_drug_changes_state(conn):
+    """Seq đã đồng bộ của từng engine và mốc đã cắt nhật ký drugs_master_changes"""
+    # name: 'host:pid' của engine, hoặc 'pruned' = nhật ký đến seq này đã bị xóa
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS drugs_changes_state (
+            name TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+# (version, mô tả, hàm). Chỉ thêm vào cuối, không sửa migration đã phát hành
+MIGRATIONS = [
+    (1, 'add saved_drugs.score, search_logs.user_agent', _migration_add_columns),
+    (2, 'unique search_favorites (user_id, drug_index)', _migration_unique_favorites),
+    (3, 'indexes search_logs (user_id, search_time), saved_drugs (user_id, saved_at)', _migration_hot_path_indexes),
+    (4, 'drugs_fts full-text index on drugs_master', _migration_drugs_fts),
+    (5, 'drugs_master_changes log for live engine updates', _migration_drug_changes),
+    (6, 'drugs_changes_state for pruning drugs_master_changes', _migration_drug_changes_state),
+]
+
+
+def get_schema_version(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+
+def run_migrations(conn):
+    """Áp dụng các migration chưa chạy, mỗi migration trong một transaction riêng"""
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        for version, description, migrate in MIGRATIONS:
+            # BEGIN IMMEDIATE để nhiều process khởi động cùng lúc không chạy trùng migration
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if get_schema_version(conn) >= version:
+                    conn.execute('ROLLBACK')
+                    continue
+                migrate(conn)
+                conn.execute(
+                    'INSERT INTO schema_version (version, description) VALUES (?, ?)', (version, description)
+                )
+                conn.execute('COMMIT')
+                logger.info("Applied migration %d: %s", version, description)
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+    finally:
+        conn.isolation_level = isolation_level
+
+
+# Câu SQL của các truy vấn nóng: hàm truy cập và check_query_plans dùng chung một bản
+VERIFY_USER_SQL = 'SELECT * FROM users WHERE username = ?'
+SEARCH_HISTORY_SQL = '''
+    SELECT * FROM search_logs
+    WHERE user_id = ?
+    ORDER BY search_time DESC
+    LIMIT ?
+'''
+SEARCH_COUNT_SQL = 'SELECT COUNT(*) FROM search_logs WHERE user_id = ?'
+TOP_SYMPTOMS_SQL = '''
+    SELECT symptoms, COUNT(*) as count
+    FROM search_logs
+    WHERE user_id = ?
+    GROUP BY LOWER(symptoms)
+    ORDER BY count DESC
+    LIMIT 5
+'''
+CLEAR_SEARCH_HISTORY_SQL = 'DELETE FROM search_logs WHERE user_id = ?'
+SAVED_DRUGS_SQL = '''
+    SELECT * FROM saved_drugs
+    WHERE user_id = ?
+    ORDER BY saved_at DESC
+'''
+IS_DRUG_SAVED_SQL = '''
+    SELECT COUNT(*) FROM saved_drugs
+    WHERE user_id = ? AND drug_index = ?
+'''
+REMOVE_SAVED_DRUG_SQL = '''
+    DELETE FROM saved_drugs
+    WHERE user_id = ? AND drug_index = ?
+'''
+TRACK_DRUG_CLICK_SQL = '''
+    INSERT INTO search_favorites (user_id, drug_index, drug_name, click_count, last_clicked)
+    VALUES (?, ?, ?, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id, drug_index) DO UPDATE SET
+        drug_name = excluded.drug_name,
+        click_count = click_count + 1,
+        last_clicked = excluded.last_clicked
+'''
+LATEST_DRUGS_SQL = '''
+    SELECT id, drug_name, drug_class, ingredients, indication, created_at
+    FROM drugs_master
+    ORDER BY created_at DESC, id DESC
+    LIMIT ? OFFSET ?
+'''
+
+# Truy vấn nóng -> (SQL, tham số mẫu, index phải dùng, sort tạm được phép).
+# Upsert (INSERT ... ON CONFLICT) không có query plan: index phải là unique key của đích ON CONFLICT
+HOT_QUERIES = {
+    'verify_user': (VERIFY_USER_SQL, ('admin',), 'sqlite_autoindex_users_1', ()),
+    'get_search_history': (SEARCH_HISTORY_SQL, (1, 50), 'idx_search_logs_user_time', ()),
+    'get_search_statistics.total': (SEARCH_COUNT_SQL, (1,), 'idx_search_logs_user_time', ()),
+    # Gom theo LOWER(symptoms) và sắp theo số lần chỉ trên lịch sử của một user
+    'get_search_statistics.top_symptoms': (
+        TOP_SYMPTOMS_SQL, (1,), 'idx_search_logs_user_time', ('GROUP BY', 'ORDER BY')
+    ),
+    'clear_search_history': (CLEAR_SEARCH_HISTORY_SQL, (1,), 'idx_search_logs_user_time', ()),
+    'get_saved_drugs': (SAVED_DRUGS_SQL, (1,), 'idx_saved_drugs_user_saved', ()),
+    'is_drug_saved': (IS_DRUG_SAVED_SQL, (1, 1), 'sqlite_autoindex_saved_drugs_1', ()),
+    'remove_saved_drug': (REMOVE_SAVED_DRUG_SQL, (1, 1), 'sqlite_autoindex_saved_drugs_1', ()),
+    'track_drug_click': (TRACK_DRUG_CLICK_SQL, (1, 1, ''), 'idx_search_favorites_user_drug', ()),
+    'get_all_drugs': (LATEST_DRUGS_SQL, (50, 0), 'idx_drugs_master_created', ()),
+}
+
+
+def _is_unique_index(conn, index):
+    row = conn.execute("SELECT tbl_name FROM sqlite_master WHERE type = 'index' AND name = ?", (index,)).fetchone()
+    if row is None:
+        return False
+    return any(name == index and unique for _, name, unique, *_ in conn.execute(f'PRAGMA index_list({row[0]})'))
+
+
+def check_query_plans(conn):
+    """Danh sách truy vấn nóng không dùng index mong đợi hoặc phải sort tạm ngoài phần được phép"""
+    problems = []
+    for name, (sql, params, index, allowed_temp) in HOT_QUERIES.items():
+        try:
+            plan = ' | '.join(row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params))
+        except sqlite3.Error as e:
+            problems.append(f"{name}: {e}")
+            continue
+        if sql.lstrip().upper().startswith('INSERT'):
+            # Prepare thành công nghĩa là ON CONFLICT khớp một unique key; kiểm tra đó là index mong đợi
+            if not _is_unique_index(conn, index):
+                problems.append(f"{name}: {index} không phải unique index")
+            continue
+        temp_sorts = re.findall(r'TEMP B-TREE FOR (?:RIGHT PART OF |LAST TERM OF )?(GROUP BY|ORDER BY|DISTINCT)', plan)
+        if f'INDEX {index}' not in plan or set(temp_sorts) - set(allowed_temp):
+            problems.append(f"{name}: {plan} (cần {index})")
+    return problems
+
+
+
+class _ReusableConnection(sqlite3.Connection):
+    """Kết nối dùng lại trong cùng luồng: close() chỉ rollback phần chưa commit"""
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def really_close(self):
+        super().close()
+
+
+_local = threading.local()
+# Kết nối kế thừa từ process cha sau fork: giữ tham chiếu, không dùng và không đóng
+_inherited_connections = []
+
+
+def _thread_connection(db_path):
+    """Kết nối của luồng hiện tại tới db_path (mở lần đầu, tạo lại sau fork)"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None or _local.pid != os.getpid():
+        if connections:
+            _inherited_connections.extend(connections.values())
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(
+            db_path, timeout=DB_BUSY_TIMEOUT, factory=_ReusableConnection,
+            cached_statements=DB_CACHED_STATEMENTS
+        )
+        for pragma in DB_PRAGMAS:
+            conn.execute(pragma)
+        conn.row_factory = sqlite3.Row
+        connections[db_path] = conn
     return conn
 
+
+def close_thread_connections():
+    """Đóng thật các kết nối của luồng hiện tại"""
+    connections = getattr(_local, 'connections', None) or {}
+    if getattr(_local, 'pid', None) == os.getpid():
+        for conn in connections.values():
+            conn.really_close()
+    _local.connections = None
+
+
+def get_db():
+    """Lấy kết nối database (dùng lại theo luồng, WAL + pragma đã cấu hình)"""
+    return _thread_connection(DB_PATH)
+
 def create_user(username, password, full_name):
     """Tạo user mới"""
     conn = get_db()
@@ -138,9 +486,7 @@ def create_user(username, password, full_name):
 def verify_user(username, password):
     """Xác thực user"""
     conn = get_db()
-    user = conn.execute(
-        'SELECT * FROM users WHERE username = ?', (username,)
-    ).fetchone()
+    user = conn.execute(VERIFY_USER_SQL, (username,)).fetchone()
     conn.close()
     
     if user and check_password_hash(user['password_hash'], password):
@@ -158,6 +504,7 @@ def log_search(user_id, symptoms, results_count,user_agent):
 
 def get_stats():
     """Lấy thống kê đơn giản"""
+    search_log_writer.flush()
     conn = get_db()
     
     total_users = conn.execute('SELECT COUNT(*) FROM users WHERE role != "admin"').fetchone()[0]
@@ -191,7 +538,7 @@ def save_drug(user_id, drug_index, drug_name, drug_class, symptoms, score, notes
         conn.commit()
         return cursor.lastrowid
     except Exception as e:
-        print(f"Error saving drug: {e}")
+        logger.error("Error saving drug: %s", e)
         raise
     finally:
         conn.close()
@@ -199,11 +546,7 @@ def save_drug(user_id, drug_index, drug_name, drug_class, symptoms, score, notes
 def get_saved_drugs(user_id):
     """Lấy danh sách thuốc đã lưu của user"""
     conn = get_db()
-    saved_drugs = conn.execute('''
-        SELECT * FROM saved_drugs 
-        WHERE user_id = ? 
-        ORDER BY saved_at DESC
-    ''', (user_id,)).fetchall()
+    saved_drugs = conn.execute(SAVED_DRUGS_SQL, (user_id,)).fetchall()
     conn.close()
     return [dict(drug) for drug in saved_drugs]
 
@@ -211,10 +554,7 @@ def remove_saved_drug(user_id, drug_index):
     """Xóa thuốc khỏi danh sách đã lưu"""
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('''
-        DELETE FROM saved_drugs 
-        WHERE user_id = ? AND drug_index = ?
-    ''', (user_id, drug_index))
+    cursor.execute(REMOVE_SAVED_DRUG_SQL, (user_id, drug_index))
     deleted_rows = cursor.rowcount
     conn.commit()
     conn.close()
@@ -223,63 +563,226 @@ def remove_saved_drug(user_id, drug_index):
 def is_drug_saved(user_id, drug_index):
     """Kiểm tra thuốc đã được lưu chưa"""
     conn = get_db()
-    result = conn.execute('''
-        SELECT COUNT(*) FROM saved_drugs 
-        WHERE user_id = ? AND drug_index = ?
-    ''', (user_id, drug_index)).fetchone()[0]
+    result = conn.execute(IS_DRUG_SAVED_SQL, (user_id, drug_index)).fetchone()[0]
     conn.close()
     return result > 0
 
 
 
+class _FlushRequest:
+    """Đánh dấu trong hàng đợi: writer ghi hết phần trước nó rồi báo lại"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class _StopRequest(_FlushRequest):
+    """Như _FlushRequest, sau đó luồng writer kết thúc"""
+
+
+class SearchLogWriter:
+    """Ghi search_logs kiểu write-behind, ngoài luồng xử lý request.
+
+    Request chỉ đưa log vào hàng đợi có giới hạn; một luồng nền gom log và ghi
+    bằng executemany trong một transaction khi đủ `batch_size` hoặc sau
+    `flush_interval` giây. Hàng đợi đầy thì bỏ log (policy 'drop') hoặc chờ
+    tối đa `block_timeout` giây (policy 'block'). Thời điểm tìm kiếm được lấy
+    lúc đưa vào hàng đợi nên không lệch theo độ trễ ghi.
+    """
+
+    def __init__(self, db_path=None, max_queue=SEARCH_LOG_MAX_QUEUE, batch_size=SEARCH_LOG_BATCH_SIZE,
+                 flush_interval=SEARCH_LOG_FLUSH_INTERVAL, policy=SEARCH_LOG_POLICY, block_timeout=0.05):
+        if policy not in ('drop', 'block'):
+            raise ValueError(f"Policy không hợp lệ: {policy}")
+        self.db_path = db_path
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self._stats_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """Trạng thái theo process: luồng nền không còn sau fork nên dựng lại trong worker"""
+        self._pid = os.getpid()
+        self._queue = queue.Queue(self.max_queue)
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+    def _ensure_started(self):
+        if self._pid != os.getpid():
+            self._reset()
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='search-log-writer', daemon=True)
+                    self._thread.start()
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def log(self, user_id, symptoms, results_count, user_agent=None):
+        """Đưa một log vào hàng đợi, trả về False nếu bị bỏ do hàng đợi đầy"""
+        if self._closed and self._pid == os.getpid():
+            self._count('dropped')
+            return False
+        self._ensure_started()
+        search_time = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        entry = (user_id, symptoms, results_count, user_agent, search_time)
+        try:
+            if self.policy == 'block':
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('queued')
+        return True
+
+    def flush(self, timeout=5.0):
+        """Chờ ghi xong các log đã đưa vào hàng đợi (vd. trước khi đọc/xóa lịch sử)"""
+        if self._pid != os.getpid() or self._thread is None or self._closed:
+            return True
+        request = _FlushRequest()
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            return False
+        return request.done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Ghi nốt hàng đợi, dừng và chờ luồng nền kết thúc (gọi khi tắt process); log sau đó bị bỏ"""
+        if self._pid != os.getpid() or self._closed:
+            return True
+        self._closed = True
+        if self._thread is None:
+            return True
+        request = _StopRequest()
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            return False
+        stopped = request.done.wait(timeout)
+        self._thread.join(timeout)
+        return stopped and not self._thread.is_alive()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            wait = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, _FlushRequest):
+                self._write(batch)
+                batch, deadline = [], None
+                item.done.set()
+                if isinstance(item, _StopRequest):
+                    close_thread_connections()
+                    return
+                continue
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch, deadline = [], None
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            conn = _thread_connection(self.db_path or DB_PATH)
+            try:
+                with conn:
+                    try:
+                        conn.executemany('''
+                            INSERT INTO search_logs (user_id, symptoms, results_count, user_agent, search_time)
+                            VALUES (?, ?, ?, ?, ?)
+                        ''', batch)
+                    except sqlite3.OperationalError as e:
+                        # Fallback nếu không có cột user_agent
+                        if 'user_agent' not in str(e):
+                            raise
+                        conn.executemany('''
+                            INSERT INTO search_logs (user_id, symptoms, results_count, search_time)
+                            VALUES (?, ?, ?, ?)
+                        ''', [(u, s, r, t) for u, s, r, _, t in batch])
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.error("Search log write error (%d entries): %s", len(batch), e)
+            self._count('failed', len(batch))
+            return
+        self._count('flushed', len(batch))
+        self._count('batches')
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'pending': self._queue.qsize() if self._pid == os.getpid() else 0,
+                'queued': self.queued,
+                'flushed': self.flushed,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'batches': self.batches,
+                'max_queue': self.max_queue,
+                'batch_size': self.batch_size,
+                'flush_interval': self.flush_interval,
+                'policy': self.policy,
+            }
+
+
+search_log_writer = SearchLogWriter()
+atexit.register(search_log_writer.close)
+
+
 def log_search_enhanced(user_id, symptoms, results_count, user_agent = None):
-    """Ghi log tìm kiếm với thông tin chi tiết"""
-    conn = get_db()
-    # Kiểm tra xem cột user_agent có tồn tại không
-    try:
-        conn.execute('''
-            INSERT INTO search_logs (user_id, symptoms, results_count, user_agent)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, symptoms, results_count, user_agent))
-    except sqlite3.OperationalError:
-        # Fallback nếu không có cột user_agent
-        conn.execute('''
-            INSERT INTO search_logs (user_id, symptoms, results_count)
-            VALUES (?, ?, ?)
-        ''', (user_id, symptoms, results_count))
-    conn.commit()
-    conn.close()
+    """Ghi log tìm kiếm với thông tin chi tiết (đưa vào hàng đợi, ghi nền theo lô)"""
+    return search_log_writer.log(user_id, symptoms, results_count, user_agent)
 
 def get_search_history(user_id, limit=50):
     """Lấy lịch sử tìm kiếm của user"""
+    search_log_writer.flush()
     conn = get_db()
-    history = conn.execute('''
-        SELECT * FROM search_logs 
-        WHERE user_id = ? 
-        ORDER BY search_time DESC 
-        LIMIT ?
-    ''', (user_id, limit)).fetchall()
+    history = conn.execute(SEARCH_HISTORY_SQL, (user_id, limit)).fetchall()
     conn.close()
     return [dict(item) for item in history]
 
+def get_recent_search_queries(limit=200):
+    """Các truy vấn tìm kiếm gần đây nhất (mọi user, không trùng), dùng để warm-up engine"""
+    search_log_writer.flush()
+    conn = get_db()
+    rows = conn.execute('''
+        SELECT symptoms FROM search_logs ORDER BY id DESC LIMIT ?
+    ''', (limit * 5,)).fetchall()
+    conn.close()
+    return list(dict.fromkeys(row['symptoms'] for row in rows))[:limit]
+
 def get_search_statistics(user_id):
     """Thống kê tìm kiếm của user"""
+    search_log_writer.flush()
     conn = get_db()
     
     # Tổng số lần tìm kiếm
-    total_searches = conn.execute('''
-        SELECT COUNT(*) FROM search_logs WHERE user_id = ?
-    ''', (user_id,)).fetchone()[0]
+    total_searches = conn.execute(SEARCH_COUNT_SQL, (user_id,)).fetchone()[0]
     
     # Triệu chứng được tìm nhiều nhất
-    top_symptoms = conn.execute('''
-        SELECT symptoms, COUNT(*) as count 
-        FROM search_logs 
-        WHERE user_id = ? 
-        GROUP BY LOWER(symptoms) 
-        ORDER BY count DESC 
-        LIMIT 5
-    ''', (user_id,)).fetchall()
+    top_symptoms = conn.execute(TOP_SYMPTOMS_SQL, (user_id,)).fetchall()
     
     return {
         'total_searches': total_searches,
@@ -288,9 +791,11 @@ def get_search_statistics(user_id):
 
 def clear_search_history(user_id):
     """Xóa lịch sử tìm kiếm"""
+    # Ghi nốt log đang chờ để không bị chèn lại sau khi xóa
+    search_log_writer.flush()
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('DELETE FROM search_logs WHERE user_id = ?', (user_id,))
+    cursor.execute(CLEAR_SEARCH_HISTORY_SQL, (user_id,))
     deleted_rows = cursor.rowcount
     conn.commit()
     conn.close()
@@ -300,13 +805,7 @@ def track_drug_click(user_id, drug_index, drug_name):
     """Theo dõi click vào thuốc"""
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('''
-        INSERT OR REPLACE INTO search_favorites 
-        (user_id, drug_index, drug_name, click_count, last_clicked)
-        VALUES (?, ?, ?, 
-            COALESCE((SELECT click_count FROM search_favorites WHERE user_id = ? AND drug_index = ?), 0) + 1,
-            CURRENT_TIMESTAMP)
-    ''', (user_id, drug_index, drug_name, user_id, drug_index))
+    cursor.execute(TRACK_DRUG_CLICK_SQL, (user_id, drug_index, drug_name))
     conn.commit()
     conn.close()
 
@@ -372,28 +871,129 @@ def change_password(user_id, current_password, new_password):
 
 
 
-def get_all_drugs(search_term=None):
-    """Lấy danh sách thuốc đơn giản"""
+def drug_fts_query(search_term):
+    """Chuyển từ khóa người dùng thành truy vấn FTS5: mọi từ đều phải có, từ cuối khớp tiền tố"""
+    folded = search_term.replace('đ', 'd').replace('Đ', 'D')
+    tokens = re.findall(r'\w+', folded)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def get_all_drugs(search_term=None, limit=50, offset=0):
+    """Lấy danh sách thuốc: có từ khóa thì xếp hạng bm25 qua drugs_fts, không thì mới nhất trước"""
     conn = get_db()
+    query = drug_fts_query(search_term) if search_term else None
     
-    if search_term:
-        drugs = conn.execute('''
-            SELECT id, drug_name, drug_class, ingredients, indication, created_at
-            FROM drugs_master 
-            WHERE drug_name LIKE ? OR ingredients LIKE ?
-            ORDER BY created_at DESC
-        ''', (f'%{search_term}%', f'%{search_term}%')).fetchall()
+    if query:
+        weights = ', '.join(str(w) for w in DRUG_FTS_WEIGHTS)
+        drugs = conn.execute(f'''
+            SELECT d.id, d.drug_name, d.drug_class, d.ingredients, d.indication, d.created_at
+            FROM drugs_fts
+            JOIN drugs_master d ON d.id = drugs_fts.rowid
+            WHERE drugs_fts MATCH ?
+            ORDER BY bm25(drugs_fts, {weights}), d.id
+            LIMIT ? OFFSET ?
+        ''', (query, limit, offset)).fetchall()
+    elif search_term:
+        drugs = []
     else:
-        drugs = conn.execute('''
-            SELECT id, drug_name, drug_class, ingredients, indication, created_at
-            FROM drugs_master 
-            ORDER BY created_at DESC
-            LIMIT 50
-        ''', ).fetchall()
+        drugs = conn.execute(LATEST_DRUGS_SQL, (limit, offset)).fetchall()
     
     conn.close()
     return [dict(drug) for drug in drugs]
 
+def count_drugs(search_term=None):
+    """Số thuốc khớp từ khóa (dùng cho phân trang)"""
+    conn = get_db()
+    query = drug_fts_query(search_term) if search_term else None
+    
+    if query:
+        total = conn.execute('SELECT COUNT(*) FROM drugs_fts WHERE drugs_fts MATCH ?', (query,)).fetchone()[0]
+    elif search_term:
+        total = 0
+    else:
+        total = conn.execute('SELECT COUNT(*) FROM drugs_master').fetchone()[0]
+    
+    conn.close()
+    return total
+
+def _is_sample_drug(row):
+    return (row['drug_name'], row['drug_class'], row['ingredients'], row['indication']) in SAMPLE_DRUGS
+
+def get_drug_changes(since_seq=0):
+    """(seq mới nhất, danh sách id thuốc thay đổi sau since_seq, full).
+
+    Nhật ký sau since_seq đã bị cắt thì full=True và danh sách là mọi id hiện có
+    trong drugs_master: engine phải đồng bộ lại toàn bộ thuốc thêm trực tiếp.
+    """
+    conn = get_db()
+    try:
+        # Một snapshot đọc cho mốc cắt, nhật ký và drugs_master
+        conn.execute('BEGIN')
+        pruned = conn.execute("SELECT seq FROM drugs_changes_state WHERE name = 'pruned'").fetchone()
+        pruned = pruned[0] if pruned else 0
+        if since_seq < pruned:
+            latest = conn.execute('SELECT MAX(seq) FROM drugs_master_changes').fetchone()[0]
+            ids = [row[0] for row in conn.execute('SELECT id FROM drugs_master ORDER BY id')]
+            return max(latest or 0, pruned), ids, True
+        rows = conn.execute('''
+            SELECT seq, drug_id FROM drugs_master_changes WHERE seq > ? ORDER BY seq
+        ''', (since_seq,)).fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        return since_seq, [], False
+    return rows[-1]['seq'], list(dict.fromkeys(row['drug_id'] for row in rows)), False
+
+def prune_drug_changes(name, seq, ttl=DRUG_CHANGES_TTL):
+    """Ghi seq đã đồng bộ của engine `name` rồi xóa nhật ký mà mọi engine còn hoạt động đã đọc.
+
+    Engine không ghi lại trong ttl giây không còn giữ mốc cắt; khi quay lại nó
+    thấy nhật ký bị cắt qua seq của mình và đồng bộ lại toàn bộ. Trả về số dòng đã xóa.
+    """
+    conn = get_db()
+    try:
+        with conn:
+            conn.execute('''
+                INSERT INTO drugs_changes_state (name, seq, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (name) DO UPDATE SET seq = excluded.seq, updated_at = excluded.updated_at
+            ''', (name, seq))
+            stale = f'-{int(ttl)} seconds'
+            conn.execute('''
+                DELETE FROM drugs_changes_state WHERE name != 'pruned' AND updated_at < datetime('now', ?)
+            ''', (stale,))
+            horizon = conn.execute(
+                "SELECT MIN(seq) FROM drugs_changes_state WHERE name != 'pruned'"
+            ).fetchone()[0]
+            deleted = conn.execute('DELETE FROM drugs_master_changes WHERE seq <= ?', (horizon,)).rowcount
+            if deleted:
+                conn.execute('''
+                    INSERT INTO drugs_changes_state (name, seq) VALUES ('pruned', ?)
+                    ON CONFLICT (name) DO UPDATE SET seq = MAX(seq, excluded.seq), updated_at = CURRENT_TIMESTAMP
+                ''', (horizon,))
+    finally:
+        conn.close()
+    return deleted
+
+def get_drugs_by_ids(drug_ids):
+    """Các dòng drugs_master hiện có theo id, bỏ thuốc mẫu (id đã xóa không có trong kết quả)"""
+    conn = get_db()
+    drugs = {}
+    ids = list(drug_ids)
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        for row in conn.execute(f'''
+            SELECT id, drug_name, drug_class, ingredients, indication, created_at
+            FROM drugs_master WHERE id IN ({', '.join('?' * len(chunk))})
+        ''', chunk):
+            if not _is_sample_drug(row):
+                drugs[row['id']] = dict(row)
+    conn.close()
+    return drugs
+
 def add_drug(drug_name, drug_class, ingredients, indication):
     """Thêm thuốcn"""
     conn = get_db()
@@ -420,8 +1020,28 @@ def delete_drug(drug_id):
     conn.close()
     return deleted_rows > 0
 
+def _check_plans_main(db_path):
+    """Kiểm tra query plan của database đã khởi tạo; mã thoát 1 nếu có truy vấn nóng bị hỏng plan"""
+    conn = sqlite3.connect(db_path)
+    try:
+        problems = check_query_plans(conn)
+    finally:
+        conn.close()
+    for problem in problems:
+        print(problem)
+    print(f"{db_path}: {len(HOT_QUERIES) - len(problems)}/{len(HOT_QUERIES)} truy vấn nóng dùng đúng index")
+    return 1 if problems else 0
+
+
 # Khởi tạo khi import
 if __name__ == "__main__":
+    import sys
+    if sys.argv[1:2] == ['check-plans']:
+        # python init.py check-plans [database]: khởi tạo/migrate rồi kiểm tra, lỗi thì thoát 1
+        if len(sys.argv) > 2:
+            DB_PATH = sys.argv[2]
+        init_database()
+        sys.exit(_check_plans_main(DB_PATH))
     init_database()
     print("Available functions:")
     import inspect
@@ -0,0 +1,82 @@
+"""Cấu hình logging cho ứng dụng: ghi qua hàng đợi, luồng nền mới ghi ra stderr.
+
+Request chỉ đưa bản ghi vào hàng đợi nên không chờ I/O; các dòng debug trên
+đường tìm kiếm dùng mức DEBUG và bị bỏ qua từ đầu ở mức mặc định INFO.
+
+    LOG_LEVEL=DEBUG      mức log (mặc định INFO)
+    LOG_FORMAT=json      mỗi dòng một object JSON (mặc định dạng text)
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+LOG_LEVEL_ENV = 'LOG_LEVEL'
+LOG_FORMAT_ENV = 'LOG_FORMAT'
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s'
+
+# Thuộc tính có sẵn của LogRecord, phần còn lại (extra=...) đưa vào JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.process,
+            'message': record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS})
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _ProcessQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler tự khởi động lại luồng ghi sau fork (worker gunicorn không thừa kế luồng của master)"""
+
+    def __init__(self, target):
+        super().__init__(queue.SimpleQueue())
+        self.target = target
+        self._pid = None
+        self._listener = None
+        self._start()
+
+    def _start(self):
+        self.queue = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+        self._listener.start()
+        self._pid = os.getpid()
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        super().enqueue(record)
+
+    def close(self):
+        if self._pid == os.getpid() and self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        super().close()
+
+
+def configure_logging(level=None, fmt=None):
+    """Gắn handler hàng đợi vào root logger (gọi nhiều lần chỉ cấu hình một lần)"""
+    root = logging.getLogger()
+    level = (level or os.environ.get(LOG_LEVEL_ENV, 'INFO')).upper()
+    root.setLevel(level)
+    if any(isinstance(handler, _ProcessQueueHandler) for handler in root.handlers):
+        return root
+
+    target = logging.StreamHandler(sys.stderr)
+    if (fmt or os.environ.get(LOG_FORMAT_ENV, 'text')) == 'json':
+        target.setFormatter(JsonFormatter())
+    else:
+        target.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root.addHandler(_ProcessQueueHandler(target))
+    # logging.shutdown() lúc thoát sẽ close handler và ghi nốt hàng đợi
+    return root
@@ -0,0 +1,76 @@
+"""Automaton Aho–Corasick: tìm mọi từ khóa xuất hiện trong văn bản bằng một lượt quét.
+
+Thay cho vòng lặp `keyword in text` trên từng từ khóa (phân loại thuốc theo tên,
+nhận diện triệu chứng trong truy vấn, dựng chỉ mục từ khóa trên chi_dinh). Kết
+quả giống hệt phép `in` (khớp chuỗi con, phân biệt hoa thường: người gọi tự
+lowercase), nhưng chi phí chỉ phụ thuộc độ dài văn bản chứ không phụ thuộc số
+từ khóa.
+
+Hàm chuyển trạng thái được tính đủ khi dựng (DFA), nên mỗi ký tự chỉ cần một
+lần tra dict, không phải lần theo liên kết failure lúc quét. Vòng quét vẫn là
+Python thuần: với văn bản ngắn (tên thuốc, truy vấn) nhanh hơn nhiều lần so
+với hàng trăm phép `in`, với văn bản dài và ít từ khóa thì xấp xỉ nhau (xem
+benchmarks/bench_matcher.py).
+"""
+from collections import deque
+
+
+class AhoCorasick:
+    """Automaton trên danh sách từ khóa; id của từ khóa là vị trí trong `patterns` (đã bỏ trùng)"""
+
+    def __init__(self, patterns):
+        self.patterns = list(dict.fromkeys(patterns))
+        if '' in self.patterns:
+            raise ValueError("Từ khóa rỗng")
+        goto = [{}]
+        outputs = [[]]
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    next_state = goto[state][ch] = len(goto)
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(pattern_id)
+
+        # BFS: failure của mỗi trạng thái là hậu tố dài nhất cũng là tiền tố của một từ khóa.
+        # delta[s] = chuyển của failure(s) ghi đè bởi goto[s], nên ký tự không có trong dict về gốc.
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            delta[state] = dict(delta[fail[state]])
+            delta[state].update(goto[state])
+            outputs[state].extend(outputs[fail[state]])
+            for ch, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(ch, 0) if state else 0
+                queue.append(child)
+
+        # Đánh số lại: trạng thái có từ khóa kết thúc nằm cuối, lúc quét chỉ cần so sánh số nguyên
+        order = sorted(range(len(goto)), key=lambda s: (bool(outputs[s]), s))
+        renumber = {old: new for new, old in enumerate(order)}
+        self._transitions = [{ch: renumber[t] for ch, t in delta[old].items()}.get for old in order]
+        self._outputs = [tuple(sorted(set(outputs[old]))) for old in order]
+        self._first_output = sum(1 for out in outputs if not out)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def find_ids(self, text):
+        """Tập id các từ khóa xuất hiện trong text"""
+        transitions, outputs, first_output = self._transitions, self._outputs, self._first_output
+        state = 0
+        found = set()
+        for ch in text:
+            state = transitions[state](ch, 0)
+            if state >= first_output:
+                found.update(outputs[state])
+        return found
+
+    def find(self, text):
+        """Tập các từ khóa xuất hiện trong text (tương đương {p for p in patterns if p in text})"""
+        return {self.patterns[i] for i in self.find_ids(text)}
@@ -0,0 +1,276 @@
+"""Sửa lỗi gõ và thiếu dấu trong truy vấn trước khi chấm điểm ("tieu chay" -> "tiêu chảy").
+
+Từ vựng là các từ của chi_dinh (từ chỉ mục triệu chứng, kèm số thuốc chứa từ)
+cộng với các từ trong từ khóa của symptom_mapping. Mọi tra cứu làm trên dạng bỏ
+dấu (NFD bỏ dấu thanh/dấu phụ, đ -> d):
+
+- bảng dạng bỏ dấu -> từ có dấu phổ biến nhất, cho truy vấn gõ không dấu;
+- từ điển xóa đối xứng (symmetric delete): mỗi dạng bỏ dấu sinh các chuỗi xóa
+  tối đa MAX_EDIT_DISTANCE ký tự (trên PREFIX_LENGTH ký tự đầu), truy vấn sinh
+  chuỗi xóa của nó rồi tra, ứng viên được kiểm lại bằng khoảng cách
+  Damerau-Levenshtein. Chi phí mỗi từ của truy vấn không phụ thuộc kích thước
+  từ vựng.
+
+Sau đó cụm nhiều từ của truy vấn được so với từ khóa triệu chứng ở dạng bỏ dấu,
+để "tieu chay" thành đúng từ khóa "tiêu chảy" thay vì từng từ phổ biến nhất.
+Chỉ từ không có trong từ vựng mới bị sửa; từ đúng chính tả giữ nguyên, từ có
+dấu nhưng lạ chỉ được sửa dấu (không đoán lỗi gõ). Từ 2-3 ký tự ("va", "bi",
+"ca") quá mơ hồ nên chỉ được sửa khi nằm trong một cụm từ khóa khớp; lỗi gõ chỉ
+đoán cho từ từ MIN_TYPO_LENGTH ký tự, khoảng cách tối đa tăng theo độ dài, và
+bỏ qua khi ứng viên tốt nhất không hơn hẳn ứng viên thứ hai.
+
+Bảng tra là các mảng phẳng (khóa crc32 đã sắp xếp + id) nên được lưu trong
+bundle và memory-map như chỉ mục triệu chứng (xem artifacts.py).
+"""
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+
+from feature_store import StringColumn
+
+CORRECTION_FORMAT = 1
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+MIN_WORD_LENGTH = 4  # từ ngắn hơn chỉ được sửa trong cụm từ khóa
+MIN_TYPO_LENGTH = 5  # từ ngắn hơn chỉ sửa dấu, không sửa lỗi gõ
+LONG_TYPO_LENGTH = 9  # từ 5-8 ký tự sửa tối đa 1 lỗi gõ, dài hơn thì MAX_EDIT_DISTANCE
+TYPO_COUNT_MARGIN = 2  # cùng khoảng cách: ứng viên phải phổ biến gấp ít nhất chừng này lần ứng viên thứ hai
+MAX_PHRASE_WORDS = 3
+
+_TOKEN = re.compile(r'^(\W*)(.*?)(\W*)$')
+
+
+def fold_accents(text):
+    """Bỏ dấu tiếng Việt: "tiêu chảy" -> "tieu chay", "đau" -> "dau" """
+    decomposed = unicodedata.normalize('NFD', text)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return stripped.replace('đ', 'd').replace('Đ', 'D')
+
+
+def _key(text):
+    return zlib.crc32(text.encode('utf-8'))
+
+
+def _deletes(word, max_distance):
+    """word và mọi chuỗi có được khi xóa tối đa max_distance ký tự (trên tiền tố PREFIX_LENGTH)"""
+    word = word[:PREFIX_LENGTH]
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - result
+        result |= frontier
+    return result
+
+
+def edit_distance(a, b, max_distance):
+    """Damerau-Levenshtein (optimal string alignment); > max_distance thì trả về max_distance + 1"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+def _word_core(token):
+    """Tách dấu câu đầu/cuối: "sốt," -> ("", "sốt", ",")"""
+    return _TOKEN.match(token).groups()
+
+
+def _vocabulary_word(core):
+    return len(core) >= 2 and core.isalpha()
+
+
+def _sorted_pairs(pairs):
+    keys = np.fromiter((k for k, _ in pairs), dtype=np.uint32, count=len(pairs))
+    ids = np.fromiter((i for _, i in pairs), dtype=np.int32, count=len(pairs))
+    order = np.argsort(keys, kind='stable')
+    return keys[order], ids[order]
+
+
+class QueryCorrector:
+    """Chỉ mục sửa truy vấn; `correct(query)` trả về (truy vấn đã sửa, danh sách sửa đổi)"""
+
+    def __init__(self, arrays, keywords=()):
+        self.arrays = arrays
+        self._forms = StringColumn(arrays['form_offsets'], arrays['form_blob'])
+        self._form_words = StringColumn(arrays['word_offsets'], arrays['word_blob'])
+        self._form_counts = arrays['form_counts']
+        self._form_keys = arrays['form_keys']
+        self._form_ids = arrays['form_ids']
+        self._delete_keys = arrays['delete_keys']
+        self._delete_ids = arrays['delete_ids']
+        self._word_keys = arrays['word_keys']
+        self.max_distance = int(arrays['max_distance'][0])
+
+        # Cụm từ khóa theo dạng bỏ dấu (từ khóa đứng trước trong symptom_mapping được ưu tiên)
+        self._phrases = {}
+        for keyword in keywords:
+            words = keyword.split()
+            if len(words) <= MAX_PHRASE_WORDS:
+                self._phrases.setdefault(tuple(fold_accents(w) for w in words), words)
+
+    @classmethod
+    def build(cls, words, counts, keywords=(), max_distance=MAX_EDIT_DISTANCE):
+        """Dựng từ các từ (có thể lẫn dấu câu) và số thuốc chứa mỗi từ, cộng từ trong keywords"""
+        word_counts = {}
+        for word, count in zip(words, counts):
+            core = _word_core(word)[1]
+            if _vocabulary_word(core):
+                word_counts[core] = word_counts.get(core, 0) + int(count)
+        # Từ của từ khóa triệu chứng luôn có trong từ vựng, thắng khi cùng dạng bỏ dấu
+        top = max(word_counts.values(), default=0) + 1
+        for keyword in keywords:
+            for word in keyword.split():
+                if _vocabulary_word(word) and word_counts.get(word, 0) < top:
+                    word_counts[word] = top
+
+        best = {}
+        for word, count in sorted(word_counts.items()):
+            form = fold_accents(word)
+            total, best_word, best_count = best.get(form, (0, None, -1))
+            if count > best_count:
+                best_word, best_count = word, count
+            best[form] = (total + count, best_word, best_count)
+        forms = sorted(best)
+
+        form_offsets, form_blob = StringColumn.encode(forms)
+        word_offsets, word_blob = StringColumn.encode([best[form][1] for form in forms])
+        form_keys, form_ids = _sorted_pairs([(_key(form), i) for i, form in enumerate(forms)])
+        delete_keys, delete_ids = _sorted_pairs([
+            (_key(deleted), i) for i, form in enumerate(forms) for deleted in _deletes(form, max_distance)
+        ])
+        arrays = {
+            'form_offsets': form_offsets,
+            'form_blob': form_blob,
+            'word_offsets': word_offsets,
+            'word_blob': word_blob,
+            'form_counts': np.array([best[form][0] for form in forms], dtype=np.int64),
+            'form_keys': form_keys,
+            'form_ids': form_ids,
+            'delete_keys': delete_keys,
+            'delete_ids': delete_ids,
+            'word_keys': np.unique(np.fromiter((_key(w) for w in word_counts), dtype=np.uint32)),
+            'max_distance': np.array([max_distance], dtype=np.int64),
+        }
+        return cls(arrays, keywords)
+
+    @classmethod
+    def from_index(cls, symptom_index, keywords, max_distance=MAX_EDIT_DISTANCE):
+        """Dựng trên từ vựng chi_dinh của SymptomIndex (số thuốc = độ dài posting của mỗi từ)"""
+        counts = np.diff(symptom_index._token_offsets)
+        return cls.build(symptom_index._vocabulary, counts, keywords, max_distance)
+
+    def __len__(self):
+        return len(self._forms)
+
+    @staticmethod
+    def _lookup(keys, ids, key):
+        lo, hi = np.searchsorted(keys, key, side='left'), np.searchsorted(keys, key, side='right')
+        return ids[lo:hi].tolist()
+
+    def known(self, word):
+        """Từ có trong từ vựng (đúng cả dấu)"""
+        key = _key(word)
+        i = int(np.searchsorted(self._word_keys, key))
+        return i < len(self._word_keys) and int(self._word_keys[i]) == key
+
+    def _exact_form(self, form):
+        for form_id in self._lookup(self._form_keys, self._form_ids, _key(form)):
+            if self._forms[form_id] == form:
+                return form_id
+        return None
+
+    def _closest_form(self, form):
+        """Dạng bỏ dấu gần nhất trong từ vựng (khoảng cách nhỏ nhất, rồi phổ biến nhất).
+
+        None nếu ứng viên tốt nhất không hơn hẳn ứng viên thứ hai: cùng khoảng cách
+        mà không phổ biến gấp TYPO_COUNT_MARGIN lần.
+        """
+        max_distance = min(self.max_distance, 1 if len(form) < LONG_TYPO_LENGTH else 2)
+        deleted = sorted(_deletes(form, max_distance))
+        keys = np.array([_key(d) for d in deleted], dtype=np.uint32)
+        lo = np.searchsorted(self._delete_keys, keys, side='left')
+        hi = np.searchsorted(self._delete_keys, keys, side='right')
+        candidates = {int(i) for start, end in zip(lo.tolist(), hi.tolist()) for i in self._delete_ids[start:end]}
+
+        ranked = []
+        for form_id in candidates:
+            distance = edit_distance(form, self._forms[form_id], max_distance)
+            if distance <= max_distance:
+                ranked.append((distance, -int(self._form_counts[form_id]), form_id))
+        if not ranked:
+            return None
+        ranked.sort()
+        best_distance, best_count, best = ranked[0]
+        if len(ranked) > 1:
+            distance, count, _ = ranked[1]
+            if distance == best_distance and -best_count < TYPO_COUNT_MARGIN * -count:
+                return None
+        return best
+
+    def _correct_form(self, core):
+        """Dạng bỏ dấu đã sửa của một từ không có trong từ vựng, None nếu không sửa được"""
+        if not _vocabulary_word(core) or len(core) < MIN_WORD_LENGTH:
+            return None
+        form = fold_accents(core)
+        form_id = self._exact_form(form)
+        # Từ gõ có dấu mà không có trong từ vựng thường là từ đúng nhưng hiếm, chỉ sửa dấu
+        if form_id is None and form == core and len(form) >= MIN_TYPO_LENGTH:
+            form_id = self._closest_form(form)
+        return form_id
+
+    def correct(self, query):
+        """(truy vấn đã sửa, [{'original': ..., 'corrected': ...}]) cho truy vấn đã chuẩn hóa"""
+        tokens = query.split()
+        parts = [_word_core(token) for token in tokens]
+        unknown = [not self.known(core) for _, core, _ in parts]
+        if not any(unknown):
+            return query, []
+
+        # Dạng bỏ dấu của từng từ: từ sai được thay bằng dạng gần nhất trong từ vựng
+        form_ids = [self._correct_form(core) if bad else None for (_, core, _), bad in zip(parts, unknown)]
+        forms = [
+            self._forms[form_id] if form_id is not None else fold_accents(core)
+            for (_, core, _), form_id in zip(parts, form_ids)
+        ]
+
+        words = [core for _, core, _ in parts]
+        # Hai từ liền nhau không bị dấu câu ngăn cách thì mới ghép thành cụm
+        joined = [not parts[j][2] and not parts[j + 1][0] for j in range(len(parts) - 1)]
+        corrections = []
+        i = 0
+        while i < len(tokens):
+            # Cụm từ khóa triệu chứng dài nhất bắt đầu tại i, có chứa từ sai (từ ngắn phải nằm trong cụm nhiều từ)
+            shortest = 1 if len(words[i]) >= MIN_WORD_LENGTH else 2
+            for length in range(min(MAX_PHRASE_WORDS, len(tokens) - i), shortest - 1, -1):
+                phrase = self._phrases.get(tuple(forms[i:i + length]))
+                if (phrase is not None and any(unknown[i:i + length]) and all(joined[i:i + length - 1])
+                        and words[i:i + length] != phrase):
+                    corrections.append({'original': ' '.join(words[i:i + length]), 'corrected': ' '.join(phrase)})
+                    words[i:i + length] = phrase
+                    i += length
+                    break
+            else:
+                if unknown[i] and form_ids[i] is not None:
+                    replacement = self._form_words[form_ids[i]]
+                    if replacement != words[i]:
+                        corrections.append({'original': words[i], 'corrected': replacement})
+                        words[i] = replacement
+                i += 1
+
+        if not corrections:
+            return query, []
+        corrected = ' '.join(f'{lead}{word}{trail}' for (lead, _, trail), word in zip(parts, words))
+        return corrected, corrections
@@ -0,0 +1,115 @@
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_query(symptoms):
+    """Chuẩn hóa truy vấn làm khóa cache: NFC, chữ thường, gộp khoảng trắng"""
+    return ' '.join(unicodedata.normalize('NFC', str(symptoms)).lower().split())
+
+
+class _Flight:
+    """Một lần tính đang chạy, các request trùng khóa chờ trên event này"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class QueryResultCache:
+    """Cache LRU + TTL cho kết quả tìm kiếm, gộp các request trùng nhau (single-flight).
+
+    Chỉ một luồng tính kết quả cho mỗi khóa, các luồng khác cùng khóa chờ và
+    dùng chung kết quả. `invalidate()` xóa toàn bộ và bỏ qua các kết quả đang
+    tính dở từ dữ liệu/mô hình cũ.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+                leader = True
+            generation = self._generation
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                if flight.error is None and generation == self._generation:
+                    self._store(key, flight.result)
+            flight.event.set()
+
+        return flight.result
+
+    def _store(self, key, value):
+        self._entries[key] = (value, self._clock() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self):
+        """Xóa cache khi dữ liệu hoặc mô hình thay đổi"""
+        with self._lock:
+            self._entries.clear()
+            self._flights.clear()
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'coalesced': self.coalesced,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,297 @@
+import numpy as np
+import pandas as pd
+
+from feature_store import StringColumn, drug_record, encode_detail
+from matcher import AhoCorasick
+from tfidf_index import TFIDF_CATEGORY_BONUS, TFIDF_SCORE_SCALE, document_text
+
+# Thuốc thêm trực tiếp (drugs_master) có vị trí = LIVE_DRUG_OFFSET + id, không đổi khi
+# khởi động lại hay đổi bundle nên saved_drugs.drug_index luôn trỏ đúng thuốc
+LIVE_DRUG_OFFSET = 10_000_000
+
+
+def _csr(groups, dtype=np.int32):
+    """Gộp danh sách các nhóm vị trí thành (offsets, values)"""
+    offsets = np.zeros(len(groups) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(g) for g in groups])
+    values = np.fromiter((v for g in groups for v in g), dtype=dtype, count=int(offsets[-1]))
+    return offsets, values
+
+
+class SymptomIndex:
+    """Chỉ mục ngược trên cột chi_dinh, dựng một lần khi khởi tạo engine.
+
+    - Mỗi từ khóa trong symptom_mapping -> danh sách vị trí thuốc có chứa từ khóa đó.
+    - Mỗi token (tách theo khoảng trắng) của chi_dinh -> danh sách vị trí thuốc,
+      kèm chỉ mục trigram trên từ vựng để tra các mảnh từ của truy vấn.
+
+    Điểm được cộng dồn trên mảng NumPy chỉ gồm các thuốc ứng viên, nên chi phí
+    mỗi truy vấn phụ thuộc số thuốc khớp chứ không phụ thuộc kích thước dữ liệu.
+    Toàn bộ chỉ mục là các mảng phẳng (CSR) nên lưu/memory-map được (xem artifacts.py).
+    """
+
+    def __init__(self, arrays, vocabulary=None):
+        self.arrays = arrays
+        self.size = int(arrays['size'][0])
+
+        keywords = arrays['keywords'].tolist()
+        offsets, positions = arrays['keyword_offsets'], arrays['keyword_positions']
+        self._keyword_postings = {
+            keyword: positions[offsets[i]:offsets[i + 1]] for i, keyword in enumerate(keywords)
+        }
+        self.keywords = keywords
+
+        self._vocabulary = vocabulary if vocabulary is not None else StringColumn(
+            arrays['vocab_offsets'], arrays['vocab_blob']
+        )
+        self._token_offsets = arrays['token_offsets']
+        self._token_positions = arrays['token_positions']
+        self._grams = arrays['grams']
+        self._gram_offsets = arrays['gram_offsets']
+        self._gram_tokens = arrays['gram_tokens']
+
+        self._category_codes = arrays['category_codes']
+        self._category_names = arrays['category_names'].tolist()
+        self._category_masks = {}
+
+    @classmethod
+    def build(cls, indications, keywords, categories):
+        """Dựng chỉ mục. indications: chi_dinh đã lowercase (None nếu thiếu), categories: loại thuốc theo vị trí"""
+        valid = [(pos, text) for pos, text in enumerate(indications) if text is not None]
+        keywords = list(dict.fromkeys(keywords))
+
+        # Một lượt quét mỗi chi_dinh cho mọi từ khóa (id từ khóa = vị trí trong keywords)
+        matcher = AhoCorasick(keywords)
+        keyword_groups = [[] for _ in keywords]
+        for pos, text in valid:
+            for keyword_id in matcher.find_ids(text):
+                keyword_groups[keyword_id].append(pos)
+        keyword_offsets, keyword_positions = _csr(keyword_groups)
+
+        token_ids = {}
+        postings = []
+        for pos, text in valid:
+            for token in set(text.split()):
+                token_id = token_ids.get(token)
+                if token_id is None:
+                    token_id = token_ids[token] = len(postings)
+                    postings.append([])
+                postings[token_id].append(pos)
+        vocabulary = list(token_ids)
+        token_offsets, token_positions = _csr(postings)
+
+        trigrams = {}
+        for token_id, token in enumerate(vocabulary):
+            for gram in {token[i:i + 3] for i in range(len(token) - 2)}:
+                trigrams.setdefault(gram, []).append(token_id)
+        grams = sorted(trigrams)
+        gram_offsets, gram_tokens = _csr([trigrams[gram] for gram in grams])
+
+        codes, names = pd.factorize(pd.Series([str(c).lower() for c in categories], dtype=object))
+        vocab_offsets, vocab_blob = StringColumn.encode(vocabulary)
+
+        arrays = {
+            'size': np.array([len(indications)], dtype=np.int64),
+            'keywords': np.array(keywords, dtype=str),
+            'keyword_offsets': keyword_offsets,
+            'keyword_positions': keyword_positions,
+            'vocab_offsets': vocab_offsets,
+            'vocab_blob': vocab_blob,
+            'token_offsets': token_offsets,
+            'token_positions': token_positions,
+            'grams': np.array(grams, dtype='<U3'),
+            'gram_offsets': gram_offsets,
+            'gram_tokens': gram_tokens,
+            'category_codes': codes.astype(np.int32),
+            'category_names': np.array(list(names), dtype=str),
+        }
+        return cls(arrays, vocabulary)
+
+    def category_mask(self, predicted_class):
+        """Mặt nạ bool theo vị trí: loại thuốc chứa lớp ML dự đoán (None nếu không loại nào khớp)"""
+        predicted = predicted_class.lower()
+        if predicted not in self._category_masks:
+            bonus_codes = [code for code, name in enumerate(self._category_names) if predicted in name]
+            self._category_masks[predicted] = np.isin(self._category_codes, bonus_codes) if bonus_codes else None
+        return self._category_masks[predicted]
+
+    def keyword_postings(self, keyword):
+        """Vị trí các thuốc có chi_dinh chứa từ khóa (từ khóa thuộc symptom_mapping)"""
+        return self._keyword_postings[keyword]
+
+    def _token_posting(self, token_id):
+        return self._token_positions[self._token_offsets[token_id]:self._token_offsets[token_id + 1]]
+
+    def _gram_posting(self, gram):
+        i = int(np.searchsorted(self._grams, gram))
+        if i >= len(self._grams) or self._grams[i] != gram:
+            return None
+        return self._gram_tokens[self._gram_offsets[i]:self._gram_offsets[i + 1]]
+
+    def fragment_postings(self, fragment):
+        """Vị trí các thuốc có chi_dinh chứa `fragment` (tương đương `fragment in indication`).
+
+        `fragment` không chứa khoảng trắng nên chỉ có thể khớp bên trong một token.
+        """
+        if len(fragment) < 3:
+            # Không dùng được trigram, quét từ vựng (không phải toàn bộ dữ liệu)
+            token_ids = [i for i, token in enumerate(self._vocabulary) if fragment in token]
+        else:
+            candidates = None
+            for gram in {fragment[i:i + 3] for i in range(len(fragment) - 2)}:
+                ids = self._gram_posting(gram)
+                if ids is None:
+                    return np.empty(0, dtype=np.int32)
+                candidates = ids if candidates is None else np.intersect1d(candidates, ids, assume_unique=True)
+            token_ids = [i for i in candidates.tolist() if fragment in self._vocabulary[i]]
+
+        if not token_ids:
+            return np.empty(0, dtype=np.int32)
+        if len(token_ids) == 1:
+            return self._token_posting(token_ids[0])
+        return np.unique(np.concatenate([self._token_posting(i) for i in token_ids]))
+
+    def score(self, keywords, fragments, predicted_class=None):
+        """Tính điểm cho các thuốc ứng viên.
+
+        Trả về (positions, scores, keyword_scores) với positions tăng dần:
+        +1 cho mỗi từ khóa khớp, +2 nếu có từ khóa khớp và loại thuốc chứa lớp ML
+        dự đoán, +0.5 cho mỗi mảnh từ (>= 3 ký tự) của truy vấn xuất hiện.
+        """
+        keyword_posts = [self.keyword_postings(k) for k in keywords]
+        fragment_posts = [self.fragment_postings(w) for w in fragments if len(w) >= 3]
+
+        non_empty = [p for p in keyword_posts + fragment_posts if len(p)]
+        if not non_empty:
+            empty = np.empty(0, dtype=np.int32)
+            return empty, np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64)
+
+        positions = np.unique(np.concatenate(non_empty))
+        keyword_scores = np.zeros(len(positions), dtype=np.float64)
+        for posting in keyword_posts:
+            if len(posting):
+                keyword_scores[np.searchsorted(positions, posting)] += 1
+
+        scores = keyword_scores.copy()
+        if predicted_class:
+            predicted = predicted_class.lower()
+            bonus_codes = [code for code, name in enumerate(self._category_names) if predicted in name]
+            if bonus_codes:
+                bonus = (keyword_scores > 0) & np.isin(self._category_codes[positions], bonus_codes)
+                scores[bonus] += 2
+
+        for posting in fragment_posts:
+            if len(posting):
+                scores[np.searchsorted(positions, posting)] += 0.5
+
+        return positions, scores, keyword_scores
+
+
+class LiveDrugSegment:
+    """Các thuốc quản trị viên thêm sau khi build bundle, tìm kiếm song song với SymptomIndex.
+
+    Mỗi lần thêm/xóa thay bằng một dict mới (copy-on-write) nên luồng tìm kiếm
+    đọc không cần khóa. Số thuốc loại này nhỏ nên chấm điểm bằng quét tuyến
+    tính, cùng công thức với SymptomIndex.score.
+    """
+
+    def __init__(self):
+        self._drugs = {}
+
+    @staticmethod
+    def position(drug_id):
+        return LIVE_DRUG_OFFSET + int(drug_id)
+
+    def __len__(self):
+        return len(self._drugs)
+
+    def __contains__(self, pos):
+        return pos in self._drugs
+
+    def drug_ids(self):
+        return [pos - LIVE_DRUG_OFFSET for pos in self._drugs]
+
+    def upsert(self, drug_id, features):
+        pos = self.position(drug_id)
+        # Chi tiết JSON tính một lần khi thêm/sửa, /drug/<id> trả thẳng bytes này
+        features = dict(features, detail=encode_detail(drug_record(pos, features)))
+        drugs = dict(self._drugs)
+        drugs[pos] = features
+        self._drugs = dict(sorted(drugs.items()))
+        return pos
+
+    def remove(self, drug_id):
+        pos = self.position(drug_id)
+        if pos not in self._drugs:
+            return False
+        drugs = dict(self._drugs)
+        del drugs[pos]
+        self._drugs = drugs
+        return True
+
+    def features(self, pos):
+        return self._drugs.get(pos)
+
+    def record(self, pos, fields=None):
+        features = self._drugs.get(pos)
+        return drug_record(pos, features, fields) if features is not None else None
+
+    def detail(self, pos):
+        features = self._drugs.get(pos)
+        return features['detail'] if features is not None else None
+
+    def score(self, keywords, fragments, predicted_class=None):
+        """Như SymptomIndex.score, trên các thuốc thêm trực tiếp (positions tăng dần)"""
+        predicted = predicted_class.lower() if predicted_class else None
+        fragments = [w for w in fragments if len(w) >= 3]
+        positions, scores, keyword_scores = [], [], []
+        for pos, features in self._drugs.items():
+            indication = features['indication_lower']
+            if indication is None:
+                continue
+            keyword_score = float(sum(1 for keyword in keywords if keyword in indication))
+            fragment_score = 0.5 * sum(1 for fragment in fragments if fragment in indication)
+            if not keyword_score and not fragment_score:
+                continue
+            score = keyword_score
+            if predicted and keyword_score > 0 and predicted in str(features['drug_class']).lower():
+                score += 2
+            positions.append(pos)
+            scores.append(score + fragment_score)
+            keyword_scores.append(keyword_score)
+        return (np.array(positions, dtype=np.int64), np.array(scores, dtype=np.float64),
+                np.array(keyword_scores, dtype=np.float64))
+
+    def score_similarity(self, vector_index, vector, predicted_class=None):
+        """Như TfidfIndex/SemanticIndex.score, trên các thuốc thêm trực tiếp (vector hóa văn bản lúc truy vấn)"""
+        drugs = list(self._drugs.items())
+        if not drugs:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        cosine = vector_index.similarity_texts(
+            vector, [document_text(features, vector_index.columns) for _, features in drugs]
+        )
+        predicted = predicted_class.lower() if predicted_class else None
+        bonus = np.array([
+            predicted is not None and predicted in str(features['drug_class']).lower() for _, features in drugs
+        ], dtype=bool)
+        matched = cosine > 0
+        positions = np.array([pos for pos, _ in drugs], dtype=np.int64)[matched]
+        return positions, (TFIDF_SCORE_SCALE * cosine + TFIDF_CATEGORY_BONUS * bonus)[matched]
+
+
+def top_k(positions, scores, k):
+    """Chọn k thuốc điểm cao nhất bằng partial selection.
+
+    Thứ tự giống sort ổn định theo điểm giảm dần: cùng điểm thì vị trí nhỏ đứng trước.
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return positions[:0], scores[:0]
+    if k >= n:
+        order = np.argsort(-scores, kind='stable')
+    else:
+        threshold = np.partition(scores, n - k)[n - k]
+        # Giữ mọi thuốc bằng ngưỡng để cắt đúng theo thứ tự vị trí
+        selected = np.flatnonzero(scores >= threshold)
+        order = selected[np.argsort(-scores[selected], kind='stable')][:k]
+    return positions[order], scores[order]
@@ -0,0 +1,232 @@
+"""Chế độ tìm kiếm mode=semantic: vector dày lượng tử hóa int8 + chỉ mục IVF (tìm gần đúng).
+
+Khi build bundle:
+
+- SVD rút gọn (randomized SVD, chỉ NumPy) của ma trận TF-IDF các thuốc
+  (TfidfIndex) cho `components` (từ x chiều): vector của thuốc/truy vấn là
+  TF-IDF nhân components, chuẩn hóa L2 (LSA), nên cosine bắt được cả các từ
+  hay đi cùng nhau chứ không chỉ từ trùng;
+- vector thuốc lượng tử hóa int8 (một hệ số scale float32 mỗi thuốc);
+- k-means cầu chia thuốc vào n_lists cụm (IVF), mã int8 được xếp liền theo cụm.
+
+Khi tìm: so truy vấn với các tâm cụm, chỉ quét `nprobe` cụm gần nhất (các khối
+liền nhau trong mảng memory-map) rồi lấy SEMANTIC_CANDIDATES thuốc cosine cao
+nhất. nprobe lớn hơn thì recall cao hơn nhưng chậm hơn; đổi bằng biến môi
+trường DRUG_ENGINE_NPROBE, đo recall@k với tìm chính xác bằng
+benchmarks/bench_semantic.py.
+"""
+import os
+
+import numpy as np
+
+from tfidf_index import TFIDF_CATEGORY_BONUS, TFIDF_SCORE_SCALE
+
+SEMANTIC_FORMAT = 1
+SEMANTIC_DIMENSIONS = 128
+SEMANTIC_NPROBE = 8
+SEMANTIC_CANDIDATES = 500  # số thuốc gần nhất giữ lại mỗi truy vấn
+NPROBE_ENV = 'DRUG_ENGINE_NPROBE'
+
+_OVERSAMPLING = 10
+_POWER_ITERATIONS = 2
+_KMEANS_ITERATIONS = 10
+_KMEANS_SAMPLE_PER_LIST = 64
+_CHUNK_BYTES = 64 << 20
+
+
+def default_lists(size):
+    """Số cụm IVF mặc định: ~sqrt(số thuốc)"""
+    return max(1, int(round(np.sqrt(size))))
+
+
+def _sparse_dot(indptr, indices, data, dense):
+    """Ma trận thưa CSR (indptr, indices, data) nhân dense, theo khối phần tử để giới hạn bộ nhớ tạm"""
+    n_rows = len(indptr) - 1
+    out = np.zeros((n_rows, dense.shape[1]), dtype=np.float32)
+    rows = np.repeat(np.arange(n_rows), np.diff(indptr))
+    dense = np.asarray(dense, dtype=np.float32)
+    chunk = max(1, _CHUNK_BYTES // (4 * dense.shape[1]))
+    for lo in range(0, len(rows), chunk):
+        hi = min(lo + chunk, len(rows))
+        products = dense[indices[lo:hi]] * np.asarray(data[lo:hi], dtype=np.float32)[:, None]
+        # Phần tử đã xếp theo hàng: cộng dồn từng đoạn cùng hàng (một hàng có thể vắt qua hai khối)
+        chunk_rows = rows[lo:hi]
+        starts = np.flatnonzero(np.r_[True, chunk_rows[1:] != chunk_rows[:-1]])
+        out[chunk_rows[starts]] += np.add.reduceat(products, starts)
+    return out
+
+
+def _orthonormalize(matrix):
+    """Cơ sở trực chuẩn cho các cột của ma trận cao-hẹp: CholeskyQR2 (chỉ nhân ma trận), lỗi số thì dùng QR"""
+    try:
+        for _ in range(2):
+            factor = np.linalg.cholesky(np.asarray(matrix.T @ matrix, dtype=np.float64))
+            matrix = matrix @ np.linalg.inv(factor).T.astype(matrix.dtype)
+        return matrix
+    except np.linalg.LinAlgError:
+        return np.linalg.qr(matrix)[0]
+
+
+def _normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _document_matrix(tfidf_index):
+    """Ma trận TF-IDF theo thuốc (CSR) từ bản lưu theo từ của TfidfIndex"""
+    term_offsets = np.asarray(tfidf_index.arrays['term_offsets'])
+    positions = np.asarray(tfidf_index.arrays['positions'])
+    terms = np.repeat(np.arange(len(term_offsets) - 1), np.diff(term_offsets))
+    order = np.argsort(positions, kind='stable')
+    indptr = np.zeros(tfidf_index.size + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(positions, minlength=tfidf_index.size))
+    return indptr, terms[order], np.asarray(tfidf_index.arrays['weights'])[order]
+
+
+def truncated_svd(tfidf_index, dimensions=SEMANTIC_DIMENSIONS, seed=0):
+    """components (từ x chiều) của SVD rút gọn ma trận TF-IDF (randomized SVD, Halko và cộng sự)"""
+    documents = _document_matrix(tfidf_index)
+    terms = (tfidf_index.arrays['term_offsets'], tfidf_index.arrays['positions'], tfidf_index.arrays['weights'])
+    n_terms = len(terms[0]) - 1
+    dimensions = max(1, min(dimensions, tfidf_index.size - 1, n_terms - 1))
+    rng = np.random.default_rng(seed)
+
+    basis = _orthonormalize(_sparse_dot(*documents, rng.standard_normal((n_terms, dimensions + _OVERSAMPLING))))
+    for _ in range(_POWER_ITERATIONS):
+        basis = _orthonormalize(_sparse_dot(*terms, basis))
+        basis = _orthonormalize(_sparse_dot(*documents, basis))
+    # B = basis.T @ D nhỏ (chiều x từ); vector phải của B là của D
+    _, _, vt = np.linalg.svd(_sparse_dot(*terms, basis).T, full_matrices=False)
+    return np.ascontiguousarray(vt[:dimensions].T, dtype=np.float32)
+
+
+def project_documents(tfidf_index, components):
+    """Vector float (đã chuẩn hóa L2) của mọi thuốc trong không gian SVD"""
+    return _normalize_rows(_sparse_dot(*_document_matrix(tfidf_index), components)).astype(np.float32)
+
+
+def quantize(vectors):
+    """int8 đối xứng, một scale mỗi vector: vector ~ codes * scale"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _nearest(vectors, centroids):
+    chunk = max(1, _CHUNK_BYTES // (4 * len(centroids)))
+    return np.concatenate([
+        np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), chunk)
+    ]) if len(vectors) else np.empty(0, dtype=np.int64)
+
+
+def spherical_kmeans(vectors, n_lists, seed=0):
+    """Tâm cụm (đã chuẩn hóa) của k-means trên cosine, huấn luyện trên mẫu ~64 vector mỗi cụm"""
+    rng = np.random.default_rng(seed)
+    sample = vectors[np.linalg.norm(vectors, axis=1) > 0]
+    if len(sample) > n_lists * _KMEANS_SAMPLE_PER_LIST:
+        sample = sample[rng.choice(len(sample), n_lists * _KMEANS_SAMPLE_PER_LIST, replace=False)]
+    n_lists = max(1, min(n_lists, len(sample)))
+    if not len(sample):
+        return np.zeros((1, vectors.shape[1]), dtype=np.float32)
+
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+    for _ in range(_KMEANS_ITERATIONS):
+        assignment = _nearest(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        # Cụm rỗng giữ tâm cũ
+        filled = np.bincount(assignment, minlength=n_lists) > 0
+        centroids[filled] = _normalize_rows(sums[filled])
+    return centroids.astype(np.float32)
+
+
+class SemanticIndex:
+    """Chỉ mục IVF trên vector int8 của các thuốc, gắn với TfidfIndex để vector hóa truy vấn"""
+
+    def __init__(self, arrays, tfidf_index, nprobe=None):
+        self.arrays = arrays
+        self.tfidf_index = tfidf_index
+        self.columns = tfidf_index.columns
+        self.size = int(arrays['size'][0])
+        self._components = arrays['components']
+        self._centroids = np.asarray(arrays['centroids'], dtype=np.float32)
+        self._list_offsets = np.asarray(arrays['list_offsets'])
+        self._positions = arrays['positions']
+        self._codes = arrays['codes']
+        self._scales = arrays['scales']
+        if len(self._components) != tfidf_index.scorer.n_text_features:
+            raise ValueError("components không khớp từ vựng của scorer")
+        self.n_lists = len(self._centroids)
+        self.dimensions = self._components.shape[1]
+        self.nprobe = int(os.environ.get(NPROBE_ENV, SEMANTIC_NPROBE)) if nprobe is None else nprobe
+
+    @classmethod
+    def build(cls, tfidf_index, dimensions=SEMANTIC_DIMENSIONS, n_lists=None, seed=0):
+        """Dựng từ TfidfIndex: SVD -> vector thuốc -> k-means -> mã int8 xếp theo cụm"""
+        components = truncated_svd(tfidf_index, dimensions, seed)
+        vectors = project_documents(tfidf_index, components)
+        centroids = spherical_kmeans(vectors, n_lists or default_lists(len(vectors)), seed)
+        assignment = _nearest(vectors, centroids)
+
+        order = np.argsort(assignment, kind='stable')
+        list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=len(centroids)))
+        codes, scales = quantize(vectors[order])
+        arrays = {
+            'size': np.array([tfidf_index.size], dtype=np.int64),
+            'components': components,
+            'centroids': centroids,
+            'list_offsets': list_offsets,
+            'positions': order.astype(np.int32),
+            'codes': codes,
+            'scales': scales,
+        }
+        return cls(arrays, tfidf_index)
+
+    def vectorize(self, text):
+        """Vector truy vấn float32 (chuẩn hóa L2; toàn 0 nếu không có từ nào trong từ vựng)"""
+        indices, data = self.tfidf_index.vectorize(text)
+        vector = np.asarray(data, dtype=np.float32) @ self._components[indices]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def search(self, vector, k=SEMANTIC_CANDIDATES, nprobe=None):
+        """k thuốc cosine cao nhất trong nprobe cụm gần truy vấn nhất: (positions tăng dần, cosine)"""
+        nprobe = min(self.nprobe if nprobe is None else nprobe, self.n_lists)
+        if not vector.any() or nprobe <= 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+        centroid_scores = self._centroids @ vector
+        lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe] if nprobe < self.n_lists else range(self.n_lists)
+        blocks = [(int(self._list_offsets[i]), int(self._list_offsets[i + 1])) for i in lists]
+        blocks = [(start, end) for start, end in blocks if end > start]
+        if not blocks:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+        codes = np.concatenate([self._codes[start:end] for start, end in blocks])
+        scales = np.concatenate([self._scales[start:end] for start, end in blocks])
+        positions = np.concatenate([self._positions[start:end] for start, end in blocks])
+        cosine = (codes.astype(np.float32) @ vector) * scales
+
+        keep = np.flatnonzero(cosine > 0)
+        if len(keep) > k:
+            keep = keep[np.argpartition(-cosine[keep], k - 1)[:k]]
+        order = keep[np.argsort(positions[keep], kind='stable')]
+        return positions[order], cosine[order].astype(np.float64)
+
+    def similarity_texts(self, vector, texts):
+        """Cosine (float, không lượng tử hóa) của truy vấn với các văn bản chưa có trong chỉ mục"""
+        indptr, indices, data = self.tfidf_index.scorer.transform(texts)
+        documents = _normalize_rows(_sparse_dot(indptr, indices, data, self._components))
+        return documents @ vector
+
+    def score(self, vector, category_mask=None, nprobe=None):
+        """(positions, scores) cùng thang điểm với TfidfIndex.score"""
+        positions, cosine = self.search(vector, nprobe=nprobe)
+        scores = TFIDF_SCORE_SCALE * cosine
+        if category_mask is not None:
+            scores += TFIDF_CATEGORY_BONUS * category_mask[positions]
+        return positions, scores
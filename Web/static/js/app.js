@@ -7,6 +7,8 @@ const error = document.getElementById('error');
 
 // Global variable để lưu symptoms hiện tại
 let currentSymptoms = '';
+// Cursor để tải trang kết quả tiếp theo
+let nextCursor = null;
 
 // Initialize app
 document.addEventListener('DOMContentLoaded', function() {
@@ -61,7 +63,8 @@ async function search() {
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ symptoms: symptoms })
+            // Danh sách chỉ cần bản tóm tắt, chi tiết tải khi mở rộng thẻ
+            body: JSON.stringify({ symptoms: symptoms, view: 'summary' })
         });
 
         const data = await response.json();
@@ -82,13 +85,17 @@ async function search() {
 // Display search results in collapsed mode
 function displayResults(data) {
     const drugs = data.results.drugs;
+    nextCursor = data.results.next_cursor || null;
     const detectedSymptoms = data.results.detected_symptoms;
     
     let resultsHtml = `
         <div class="results-header">
             <h3><i class="fas fa-chart-line"></i> Kết quả phân tích: "${data.symptoms}"</h3>
-            <p><i class="fas fa-pills"></i> Tìm thấy ${drugs.length} thuốc phù hợp | 
+            <p><i class="fas fa-pills"></i> Tìm thấy ${data.results.total_found} thuốc phù hợp | 
                <i class="fas fa-clock"></i> ${data.timestamp}</p>
+            ${data.results.corrected_query ? `
+                <p class="corrected-query"><i class="fas fa-spell-check"></i> Đã tìm với: "${data.results.corrected_query}"</p>
+            ` : ''}
         </div>
     `;
 
@@ -109,84 +116,8 @@ function displayResults(data) {
         resultsHtml += '<p>Không tìm thấy thuốc phù hợp. Thử với triệu chứng khác hoặc liên hệ chuyên khoa.</p>';
     } else {
         // Hiển thị thuốc ở chế độ thu gọn với nút lưu
-        resultsHtml += drugs.map((drug, index) => `
-            <div class="drug-card collapsed" id="drug-${index}">
-                <!-- Header thuốc - luôn hiển thị -->
-                <div class="drug-header">
-                    <div class="drug-summary">
-                        <div class="drug-name">${index + 1}. ${drug.name}</div>
-                        <div class="drug-meta">
-                            <span class="drug-class">${drug.drug_class}</span>
-                            ${drug.prescription_required ? '<span class="prescription-required"><i class="fas fa-prescription"></i> Cần đơn thuốc</span>' : ''}
-                            <span class="drug-price"><i class="fas fa-tag"></i> ${drug.price}</span>
-                            <span class="confidence-badge confidence-${drug.confidence_level ? drug.confidence_level.toLowerCase() : 'low'}">
-                                ${drug.confidence_level || 'Thấp'}
-                            </span>
-                        </div>
-                        <div class="quick-info">
-                            <span class="matched-symptoms">
-                                <i class="fas fa-check-circle"></i> Phù hợp: ${(drug.matched_symptoms || []).join(', ') || 'Không có'}
-                            </span>
-                            <span class="score-info">Score: ${drug.score || 0}</span>
-                        </div>
-                    </div>
-                    
-                    <!-- Nút mở rộng/thu gọn và các actions -->
-                    <div class="expand-controls">
-                        <button class="btn btn-expand" onclick="toggleDrugDetails(${index})">
-                            <i class="fas fa-chevron-down" id="expand-icon-${index}"></i>
-                            <span id="expand-text-${index}">Xem chi tiết</span>
-                        </button>
-                        <button class="btn btn-detail" onclick="showDrugDetail(${drug.index}, '${drug.name.replace(/'/g, "\\'")}')">
-                            <i class="fas fa-info-circle"></i> Chi tiết đầy đủ
-                        </button>
-                        <button class="btn btn-save" id="save-btn-${drug.index}" onclick="saveDrugToList(${drug.index}, '${drug.name.replace(/'/g, "\\'")}', '${drug.drug_class}', '${currentSymptoms.replace(/'/g, "\\'")}', ${drug.score || 0})">
-                            <i class="fas fa-bookmark"></i> Lưu
-                        </button>
-                    </div>
-                </div>
-                
-                <!-- Nội dung chi tiết - ẩn ban đầu -->
-                <div class="drug-details-content" id="details-${index}" style="display: none;">
-                    <div class="drug-details">
-                        <div class="detail-section indications">
-                            <h4><i class="fas fa-info-circle"></i> Chỉ định & Công dụng</h4>
-                            <ul class="detail-list">
-                                ${formatListItems(drug.indication_list ? drug.indication_list.slice(0, 3) : ['Không có thông tin'])}
-                                ${drug.indication_list && drug.indication_list.length > 3 ? '<li class="more-info">... và nhiều công dụng khác</li>' : ''}
-                            </ul>
-                        </div>
-                        <div class="detail-section ingredients">
-                            <h4><i class="fas fa-flask"></i> Thành phần chính</h4>
-                            <ul class="detail-list">
-                                ${formatListItems(drug.ingredients_list ? drug.ingredients_list.slice(0, 2) : ['Không có thông tin'])}
-                                ${drug.ingredients_list && drug.ingredients_list.length > 2 ? '<li class="more-info">... và các thành phần khác</li>' : ''}
-                            </ul>
-                        </div>
-                        <div class="detail-section dosage">
-                            <h4><i class="fas fa-pills"></i> Liều dùng</h4>
-                            <ul class="detail-list">
-                                ${formatListItems(drug.dosage_list ? drug.dosage_list.slice(0, 2) : ['Theo chỉ định của bác sĩ'])}
-                                ${drug.dosage_list && drug.dosage_list.length > 2 ? '<li class="more-info">Xem chi tiết đầy đủ để biết thêm</li>' : ''}
-                            </ul>
-                        </div>
-                        <div class="detail-section contraindications">
-                            <h4><i class="fas fa-exclamation-triangle"></i> Chống chỉ định</h4>
-                            <ul class="detail-list">
-                                ${formatListItems(drug.contraindication_list ? drug.contraindication_list.slice(0, 2) : ['Không có thông tin'])}
-                                ${drug.contraindication_list && drug.contraindication_list.length > 2 ? '<li class="more-info">... và các chống chỉ định khác</li>' : ''}
-                            </ul>
-                        </div>
-                    </div>
-                    
-                    <div class="drug-footer">
-                        <div class="manufacturer-info">
-                            <i class="fas fa-building"></i> <strong>Nhà sản xuất:</strong> ${drug.manufacturer || 'Xem trên bao bì'}
-                        </div>
-                    </div>
-                </div>
-            </div>
-        `).join('');
+        resultsHtml += `<div id="drugList">${drugs.map((drug, index) => renderDrugCard(drug, index)).join('')}</div>`;
+        resultsHtml += renderLoadMore(data.results);
         
         resultsHtml += `
             <div class="clinical-notes">
@@ -217,6 +148,205 @@ function displayResults(data) {
     checkSavedStatus(drugs);
 }
 
+// Render một thẻ thuốc ở chế độ thu gọn
+function renderDrugCard(drug, index) {
+    return `
+        <div class="drug-card collapsed" id="drug-${index}" data-drug-index="${drug.index}">
+            <!-- Header thuốc - luôn hiển thị -->
+            <div class="drug-header">
+                <div class="drug-summary">
+                    <div class="drug-name">${index + 1}. ${drug.name}</div>
+                    <div class="drug-meta">
+                        <span class="drug-class">${drug.drug_class}</span>
+                        ${drug.prescription_required ? '<span class="prescription-required"><i class="fas fa-prescription"></i> Cần đơn thuốc</span>' : ''}
+                        <span class="drug-price"><i class="fas fa-tag"></i> ${drug.price}</span>
+                        <span class="confidence-badge confidence-${drug.confidence_level ? drug.confidence_level.toLowerCase() : 'low'}">
+                            ${drug.confidence_level || 'Thấp'}
+                        </span>
+                    </div>
+                    <div class="quick-info">
+                        <span class="matched-symptoms">
+                            <i class="fas fa-check-circle"></i> Phù hợp: ${(drug.matched_symptoms || []).join(', ') || 'Không có'}
+                        </span>
+                        <span class="score-info">Score: ${drug.score || 0}</span>
+                    </div>
+                </div>
+                
+                <!-- Nút mở rộng/thu gọn và các actions -->
+                <div class="expand-controls">
+                    <button class="btn btn-expand" onclick="toggleDrugDetails(${index})">
+                        <i class="fas fa-chevron-down" id="expand-icon-${index}"></i>
+                        <span id="expand-text-${index}">Xem chi tiết</span>
+                    </button>
+                    <button class="btn btn-detail" onclick="showDrugDetail(${drug.index}, '${drug.name.replace(/'/g, "\\'")}')">
+                        <i class="fas fa-info-circle"></i> Chi tiết đầy đủ
+                    </button>
+                    <button class="btn btn-save" id="save-btn-${drug.index}" onclick="saveDrugToList(${drug.index}, '${drug.name.replace(/'/g, "\\'")}', '${drug.drug_class}', '${currentSymptoms.replace(/'/g, "\\'")}', ${drug.score || 0})">
+                        <i class="fas fa-bookmark"></i> Lưu
+                    </button>
+                </div>
+            </div>
+            
+            <!-- Nội dung chi tiết - ẩn ban đầu, tải từ /drug/<index> khi mở rộng -->
+            <div class="drug-details-content" id="details-${index}" style="display: none;">
+                <div class="loading-detail">
+                    <i class="fas fa-spinner fa-spin"></i> Đang tải thông tin...
+                </div>
+            </div>
+        </div>
+    `;
+}
+
+// Nội dung chi tiết của một thẻ thuốc
+function renderDrugDetails(drug) {
+    return `
+                <div class="drug-details">
+                    <div class="detail-section indications">
+                        <h4><i class="fas fa-info-circle"></i> Chỉ định & Công dụng</h4>
+                        <ul class="detail-list">
+                            ${formatListItems(drug.indication_list ? drug.indication_list.slice(0, 3) : ['Không có thông tin'])}
+                            ${drug.indication_list && drug.indication_list.length > 3 ? '<li class="more-info">... và nhiều công dụng khác</li>' : ''}
+                        </ul>
+                    </div>
+                    <div class="detail-section ingredients">
+                        <h4><i class="fas fa-flask"></i> Thành phần chính</h4>
+                        <ul class="detail-list">
+                            ${formatListItems(drug.ingredients_list ? drug.ingredients_list.slice(0, 2) : ['Không có thông tin'])}
+                            ${drug.ingredients_list && drug.ingredients_list.length > 2 ? '<li class="more-info">... và các thành phần khác</li>' : ''}
+                        </ul>
+                    </div>
+                    <div class="detail-section dosage">
+                        <h4><i class="fas fa-pills"></i> Liều dùng</h4>
+                        <ul class="detail-list">
+                            ${formatListItems(drug.dosage_list ? drug.dosage_list.slice(0, 2) : ['Theo chỉ định của bác sĩ'])}
+                            ${drug.dosage_list && drug.dosage_list.length > 2 ? '<li class="more-info">Xem chi tiết đầy đủ để biết thêm</li>' : ''}
+                        </ul>
+                    </div>
+                    <div class="detail-section contraindications">
+                        <h4><i class="fas fa-exclamation-triangle"></i> Chống chỉ định</h4>
+                        <ul class="detail-list">
+                            ${formatListItems(drug.contraindication_list ? drug.contraindication_list.slice(0, 2) : ['Không có thông tin'])}
+                            ${drug.contraindication_list && drug.contraindication_list.length > 2 ? '<li class="more-info">... và các chống chỉ định khác</li>' : ''}
+                        </ul>
+                    </div>
+                </div>
+                
+                <div class="drug-footer">
+                    <div class="manufacturer-info">
+                        <i class="fas fa-building"></i> <strong>Nhà sản xuất:</strong> ${drug.manufacturer || 'Xem trên bao bì'}
+                    </div>
+                </div>
+    `;
+}
+
+// Tải chi tiết cho các thẻ chưa có (một thẻ: /drug/<index> có cache HTTP, nhiều thẻ: một request /drugs)
+async function loadDrugCardDetails(cardIndexes) {
+    const pending = cardIndexes
+        .map(index => document.getElementById(`drug-${index}`))
+        .filter(card => card && !card.dataset.detailsLoaded);
+    if (pending.length === 0) return;
+    pending.forEach(card => card.dataset.detailsLoaded = 'loading');
+    
+    try {
+        let drugs;
+        if (pending.length === 1) {
+            const response = await fetch(`/drug/${pending[0].dataset.drugIndex}`);
+            const drug = await response.json();
+            if (drug.error) throw new Error(drug.error);
+            drugs = [drug];
+        } else {
+            drugs = [];
+            // /drugs nhận tối đa 200 thuốc mỗi request
+            for (let start = 0; start < pending.length; start += 200) {
+                const response = await fetch('/drugs', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json'
+                    },
+                    body: JSON.stringify({
+                        indices: pending.slice(start, start + 200).map(card => Number(card.dataset.drugIndex))
+                    })
+                });
+                const data = await response.json();
+                if (data.error) throw new Error(data.error);
+                drugs.push(...data.drugs);
+            }
+        }
+        
+        const byIndex = new Map(drugs.map(drug => [String(drug.index), drug]));
+        pending.forEach(card => {
+            const drug = byIndex.get(card.dataset.drugIndex);
+            const detailsDiv = card.querySelector('.drug-details-content');
+            if (drug) {
+                detailsDiv.innerHTML = renderDrugDetails(drug);
+                card.dataset.detailsLoaded = 'true';
+            } else {
+                detailsDiv.innerHTML = '<div class="error"><i class="fas fa-exclamation-triangle"></i> Không tìm thấy thuốc</div>';
+                delete card.dataset.detailsLoaded;
+            }
+        });
+    } catch (err) {
+        pending.forEach(card => {
+            card.querySelector('.drug-details-content').innerHTML = `
+                <div class="error">
+                    <i class="fas fa-exclamation-triangle"></i> Lỗi tải thông tin: ${err.message}
+                </div>
+            `;
+            delete card.dataset.detailsLoaded;
+        });
+    }
+}
+
+// Nút tải thêm kết quả (phân trang bằng cursor)
+function renderLoadMore(searchResults) {
+    if (!searchResults.next_cursor) return '';
+    return `
+        <div class="load-more" id="loadMore">
+            <button class="btn btn-secondary" onclick="loadMoreResults()">
+                <i class="fas fa-angle-double-down"></i> Xem thêm (${searchResults.total_found - searchResults.next_offset} thuốc)
+            </button>
+        </div>
+    `;
+}
+
+async function loadMoreResults() {
+    if (!nextCursor) return;
+    
+    const loadMore = document.getElementById('loadMore');
+    const button = loadMore ? loadMore.querySelector('button') : null;
+    if (button) button.disabled = true;
+    
+    try {
+        const response = await fetch('/search', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ cursor: nextCursor, view: 'summary' })
+        });
+        
+        const data = await response.json();
+        
+        if (!data.success) {
+            showError(data.error || 'Có lỗi xảy ra');
+            if (button) button.disabled = false;
+            return;
+        }
+        
+        const drugs = data.results.drugs;
+        const drugList = document.getElementById('drugList');
+        drugList.insertAdjacentHTML('beforeend', drugs.map((drug, i) => renderDrugCard(drug, data.results.offset + i)).join(''));
+        
+        nextCursor = data.results.next_cursor;
+        if (loadMore) loadMore.outerHTML = renderLoadMore(data.results);
+        
+        checkSavedStatus(drugs);
+    } catch (err) {
+        showError('Lỗi kết nối. Vui lòng thử lại.');
+        if (button) button.disabled = false;
+    }
+}
+
 // Kiểm tra trạng thái lưu của thuốc
 async function checkSavedStatus(drugs) {
     if (!checkUserLoggedIn()) return;
@@ -303,6 +433,7 @@ function toggleDrugDetails(index) {
     
     if (detailsDiv.style.display === 'none') {
         // Mở rộng
+        loadDrugCardDetails([index]);
         detailsDiv.style.display = 'block';
         expandIcon.className = 'fas fa-chevron-up';
         expandText.textContent = 'Thu gọn';
@@ -321,6 +452,7 @@ function toggleDrugDetails(index) {
 // Expand all drugs
 function expandAllDrugs() {
     const drugCards = document.querySelectorAll('.drug-card');
+    loadDrugCardDetails([...drugCards.keys()]);
     drugCards.forEach((card, index) => {
         const detailsDiv = document.getElementById(`details-${index}`);
         const expandIcon = document.getElementById(`expand-icon-${index}`);
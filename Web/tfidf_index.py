@@ -0,0 +1,117 @@
+"""Chế độ tìm kiếm mode=tfidf: xếp hạng theo cosine TF-IDF thay cho đếm từ khóa.
+
+Văn bản của mỗi thuốc (mặc định chi_dinh, có thể thêm tên/thành phần) được
+biến đổi bằng đúng TF-IDF của compiled scorer rồi chuẩn hóa L2 một lần khi
+build bundle. Ma trận lưu theo từ (CSC: từ -> danh sách (vị trí thuốc, trọng
+số)), nên tích ma trận-vector với truy vấn chỉ đọc các cột của những từ có
+trong truy vấn; chi phí phụ thuộc số thuốc chứa các từ đó, không phải kích
+thước dữ liệu. Điểm = TFIDF_SCORE_SCALE * cosine, cộng TFIDF_CATEGORY_BONUS
+cho thuốc thuộc lớp ML dự đoán (vector mặt nạ theo loại thuốc).
+"""
+import numpy as np
+
+from feature_store import NO_INFO
+
+TFIDF_FORMAT = 1
+# Cột của DrugFeatureStore ghép thành văn bản mỗi thuốc ('main_name', 'ingredients' để tìm cả theo tên/thành phần)
+TFIDF_COLUMNS = ('indication',)
+TFIDF_COLUMN_CHOICES = ('indication', 'main_name', 'ingredients')
+# Cosine nằm trong [0, 1]; nhân lên để cùng thang với điểm từ khóa (ngưỡng độ tin cậy 1.5 / 3)
+TFIDF_SCORE_SCALE = 5.0
+TFIDF_CATEGORY_BONUS = 2.0
+
+
+def document_text(features, columns=TFIDF_COLUMNS):
+    """Văn bản TF-IDF của một thuốc từ các cột đặc trưng (bỏ giá trị 'Không có thông tin')"""
+    values = (features.get(column) for column in columns)
+    return '. '.join(value for value in values if value and value != NO_INFO)
+
+
+def _l2_normalize(indptr, data):
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    norms = np.sqrt(np.bincount(rows, weights=data * data, minlength=len(indptr) - 1))
+    norms[norms == 0] = 1.0
+    return data / norms[rows]
+
+
+class TfidfIndex:
+    """Ma trận TF-IDF (đã chuẩn hóa L2) của các thuốc, gắn với compiled scorer đã dựng nó"""
+
+    def __init__(self, arrays, scorer, columns=TFIDF_COLUMNS):
+        self.arrays = arrays
+        self.scorer = scorer
+        self.columns = tuple(columns)
+        self.size = int(arrays['size'][0])
+        self._term_offsets = arrays['term_offsets']
+        self._positions = arrays['positions']
+        self._weights = arrays['weights']
+        if len(self._term_offsets) != scorer.n_text_features + 1:
+            raise ValueError("Ma trận TF-IDF không khớp từ vựng của scorer")
+
+    @classmethod
+    def build(cls, scorer, store, columns=TFIDF_COLUMNS, chunk_size=1000):
+        """Dựng từ DrugFeatureStore: transform từng khối thuốc rồi sắp lại theo từ"""
+        unknown = set(columns) - set(TFIDF_COLUMN_CHOICES)
+        if unknown:
+            raise ValueError(f"Cột TF-IDF không hỗ trợ: {', '.join(sorted(unknown))}")
+
+        rows, cols, weights = [], [], []
+        for start in range(0, len(store), chunk_size):
+            positions = range(start, min(start + chunk_size, len(store)))
+            values = {column: store.take(column, positions) for column in columns}
+            texts = [document_text({c: values[c][i] for c in columns}, columns) for i in range(len(positions))]
+            indptr, indices, data = scorer.transform(texts)
+            rows.append(np.repeat(np.arange(start, start + len(texts)), np.diff(indptr)))
+            cols.append(indices)
+            weights.append(_l2_normalize(indptr, data))
+
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+        weights = np.concatenate(weights) if weights else np.empty(0, dtype=np.float64)
+        # Theo từ, trong mỗi từ vị trí tăng dần
+        order = np.lexsort((rows, cols))
+        term_offsets = np.zeros(scorer.n_text_features + 1, dtype=np.int64)
+        term_offsets[1:] = np.cumsum(np.bincount(cols, minlength=scorer.n_text_features))
+        arrays = {
+            'size': np.array([len(store)], dtype=np.int64),
+            'term_offsets': term_offsets,
+            'positions': rows[order].astype(np.int32),
+            'weights': weights[order].astype(np.float32),
+        }
+        return cls(arrays, scorer, columns)
+
+    def vectorize(self, text):
+        """Vector truy vấn thưa (chỉ số từ, trọng số đã chuẩn hóa L2)"""
+        indptr, indices, data = self.scorer.transform([text])
+        return indices, _l2_normalize(indptr, data)
+
+    def similarity(self, vector):
+        """Cosine với mọi thuốc có chung ít nhất một từ: (positions tăng dần, cosine)"""
+        indices, data = vector
+        starts, ends = self._term_offsets[indices], self._term_offsets[indices + 1]
+        nonempty = [(s, e, w) for s, e, w in zip(starts.tolist(), ends.tolist(), data.tolist()) if e > s]
+        if not nonempty:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+        candidates = np.concatenate([self._positions[s:e] for s, e, _ in nonempty])
+        contributions = np.concatenate([self._weights[s:e] * w for s, e, w in nonempty])
+        positions, inverse = np.unique(candidates, return_inverse=True)
+        return positions, np.bincount(inverse, weights=contributions, minlength=len(positions))
+
+    def similarity_texts(self, vector, texts):
+        """Cosine của truy vấn với các văn bản chưa có trong ma trận (thuốc thêm trực tiếp)"""
+        indices, data = vector
+        query = dict(zip(indices.tolist(), data.tolist()))
+        indptr, doc_indices, doc_data = self.scorer.transform(texts)
+        doc_data = _l2_normalize(indptr, doc_data)
+        products = np.array([query.get(i, 0.0) for i in doc_indices.tolist()], dtype=np.float64) * doc_data
+        rows = np.repeat(np.arange(len(texts)), np.diff(indptr))
+        return np.bincount(rows, weights=products, minlength=len(texts))
+
+    def score(self, vector, category_mask=None):
+        """(positions, scores): cosine đã nhân thang điểm, cộng điểm thưởng theo mặt nạ loại thuốc"""
+        positions, cosine = self.similarity(vector)
+        scores = TFIDF_SCORE_SCALE * cosine
+        if category_mask is not None:
+            scores += TFIDF_CATEGORY_BONUS * category_mask[positions]
+        return positions, scores
@@ -1,89 +1,119 @@
-def classify_drug_type(drug_name):
-    drug_name = str(drug_name).lower()
-    
-    if any(word in drug_name for word in [
+from matcher import AhoCorasick
+
+# Loại thuốc -> từ khóa tìm trong tên thuốc, theo thứ tự ưu tiên: tên khớp nhiều
+# loại thì lấy loại đứng trước (như chuỗi if/elif trước đây)
+DRUG_TYPE_KEYWORDS = [
+    ('kháng sinh', [
         'kháng sinh', 'antibiotic', 'cillin', 'mycin', 'floxacin', 'cephalos','amoxicillin', 'azithromycin', 'clarithromycin', 'penicillin',
         'cephalexin', 'ciprofloxacin', 'erythromycin', 'tetracycline','metronidazole', 'sulfamethoxazole', 'trimethoprim', 'doxycycline',
-        'ampicillin', 'gentamicin', 'streptomycin', 'nhiễm trùng', 'kháng khuẩn']):
-        return 'kháng sinh'
-    
-    elif any(word in drug_name for word in [
+        'ampicillin', 'gentamicin', 'streptomycin', 'nhiễm trùng', 'kháng khuẩn',
+    ]),
+    ('giảm đau hạ sốt', [
         'paracetamol', 'aspirin', 'ibuprofen', 'acetaminophen', 'tylenol', 'đau', 'giảm đau', 'hạ sốt', 'diclofenac', 'naproxen', 'ketoprofen',
         'piroxicam', 'meloxicam', 'celecoxib', 'indomethacin', 'sốt','chống viêm', 'giảm sốt', 'analgesic', 'antipyretic', 'nsaid',
-        'aceclofenac', 'mefenamic', 'etoricoxib', 'lornoxicam']):
-        return 'giảm đau hạ sốt'
-    
-    elif any(word in drug_name for word in [
+        'aceclofenac', 'mefenamic', 'etoricoxib', 'lornoxicam',
+    ]),
+    ('tiêu hóa', [
         'dạ dày', 'tiêu hóa', 'táo bón', 'tiêu chảy', 'nôn', 'buồn nôn','omeprazole', 'ranitidine', 'famotidine', 'lansoprazole',
         'esomeprazole', 'pantoprazole', 'domperidone', 'metoclopramide','loperamide', 'bismuth', 'simethicone', 'lactulose', 'bụng',
-        'gastric', 'peptic', 'antacid', 'proton pump', 'diosmectite','probiotics', 'enzym tiêu hóa', 'trợ tiêu hóa'
-    ]):
-        return 'tiêu hóa'
-    
-    elif any(word in drug_name for word in [
+        'gastric', 'peptic', 'antacid', 'proton pump', 'diosmectite','probiotics', 'enzym tiêu hóa', 'trợ tiêu hóa',
+    ]),
+    ('hô hấp', [
         'ho', 'cảm', 'cúm', 'viêm họng', 'hen suyễn', 'phế quản', 'expectorant', 'dextromethorphan', 'guaifenesin', 'salbutamol',
         'terbutaline', 'theophylline', 'montelukast', 'budesonide','fluticasone', 'beclomethasone', 'respiratory', 'broncho',
-        'cough', 'cold', 'flu', 'asthma', 'viêm mũi', 'xịt mũi','ambroxol', 'bromhexine', 'acetylcysteine', 'carbocisteine']):
-        return 'hô hấp'
-    
-    elif any(word in drug_name for word in [
+        'cough', 'cold', 'flu', 'asthma', 'viêm mũi', 'xịt mũi','ambroxol', 'bromhexine', 'acetylcysteine', 'carbocisteine',
+    ]),
+    ('tim mạch', [
         'huyết áp', 'tim', 'mạch', 'amlodipine', 'atenolol', 'metoprolol','lisinopril', 'enalapril', 'losartan', 'valsartan', 'nifedipine',
         'diltiazem', 'verapamil', 'furosemide', 'hydrochlorothiazide','carvedilol', 'bisoprolol', 'ramipril', 'candesartan',
-        'cardiovascular', 'cardio', 'hypertension', 'tim mạch','telmisartan', 'olmesartan', 'perindopril', 'indapamide']):
-        return 'tim mạch'
-    
-    elif any(word in drug_name for word in [
+        'cardiovascular', 'cardio', 'hypertension', 'tim mạch','telmisartan', 'olmesartan', 'perindopril', 'indapamide',
+    ]),
+    ('vitamin và bổ sung', [
         'vitamin', 'khoáng chất', 'canxi', 'sắt', 'kẽm', 'magie','vitamin a', 'vitamin b', 'vitamin c', 'vitamin d', 'vitamin e',
         'folic acid', 'biotin', 'omega', 'multivitamin', 'calcium','iron', 'zinc', 'magnesium', 'potassium', 'supplement',
-        'tăng cường', 'bổ sung', 'dinh dưỡng', 'khoáng']):
-        return 'vitamin và bổ sung'
-    
-    elif any(word in drug_name for word in [
+        'tăng cường', 'bổ sung', 'dinh dưỡng', 'khoáng',
+    ]),
+    ('da liễu', [
         'da', 'nấm da', 'viêm da', 'eczema', 'vảy nến', 'mụn','hydrocortisone', 'betamethasone', 'triamcinolone',
         'clotrimazole', 'miconazole', 'ketoconazole', 'terbinafine','dermatology', 'topical', 'cream', 'ointment', 'gel da',
-        'fungal', 'antifungal', 'corticosteroid', 'thuốc bôi']):
-        return 'da liễu'
-    
-    elif any(word in drug_name for word in [
+        'fungal', 'antifungal', 'corticosteroid', 'thuốc bôi',
+    ]),
+    ('mắt tai mũi họng', [
         'mắt', 'tai', 'mũi', 'họng', 'viêm mũi', 'viêm tai','chloramphenicol', 'tobramycin', 'ofloxacin', 'dexamethasone',
         'prednisolone', 'artificial tears', 'saline', 'xịt mũi', 'ophthalmic', 'otic', 'nasal', 'throat', 'thuốc nhỏ mắt',
-        'thuốc nhỏ tai', 'thuốc xịt mũi']):
-        return 'mắt tai mũi họng'
-    
-
-    elif any(word in drug_name for word in [
+        'thuốc nhỏ tai', 'thuốc xịt mũi',
+    ]),
+    ('thần kinh tâm thần', [
         'thần kinh', 'trầm cảm', 'lo âu', 'an thần', 'ngủ','diazepam', 'lorazepam', 'alprazolam', 'clonazepam',
         'fluoxetine', 'sertraline', 'paroxetine', 'amitriptyline','haloperidol', 'risperidone', 'olanzapine', 'quetiapine',
-        'psychiatric', 'neurological', 'antidepressant', 'anxiolytic', 'tâm thần', 'thuốc ngủ', 'chống trầm cảm']):
-        return 'thần kinh tâm thần'
-    
-    elif any(word in drug_name for word in [
+        'psychiatric', 'neurological', 'antidepressant', 'anxiolytic', 'tâm thần', 'thuốc ngủ', 'chống trầm cảm',
+    ]),
+    ('nội tiết', [
         'tiểu đường', 'đường huyết', 'insulin', 'tuyến giáp','metformin', 'glibenclamide', 'gliclazide', 'pioglitazone',
         'levothyroxine', 'methimazole', 'propylthiouracil','endocrine', 'diabetes', 'thyroid', 'hormone', 'nội tiết',
-        'đái tháo đường', 'tuyến giáp']):
-        return 'nội tiết'
-    
-
-    elif any(word in drug_name for word in [
+        'đái tháo đường', 'tuyến giáp',
+    ]),
+    ('phụ khoa', [
         'phụ khoa', 'kinh nguyệt', 'tránh thai', 'mang thai','estrogen', 'progesterone', 'contraceptive', 'hormone replacement',
-        'clomiphene', 'norethisterone', 'ethinylestradiol','gynecology', 'obstetrics', 'pregnancy', 'thuốc tránh thai']):
-        return 'phụ khoa'
-    
-    elif any(word in drug_name for word in [
+        'clomiphene', 'norethisterone', 'ethinylestradiol','gynecology', 'obstetrics', 'pregnancy', 'thuốc tránh thai',
+    ]),
+    ('cơ xương khớp', [
         'xương', 'khớp', 'viêm khớp', 'gout', 'thấp khớp','allopurinol', 'colchicine', 'prednisolone', 'methylprednisolone',
-        'rheumatology', 'arthritis', 'osteoporosis', 'joint','glucosamine', 'chondroitin', 'cơ xương khớp']):
-        return 'cơ xương khớp'
-    
-    elif any(word in drug_name for word in [
+        'rheumatology', 'arthritis', 'osteoporosis', 'joint','glucosamine', 'chondroitin', 'cơ xương khớp',
+    ]),
+    ('ung thư', [
         'ung thư', 'hóa trị', 'xạ trị', 'u bướu', 'cancer','chemotherapy', 'oncology', 'tumor', 'atezolizumab',
-        'cisplatin', 'carboplatin', 'doxorubicin', 'cyclophosphamide','methotrexate', 'fluorouracil', 'paclitaxel', 'avelumab']):
-        return 'ung thư'
-    
-  
-    elif any(word in drug_name for word in [
+        'cisplatin', 'carboplatin', 'doxorubicin', 'cyclophosphamide','methotrexate', 'fluorouracil', 'paclitaxel', 'avelumab',
+    ]),
+    ('niệu khoa', [
         'niệu', 'thận', 'bàng quang', 'tiết niệu', 'tiểu','kidney', 'bladder', 'urinary', 'urology',
-        'tamsulosin', 'finasteride', 'desmopressin', 'niệu khoa']):
-        return 'niệu khoa'
+        'tamsulosin', 'finasteride', 'desmopressin', 'niệu khoa',
+    ]),
+]
+DEFAULT_DRUG_TYPE = 'tổng hợp'
+
+
+def _drug_type_matcher():
+    """Một automaton cho mọi từ khóa, kèm loại ưu tiên cao nhất (vị trí nhỏ nhất) của mỗi từ khóa"""
+    ranks = {}
+    for rank, (_, keywords) in enumerate(DRUG_TYPE_KEYWORDS):
+        for keyword in keywords:
+            ranks.setdefault(keyword, rank)
+    matcher = AhoCorasick(ranks)
+    return matcher, [ranks[keyword] for keyword in matcher.patterns]
+
+
+_DRUG_TYPE_MATCHER, _DRUG_TYPE_RANKS = _drug_type_matcher()
+
+
+def classify_drug_type(drug_name):
+    drug_name = str(drug_name).lower()
+    ids = _DRUG_TYPE_MATCHER.find_ids(drug_name)
+    if not ids:
+        return DEFAULT_DRUG_TYPE
+    return DRUG_TYPE_KEYWORDS[min(_DRUG_TYPE_RANKS[i] for i in ids)][0]
+
+
+# Nhóm triệu chứng -> các từ khóa tìm trong chỉ định (dùng chung cho engine và bundle)
+SYMPTOM_MAPPING = {
+    'đau đầu': ['đau đầu', 'nhức đầu', 'migraine', 'đau nửa đầu', 'headache'],
+    'sốt': ['sốt', 'fever', 'nóng sốt', 'ốm sốt', 'sốt cao', 'hạ sốt'],
+    'ho': ['ho', 'cough', 'ho khan', 'ho có đờm', 'ho kéo dài', 'ho dai dẳng'],
+    'đau bụng': ['đau bụng', 'đau dạ dày', 'đau tử tràng', 'quặn bụng', 'stomach'],
+    'tiêu chảy': ['tiêu chảy', 'diarrhea', 'đi lỏng', 'phân lỏng', 'tiêu chay'],
+    'cảm lạnh': ['cảm lạnh', 'cảm cúm', 'nghẹt mũi', 'flu', 'cúm', 'cold'],
+    'đau họng': ['đau họng', 'viêm họng', 'sưng họng', 'khàn tiếng', 'sore throat'],
+    'dị ứng': ['dị ứng', 'ngứa', 'mẩn đỏ', 'allergy', 'phát ban', 'allergic'],
+    'viêm nhiễm': ['viêm', 'nhiễm trùng', 'infection', 'kháng sinh', 'nhiễm khuẩn'],
+    'đau khớp': ['đau khớp', 'viêm khớp', 'đau cơ', 'đau xương', 'arthritis'],
+    'buồn nôn': ['buồn nôn', 'nôn mửa', 'nausea', 'ói mửa', 'nôn'],
+    'mệt mỏi': ['mệt mỏi', 'mệt', 'fatigue', 'kiệt sức', 'yếu'],
+    'chóng mặt': ['chóng mặt', 'hoa mắt', 'dizzy', 'dizziness', 'đầu quay'],
+    'táo bón': ['táo bón', 'khó đi tiêu', 'constipation', 'táo bon'],
+    'viêm da': ['viêm da', 'eczema', 'dermatitis', 'da viêm', 'da bị viêm']
+}
+
 
-    else:
-        return 'tổng hợp'
\ No newline at end of file
+def symptom_keywords(symptom_mapping=SYMPTOM_MAPPING):
+    """Danh sách từ khóa (không trùng, giữ thứ tự) dùng để dựng chỉ mục triệu chứng"""
+    return list(dict.fromkeys(k for keywords in symptom_mapping.values() for k in keywords))
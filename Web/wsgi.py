@@ -0,0 +1,7 @@
+"""Entry point production: engine được load một lần trong master trước khi fork worker.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from app import create_app
+
+app = create_app()